@@ -1,7 +1,8 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import books, chat
+from app.api.v1.endpoints import books, chat, system
 
 api_router = APIRouter()
 
 api_router.include_router(books.router, prefix="/books", tags=["books"])
 api_router.include_router(chat.router, prefix="/books", tags=["chat"]) # /books/{id}/chat
+api_router.include_router(system.router, prefix="/system", tags=["system"])
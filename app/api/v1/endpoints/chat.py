@@ -1,48 +1,62 @@
 import json
-from typing import AsyncGenerator, List, Optional
-from fastapi import APIRouter, HTTPException, Request
+import time
+import base64
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import AsyncGenerator, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
-from langchain_google_genai import ChatGoogleGenerativeAI
+from starlette.background import BackgroundTask
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from app.schemas.chat import ChatRequest, ChatMessage as ChatMessageSchema
-from app.services.rag_service import retrieve_context
+from app.services.rag_service import embed_for_retrieval, retrieve_candidates, search_lexical
+from app.services.context_service import assemble_context
+from app.services.pdf_service import estimate_tokens
+from app.services.answer_cache import answer_cache, split_for_replay
+from app.services.embedding_cache import normalize_query
+from app.services.single_flight import Flight, chat_flights
+from app.services.stream_coalescer import coalesce
+from app.services.book_cache import book_cache
+from app.services.chat_history_writer import chat_history_writer
+from app.services.memory_service import empty_memory, load_memory, memory_messages
+from app.core.auth import caller_id
+from app.core.clients import get_chat_model
 from app.core.config import settings
-from app.db.supabase import supabase
+from app.db import repository
 from app.core.limiter import limiter
+from app.core.metrics import CHAT_STAGE_SECONDS, CHAT_TOKENS_PER_SECOND, book_label, start_spans
 
 router = APIRouter()
 
-# Initialize Chat Model
-chat_llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    google_api_key=settings.GOOGLE_API_KEY,
-    temperature=0.7,
-    streaming=True,
-    convert_system_message_to_human=True 
-)
-
-async def save_chat_history(user_id: Optional[str], book_id: str, user_msg: str, ai_msg: str):
+async def save_chat_history(user_id: Optional[str], book_id: str, user_msg: str, ai_msg: str, truncated: bool = False):
     """
     Save chat history to Supabase.
+    Buffered by the write-behind writer and flushed in batches with other streams.
+    `truncated` marks an answer cut short because the client disconnected.
     """
     try:
-        # Save User Message
-        supabase.table("chat_messages").insert({
-            "book_id": book_id,
-            "user_id": user_id,
-            "role": "user",
-            "content": user_msg
-        }).execute()
-        
-        # Save AI Message
-        supabase.table("chat_messages").insert({
-            "book_id": book_id,
-            "user_id": user_id,
-            "role": "assistant",
-            "content": ai_msg
-        }).execute()
-        print(f"DEBUG: Saved chat history for book {book_id}")
+        # Save User + AI Message together. Rows of one batch would share now(), so explicit
+        # timestamps keep each answer ordered after its question (conversation memory relies on it).
+        asked_at = datetime.now(timezone.utc)
+        await chat_history_writer.enqueue([
+            {
+                "book_id": book_id,
+                "user_id": user_id,
+                "role": "user",
+                "content": user_msg,
+                "truncated": False,
+                "created_at": asked_at.isoformat()
+            },
+            {
+                "book_id": book_id,
+                "user_id": user_id,
+                "role": "assistant",
+                "content": ai_msg,
+                "truncated": truncated,
+                "created_at": (asked_at + timedelta(microseconds=1)).isoformat()
+            },
+        ])
     except Exception as e:
         print(f"Error saving chat history: {e}")
 
@@ -53,74 +67,219 @@ async def chat_endpoint(
     book_id: str,
     chat_request: ChatRequest
 ):
-    # 1. Get Book
-    response = supabase.table("books").select("*").eq("id", book_id).execute()
-    if not response.data:
+    spans = start_spans("chat", CHAT_STAGE_SECONDS, book_id)
+
+    # 1-2. Get Book & Persona (cached per worker once the book is ready)
+    with spans.span("book_lookup"):
+        book_context = await book_cache.get(book_id)
+    if not book_context:
         raise HTTPException(status_code=404, detail="Book not found")
-    book = response.data[0]
+    book = book_context["book"]
     
     # Check status?
     if book.get("status") != "ready":
          raise HTTPException(status_code=400, detail="Book is not ready for chat")
 
-    # 2. Get Persona
-    res_p = supabase.table("personas").select("*").eq("book_id", book_id).execute()
-    if res_p.data:
-        persona = res_p.data[0]
-        system_content = f"Role: {persona['role_name']}\nInstructions: {persona['system_prompt']}"
-    else:
-        system_content = "You are a helpful assistant."
-
-    # 3. Retrieve Context
-    # Using file_hash from book record. 
-    # Ensure book table has file_hash! (Added in schema)
-    docs = await retrieve_context(chat_request.message, book.get("file_hash", ""))
-    context_text = "\n\n".join([doc.page_content for doc in docs])
-    
-    # 4. Construct Messages
-    messages = [
-        SystemMessage(content=system_content),
-        HumanMessage(content=f"Context:\n{context_text}\n\nQuestion: {chat_request.message}")
-    ]
+    system_content = book_context["system_content"]
 
-    # 5. Stream
-    async def event_generator() -> AsyncGenerator[str, None]:
-        full_response = ""
+    file_hash = book.get("file_hash", "")
+    # The requester, not the book owner: history and memory are per (user, book)
+    user_id = caller_id(request)
+    mode = chat_request.retrieval_mode or settings.RETRIEVAL_MODE
+
+    # Earlier turns of this conversation: rolling summary + last turns, within MEMORY_TOKEN_BUDGET.
+    # Anonymous callers get none, so strangers never share a conversation.
+    memory = empty_memory()
+    if settings.MEMORY_ENABLED and user_id:
+        with spans.span("memory"):
+            try:
+                memory = await load_memory(book_id, user_id)
+            except Exception as e:
+                print(f"Error loading conversation memory: {e}")
+
+    async def produce(flight: Flight):
+        """
+        Embed, retrieve and generate once; every coalesced request receives these frames.
+        """
+        lexical = None
+        fields = {"mode": mode, "memory_tokens": memory["tokens"], "memory_turns": len(memory["messages"]) // 2}
         try:
-            async for chunk in chat_llm.astream(messages):
-                content = chunk.content
-                if content:
-                    full_response += content
-                    yield f"data: {json.dumps({'content': content})}\n\n"
+            # Full-text search starts right away, in parallel with the query embedding
+            if mode != "vector":
+                lexical = asyncio.create_task(search_lexical(chat_request.message, file_hash, settings.CONTEXT_CANDIDATES))
+            with spans.span("query_embedding"):
+                query_embedding = await embed_for_retrieval(chat_request.message, mode)
+
+            # Answers are only cached for fully indexed books (partial context gives partial answers)
+            # and for questions without conversation memory (follow-ups depend on earlier turns)
+            use_answer_cache = (
+                settings.ANSWER_CACHE_ENABLED and bool(file_hash) and book.get("stage") in (None, "done")
+                and query_embedding is not None and not (memory["messages"] or memory["summary"])
+            )
+            if use_answer_cache:
+                cached_answer = answer_cache.lookup(file_hash, system_content, query_embedding)
+                if cached_answer is not None:
+                    fields["answer_cache"] = "hit"
+                    flight.headers["X-Answer-Cache"] = "hit"
+                    for content in split_for_replay(cached_answer):
+                        flight.publish(f"data: {json.dumps({'content': content})}\n\n", content)
+                    flight.publish("data: [DONE]\n\n")
+                    flight.finish(cached_answer)
+                    return
+
+            # 3. Retrieve Context
+            # Using file_hash from book record. 
+            # Ensure book table has file_hash! (Added in schema)
+            with spans.span("retrieval"):
+                docs, vectors = await retrieve_candidates(
+                    chat_request.message, file_hash, k=settings.CONTEXT_CANDIDATES,
+                    query_embedding=query_embedding, mode=mode, lexical=lexical,
+                    indexed=book.get("stage") in (None, "done"),
+                )
+            fields["mode"] = mode if query_embedding is not None or mode == "lexical" else "lexical-fallback"
+            flight.headers["X-Retrieval-Mode"] = fields["mode"]
+            # Dedup + MMR selection under CONTEXT_TOKEN_BUDGET, so prompt size stays bounded
+            with spans.span("context_assembly"):
+                context = assemble_context(docs, vectors, query_embedding)
+            context_text = context["text"]
+            flight.headers["X-Context-Tokens"] = str(context["tokens"])
+            fields.update({
+                "context_tokens": context["tokens"],
+                "prompt_tokens": (
+                    estimate_tokens(system_content) + memory["tokens"] + context["tokens"]
+                    + estimate_tokens(chat_request.message)
+                ),
+                "chunks": f"{len(context['documents'])}/{len(docs)}",
+                "dropped_duplicates": context["dropped_duplicates"],
+                "dropped_budget": context["dropped_budget"],
+            })
             
-            yield "data: [DONE]\n\n"
+            # 4. Construct Messages (summary of older turns in the system prompt, recent turns verbatim)
+            system_prompt = system_content
+            if memory["summary"]:
+                system_prompt += f"\n\nSummary of the conversation so far:\n{memory['summary']}"
+            messages = [
+                SystemMessage(content=system_prompt),
+                *memory_messages(memory),
+                HumanMessage(content=f"Context:\n{context_text}\n\nQuestion: {chat_request.message}")
+            ]
+
+            # 5. Stream, coalescing model chunks into STREAM_FLUSH_INTERVAL / STREAM_FLUSH_BYTES frames
+            stream_start = time.perf_counter()
+            first_token_at = None
+            tokens = (chunk.content async for chunk in get_chat_model().astream(messages))
+            async for content in coalesce(tokens, settings.STREAM_FLUSH_INTERVAL, settings.STREAM_FLUSH_BYTES):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    spans.add("time_to_first_token", first_token_at - stream_start)
+                flight.publish(f"data: {json.dumps({'content': content})}\n\n", content)
+            
+            flight.publish("data: [DONE]\n\n")
+            full_response = flight.text()
+            stream_end = time.perf_counter()
+            spans.add("stream_total", stream_end - stream_start)
+            fields["output_tokens"] = estimate_tokens(full_response)
+            if first_token_at is not None and stream_end > first_token_at:
+                tokens_per_second = fields["output_tokens"] / (stream_end - first_token_at)
+                CHAT_TOKENS_PER_SECOND.labels(book=book_label(book_id)).observe(tokens_per_second)
+                fields["tokens_per_second"] = round(tokens_per_second, 1)
             
-            # Save History
-            # User ID handling: For now, we don't have Auth. 
-            # In Supabase, usually user_id comes from Auth token.
-            # If "God Mode", pass a dummy or None.
-            # The previous code used book.owner_id. 
-            # In new schema, book has user_id.
-            user_id = book.get("user_id")
-            await save_chat_history(user_id, book_id, chat_request.message, full_response)
+            if use_answer_cache and full_response:
+                answer_cache.put(book_id, file_hash, system_content, chat_request.message, query_embedding, full_response)
+            flight.finish(full_response)
                 
+        except asyncio.CancelledError:
+            # Every client disconnected: stop generating
+            fields.update({"status": "cancelled", "output_tokens": estimate_tokens(flight.text())})
+            raise
         except Exception as e:
             print(f"Error in stream: {e}")
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            fields["error"] = str(e)
+            flight.publish(f"data: {json.dumps({'error': str(e)})}\n\n")
+        finally:
+            if lexical is not None and not lexical.done():
+                lexical.cancel()
+            # Timings of the request that drove the upstream call (followers only wait on it)
+            spans.finish(**fields)
+
+    # Identical questions in flight for this book (and same conversation state) share one upstream call
+    flight_key = (book_id, mode, memory["digest"], normalize_query(chat_request.message))
+    flight = chat_flights.join(flight_key, produce)
+    try:
+        await flight.wait_started()
+    except BaseException:
+        # Client went away before the first frame: don't keep the producer alive for it
+        flight.leave()
+        raise
+
+    delivery = {"frames": 0, "complete": False}
+
+    async def event_generator() -> AsyncGenerator[str, None]:
+        async for frame in flight.subscribe():
+            if await request.is_disconnected():
+                return
+            delivery["frames"] += 1
+            yield frame
+        delivery["complete"] = True
+
+    async def finish_subscription():
+        """
+        Runs once the response is over, whether it was delivered in full or the client disconnected.
+        """
+        flight.leave()
+        # Save History (for every coalesced request, not only the one that drove the call),
+        # under the caller's id from the access token (None for anonymous callers)
+        if delivery["complete"]:
+            if flight.result is not None:
+                await save_chat_history(user_id, book_id, chat_request.message, flight.result)
+            return
+        partial = flight.text(delivery["frames"])
+        if partial:
+            await save_chat_history(user_id, book_id, chat_request.message, partial, truncated=True)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers=flight.headers,
+        background=BackgroundTask(finish_subscription),
+    )
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+def _encode_cursor(message: dict) -> str:
+    created_at = message["created_at"]
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = f"{created_at}|{message['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), message_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @router.get("/{book_id}/messages", response_model=List[ChatMessageSchema])
-async def get_chat_history(book_id: str):
+async def get_chat_history(
+    book_id: str,
+    response: Response,
+    limit: int = Query(settings.CHAT_HISTORY_PAGE_SIZE, ge=1, le=settings.CHAT_HISTORY_MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+):
     """
-    Retrieve chat history for a book.
+    Retrieve chat history for a book, one page at a time.
+    Returns the last `limit` messages (oldest first). If older messages exist, the
+    `X-Next-Cursor` response header holds the cursor to pass as `before`.
+
+    This endpoint used to return the whole history in one response; it now returns at
+    most CHAT_HISTORY_PAGE_SIZE messages unless `limit` asks for more (up to
+    CHAT_HISTORY_MAX_PAGE_SIZE). Clients that need everything follow the cursor.
     """
-    response = supabase.table("chat_messages")\
-        .select("id, role, content, created_at, user_id")\
-        .eq("book_id", book_id)\
-        .order("created_at")\
-        .execute()
+    cursor = _decode_cursor(before) if before else None
+    messages, has_more = await repository.list_chat_messages(book_id, limit=limit, before=cursor)
+    
+    if has_more and messages:
+        response.headers["X-Next-Cursor"] = _encode_cursor(messages[0])
         
     # Convert string timestamps to datetime objects if Pydantic doesn't auto-handle? 
     # Pydantic usually handles ISO strings.
-    return response.data
+    return messages
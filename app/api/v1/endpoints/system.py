@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+
+from app.services.answer_cache import answer_cache
+from app.services.book_cache import book_cache
+from app.services.chat_history_writer import chat_history_writer
+from app.services.embedding_cache import embedding_cache
+from app.services.gc_service import garbage_collector
+from app.services.single_flight import chat_flights
+from app.services.vector_index import vector_index_cache
+
+router = APIRouter()
+
+@router.get("/cache-stats")
+async def cache_stats():
+    """
+    Hit/miss counters and sizes of the in-process caches and buffers (per worker).
+    """
+    return {
+        "answer_cache": answer_cache.stats(),
+        "book_cache": book_cache.stats(),
+        "chat_flights": chat_flights.stats(),
+        "chat_history_writer": chat_history_writer.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "garbage_collector": garbage_collector.stats(),
+        "vector_index": vector_index_cache.stats(),
+    }
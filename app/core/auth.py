@@ -0,0 +1,59 @@
+"""
+Caller identity from the Supabase access token (`Authorization: Bearer <jwt>`).
+
+Tokens are verified locally against SUPABASE_JWT_SECRET (HS256, the project's JWT
+secret), so identifying a caller costs no round trip to Supabase Auth. Without the
+secret, or without a valid token, the caller is anonymous.
+"""
+import hmac
+import json
+import time
+import uuid
+import base64
+import hashlib
+from typing import Optional
+
+from fastapi import Request
+
+from app.core.config import settings
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+def verify_token(token: str, secret: str) -> Optional[dict]:
+    """
+    Claims of an HS256 JWT signed with `secret`, or None if it is malformed, forged or expired.
+    """
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = json.loads(_b64decode(header_b64))
+        if not isinstance(header, dict) or header.get("alg") != "HS256":
+            return None
+        expected = hmac.new(secret.encode(), f"{header_b64}.{payload_b64}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature_b64)):
+            return None
+        claims = json.loads(_b64decode(payload_b64))
+        if not isinstance(claims, dict):
+            return None
+        if claims.get("exp") is not None and float(claims["exp"]) < time.time():
+            return None
+    except (ValueError, TypeError):
+        return None
+    return claims
+
+def caller_id(request: Request) -> Optional[str]:
+    """
+    The authenticated user's id (the token's `sub`, a UUID), or None for anonymous callers.
+    """
+    if not settings.SUPABASE_JWT_SECRET:
+        return None
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    claims = verify_token(token.strip(), settings.SUPABASE_JWT_SECRET)
+    if not claims or not claims.get("sub"):
+        return None
+    try:
+        return str(uuid.UUID(str(claims["sub"])))
+    except ValueError:
+        return None
@@ -0,0 +1,151 @@
+"""
+Lazily built, process-wide clients for the external services (Gemini, Supabase,
+Storage over HTTP).
+
+Nothing is constructed at import time: each getter builds its client on first use
+(importing the SDK only then) and every caller shares that instance, so a process
+keeps one connection pool per service and only imports the SDKs it uses. The API
+lifespan runs `warm_up()` in the background so the first request does not pay for
+construction; `/ready` reports when it is done.
+"""
+import os
+import time
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+_instances: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+def shared(name: str, factory: Callable[[], Any]) -> Any:
+    """
+    The process-wide instance called `name`, built by `factory` on first use.
+    """
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = _instances[name] = factory()
+    return instance
+
+def override(**clients):
+    """
+    Replace clients by name (embeddings, chat_model, http, supabase, process_pool), e.g. with local stand-ins.
+    """
+    _instances.update(clients)
+
+def _google_api_key() -> str:
+    # Explicitly set env var for libraries that rely on it
+    os.environ["GOOGLE_API_KEY"] = settings.GOOGLE_API_KEY
+    return settings.GOOGLE_API_KEY
+
+def get_embeddings():
+    def build():
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        return GoogleGenerativeAIEmbeddings(model=settings.EMBEDDING_MODEL, google_api_key=_google_api_key())
+    return shared("embeddings", build)
+
+def get_chat_model():
+    """
+    Gemini chat model shared by chat streaming and persona generation.
+    """
+    def build():
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(
+            model="gemini-2.5-flash",
+            google_api_key=_google_api_key(),
+            temperature=0.7,
+            streaming=True,
+            convert_system_message_to_human=True,
+        )
+    return shared("chat_model", build)
+
+def get_http_client():
+    """
+    Pooled async HTTP client (Supabase Storage downloads). Closed by `close()`.
+    """
+    def build():
+        import httpx
+        return httpx.AsyncClient(timeout=httpx.Timeout(30.0, read=120.0))
+    return shared("http", build)
+
+def get_process_pool():
+    """
+    Process pool for CPU-bound local PDF parsing (PDF_PARSE_WORKERS processes).
+    Workers are spawned, not forked, so they never inherit the event loop or open
+    connections. Shut down by `close()`.
+    """
+    def build():
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(
+            max_workers=settings.PDF_PARSE_WORKERS or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return shared("process_pool", build)
+
+async def close():
+    http = _instances.pop("http", None)
+    if http is not None:
+        await http.aclose()
+    pool = _instances.pop("process_pool", None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+class Readiness:
+    """
+    Warm-up state of this process: which steps are done and how long each took.
+    """
+    def __init__(self):
+        self.ready = False
+        self.last_error: Optional[str] = None
+        self.timings_ms: Dict[str, float] = {}
+
+    def status(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "warming",
+            "last_error": self.last_error,
+            "warm_up_ms": self.timings_ms,
+        }
+
+readiness = Readiness()
+
+async def warm_up(retry_interval: float = 5.0):
+    """
+    Build the clients chat needs (in a thread: SDK imports and construction block)
+    and open one pooled database connection, then mark the process ready.
+    Retries failed steps every `retry_interval` seconds until they succeed.
+    """
+    from sqlalchemy import text
+    from app.db.session import engine
+
+    async def ping_database():
+        async with engine.connect() as conn:
+            await conn.execute(text("select 1"))
+
+    steps = [
+        ("embeddings", lambda: asyncio.to_thread(get_embeddings)),
+        ("chat_model", lambda: asyncio.to_thread(get_chat_model)),
+    ]
+    if engine is not None:
+        steps.append(("database", ping_database))
+    else:
+        from app.db.supabase import get_supabase
+        steps.append(("supabase", lambda: asyncio.to_thread(get_supabase)))
+
+    for name, step in steps:
+        while True:
+            start = time.perf_counter()
+            try:
+                await step()
+                break
+            except Exception as e:
+                readiness.last_error = f"{name}: {type(e).__name__}: {e}"
+                print(f"Warm-up step failed, retrying in {retry_interval}s: {readiness.last_error}")
+                await asyncio.sleep(retry_interval)
+        readiness.timings_ms[name] = round((time.perf_counter() - start) * 1000, 1)
+    readiness.ready = True
+    print(f"Warm-up complete: {readiness.timings_ms}")
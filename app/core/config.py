@@ -1,4 +1,6 @@
-from typing import List, Union
+import os
+import tempfile
+from typing import List, Optional, Union
 from pydantic import AnyHttpUrl,  PostgresDsn, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -9,11 +11,103 @@ class Settings(BaseSettings):
     # Database (Supabase)
     SUPABASE_URL: str
     SUPABASE_SERVICE_KEY: str
+    SUPABASE_JWT_SECRET: Optional[str] = None  # Verifies callers' access tokens; unset = every caller is anonymous
+    
+    # Direct Postgres connection (asyncpg) for hot queries.
+    # If unset, every query goes through the PostgREST client instead.
+    DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_STATEMENT_CACHE_SIZE: int = 100  # Set to 0 behind PgBouncer (transaction mode)
     
     # AI Services
     GOOGLE_API_KEY: str
     LLAMA_CLOUD_API_KEY: str
     
+    # Ingestion
+    INGESTION_MODE: str = "background"  # "background" (in the API process) or "queue" (app.worker)
+    WORKER_CONCURRENCY: int = 2
+    JOB_LEASE_SECONDS: float = 300.0
+    JOB_POLL_INTERVAL: float = 2.0
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BASE_DELAY: float = 30.0  # seconds, doubled per attempt
+    SCRATCH_DIR: str = os.path.join(tempfile.gettempdir(), "morphing-book")  # Temp PDFs during processing
+    DOWNLOAD_CHUNK_SIZE: int = 1024 * 1024
+    DEDUP_WAIT_TIMEOUT: float = 1800.0  # Max seconds to wait on an in-flight job with the same file_hash
+    DEDUP_POLL_INTERVAL: float = 5.0
+    PARSE_CACHE_BACKEND: str = "disk"  # "disk", "storage" (Supabase Storage bucket) or "none"
+    PARSE_CACHE_DIR: str = os.path.join(tempfile.gettempdir(), "morphing-book-parse-cache")
+    PARSE_CACHE_BUCKET: str = "parsed-markdown"
+    PDF_PARSER: str = "auto"  # "auto" (local for text PDFs, LlamaParse for scans / unusable text), "local" or "llamaparse"
+    PDF_PARSE_WORKERS: int = 0  # Processes for local parsing; 0 = one per CPU
+    PDF_PARSE_BATCH_PAGES: int = 8  # Pages per process-pool task
+    PDF_PROBE_PAGES: int = 8  # Pages sampled to pick the backend
+    PDF_LOCAL_MIN_CHARS_PER_PAGE: int = 200  # Sparser text layers (scans, image-heavy layouts) go to LlamaParse
+    PDF_LOCAL_MAX_EMPTY_PAGES: float = 0.2  # Share of sampled pages without text above which LlamaParse is used
+    PDF_LOCAL_MAX_UNMAPPED_RATIO: float = 0.01  # Share of unmapped glyphs (broken font encodings) tolerated locally
+    INGESTION_PIPELINED: bool = True  # Overlap parse / chunk / embed / persona, ready before fully indexed
+    PIPELINE_QUEUE_SIZE: int = 16  # Max page-chunk groups buffered between parser and embedder
+    PERSONA_SAMPLE_CHARS: int = 8000  # Opening text used to generate the persona
+    CHUNK_MAX_TOKENS: int = 512
+    CHUNK_OVERLAP_TOKENS: int = 64
+    CHUNK_CHARS_PER_TOKEN: float = 4.0  # Token estimate used by the chunker
+    EMBED_BATCH_SIZE: int = 100
+    EMBED_CONCURRENCY: int = 4
+    EMBED_MAX_RETRIES: int = 5
+    EMBED_RETRY_BASE_DELAY: float = 1.0  # seconds
+    GC_ENABLED: bool = True  # Background removal of vectors/personas no book references (needs DATABASE_URL)
+    GC_INTERVAL_SECONDS: float = 600.0  # A hash must be orphaned on two consecutive passes to be deleted
+    GC_BATCH_SIZE: int = 1000  # Rows per DELETE statement
+    GC_MAX_BATCHES_PER_PASS: int = 100
+    GC_BATCH_PAUSE: float = 0.1  # seconds between delete batches
+    
+    # Chat
+    BOOK_CACHE_MAX_ENTRIES: int = 1024
+    BOOK_CACHE_TTL_SECONDS: float = 300.0
+    BOOK_CACHE_LISTEN: bool = True  # LISTEN for book/persona changes (needs DATABASE_URL)
+    BOOK_CACHE_LISTEN_CHECK_SECONDS: float = 30.0  # Liveness check of the LISTEN connection
+    BOOK_CACHE_LISTEN_RETRY_SECONDS: float = 1.0  # First reconnect delay, doubled per failure
+    BOOK_CACHE_LISTEN_RETRY_MAX_SECONDS: float = 60.0
+    CHAT_HISTORY_PAGE_SIZE: int = 50  # Default messages per /messages page
+    CHAT_HISTORY_MAX_PAGE_SIZE: int = 500
+    CHAT_HISTORY_BATCH_SIZE: int = 200  # Rows per multi-row insert
+    CHAT_HISTORY_FLUSH_INTERVAL: float = 0.5  # seconds
+    CHAT_HISTORY_MAX_PENDING: int = 5000  # Buffered exchanges before streams wait (backpressure)
+    ANSWER_CACHE_ENABLED: bool = False  # Replay answers to near-identical questions (per book + persona)
+    ANSWER_CACHE_SIMILARITY: float = 0.95  # Min cosine similarity between question embeddings
+    ANSWER_CACHE_TTL_SECONDS: float = 24 * 3600
+    ANSWER_CACHE_MAX_ENTRIES: int = 5000
+    ANSWER_CACHE_MAX_PER_BOOK: int = 200
+    STREAM_FLUSH_INTERVAL: float = 0.05  # seconds a streamed token may wait to be merged into one SSE frame
+    STREAM_FLUSH_BYTES: int = 512  # Send the frame early once this many bytes are pending
+    MEMORY_ENABLED: bool = True  # Follow-up questions see earlier turns of the (book, user) conversation
+    MEMORY_RECENT_TURNS: int = 4  # Question + answer pairs sent verbatim
+    MEMORY_TOKEN_BUDGET: int = 1200  # Hard cap on summary + verbatim turns per prompt
+    MEMORY_MESSAGE_MAX_TOKENS: int = 300  # Longer messages are clipped in the prompt and when summarized
+    MEMORY_SUMMARY_MAX_TOKENS: int = 300
+    MEMORY_SUMMARY_BATCH_TURNS: int = 10  # Turns folded into the rolling summary per model call
+    
+    # Retrieval
+    EMBEDDING_MODEL: str = "models/embedding-001"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 10000
+    EMBEDDING_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    EMBEDDING_CACHE_DB_PATH: Optional[str] = None  # SQLite file shared by workers, e.g. /tmp/embedding_cache.db
+    VECTOR_INDEX_ENABLED: bool = True  # In-process per-book index in front of match_documents
+    VECTOR_INDEX_MAX_BYTES: int = 256 * 1024 * 1024
+    RETRIEVAL_MODE: str = "hybrid"  # "vector", "hybrid" (vector + full-text, RRF) or "lexical"; per request via ChatRequest
+    RRF_K: int = 60  # Reciprocal-rank fusion constant
+    EMBED_QUERY_TIMEOUT: float = 2.0  # seconds; hybrid mode answers from full-text search after this
+    VECTOR_SEARCH_EF_SEARCH: int = 40  # HNSW candidates for catalogue-wide match_documents (recall vs latency)
+    CONTEXT_CANDIDATES: int = 20  # Chunks retrieved before MMR / budget selection
+    CONTEXT_MAX_CHUNKS: int = 5
+    CONTEXT_TOKEN_BUDGET: int = 2000  # Estimated tokens of retrieved context per prompt
+    CONTEXT_MMR_LAMBDA: float = 0.7  # 1.0 = pure relevance, lower = more diverse
+    CONTEXT_DEDUP_SIMILARITY: float = 0.95  # Chunks this similar to a selected one are dropped
+    
+    # Metrics
+    METRICS_BOOK_LABELS: bool = True  # Label histograms per book; false = one "all" series (large catalogues)
+    
     # Core
     SECRET_KEY: str = "dev-secret-key-change-it-in-prod"
     ALGORITHM: str = "HS256"
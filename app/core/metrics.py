@@ -0,0 +1,136 @@
+"""
+Prometheus metrics and per-request / per-job timing spans.
+
+Spans are accumulated in memory for the current chat request or ingestion job
+(a ContextVar, so tasks spawned by it record into the same object) and observed
+into the histograms once, when the request or job finishes. `/metrics` serves
+the registry in the Prometheus text format.
+
+With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR so the workers share
+one registry (prometheus_client multiprocess mode).
+"""
+import os
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from prometheus_client import CollectorRegistry, Histogram, generate_latest, multiprocess
+
+from app.core.config import settings
+
+CHAT_STAGE_SECONDS = Histogram(
+    "chat_stage_seconds",
+    "Chat request stages: book_lookup, memory, query_embedding, retrieval, context_assembly, "
+    "time_to_first_token, stream_total.",
+    ["stage", "book"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+CHAT_TOKENS_PER_SECOND = Histogram(
+    "chat_tokens_per_second",
+    "Generation speed of streamed answers (estimated output tokens / generation time).",
+    ["book"],
+    buckets=(5, 10, 20, 40, 80, 160, 320, 640),
+)
+
+PDF_PARSE_PAGES_PER_SECOND = Histogram(
+    "pdf_parse_pages_per_second",
+    "Parsing throughput per document and parser backend (local, llamaparse); parse cache hits excluded.",
+    ["parser"],
+    buckets=(0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+
+INGESTION_STAGE_SECONDS = Histogram(
+    "ingestion_stage_seconds",
+    "Ingestion stages per book: download, parse, split, embed, insert, persona, total. "
+    "embed / insert sum the time of every batch (batches run concurrently).",
+    ["stage", "book"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+_current_spans: ContextVar[Optional["Spans"]] = ContextVar("current_spans", default=None)
+
+def book_label(book_id: str) -> str:
+    """
+    `book` label value. METRICS_BOOK_LABELS=false collapses it to "all" for large catalogues.
+    """
+    return str(book_id) if settings.METRICS_BOOK_LABELS else "all"
+
+class Spans:
+    """
+    Stage durations of one chat request or ingestion job.
+    """
+    def __init__(self, event: str, histogram: Histogram, book_id: str):
+        self.event = event
+        self.histogram = histogram
+        self.book_id = str(book_id)
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.fields: Dict[str, Any] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def finish(self, **fields):
+        """
+        Observe every stage into the histogram and print one structured log line.
+        """
+        book = book_label(self.book_id)
+        for stage, seconds in self.durations.items():
+            self.histogram.labels(stage=stage, book=book).observe(seconds)
+        line = {
+            "event": self.event,
+            "book_id": self.book_id,
+            **{f"{stage}_ms": round(seconds * 1000, 1) for stage, seconds in self.durations.items()},
+            **self.fields,
+            **fields,
+        }
+        print(json.dumps(line))
+
+def start_spans(event: str, histogram: Histogram, book_id: str) -> Spans:
+    """
+    Create the Spans of the current request / job and make them current.
+    """
+    spans = Spans(event, histogram, book_id)
+    _current_spans.set(spans)
+    return spans
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Time a block into the current Spans (no-op outside a request or job).
+    """
+    spans = _current_spans.get()
+    if spans is None:
+        yield
+        return
+    with spans.span(stage):
+        yield
+
+def note(**fields):
+    """
+    Add fields to the log line of the current Spans (no-op outside a request or job).
+    """
+    spans = _current_spans.get()
+    if spans is not None:
+        spans.fields.update(fields)
+
+def render_metrics() -> bytes:
+    """
+    The registry in the Prometheus text format (all workers in multiprocess mode).
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
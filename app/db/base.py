@@ -4,3 +4,5 @@ from app.models.book import Book
 from app.models.persona import Persona
 from app.models.user_library import UserLibrary
 from app.models.chat import ChatMessages
+from app.models.document import documents_table
+from app.models.conversation import ConversationSummary
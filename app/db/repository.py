@@ -0,0 +1,936 @@
+"""
+Async data-access layer for the hot queries (books, personas, chat_messages, match_documents).
+
+Runs on the pooled asyncpg engine from `app.db.session`; statements are built once so
+they stay prepared per connection. The sync PostgREST client is only a fallback
+(no DATABASE_URL, or the direct connection fails) and runs in a worker thread.
+"""
+import asyncio
+import enum
+import json
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import Float, BigInteger, Text, bindparam, insert, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.core.config import settings
+from app.db.session import engine
+from app.db.supabase import get_supabase
+from app.models.book import Book
+from app.models.chat import ChatMessages
+from app.models.conversation import ConversationSummary
+from app.models.document import documents_table, format_vector
+from app.models.persona import Persona
+
+books_table = Book.__table__
+personas_table = Persona.__table__
+chat_messages_table = ChatMessages.__table__
+conversation_summaries_table = ConversationSummary.__table__
+
+# --- Prepared statements ---
+
+_select_book = select(
+    books_table.c.id,
+    books_table.c.user_id,
+    books_table.c.title,
+    books_table.c.file_path,
+    books_table.c.status,
+    books_table.c.stage,
+    books_table.c.chunks_indexed,
+    books_table.c.chunks_total,
+    books_table.c.error_message,
+    books_table.c.file_hash,
+    books_table.c.created_at,
+).where(books_table.c.id == bindparam("book_id"))
+
+_select_persona = select(
+    personas_table.c.id,
+    personas_table.c.book_id,
+    personas_table.c.role_name,
+    personas_table.c.system_prompt,
+).where(personas_table.c.book_id == bindparam("book_id")).limit(1)
+
+_insert_persona = insert(personas_table)
+
+_insert_chat_messages = insert(chat_messages_table)
+
+# Keyset pagination, newest first; served by chat_messages_book_created_idx (schema.sql)
+_select_chat_messages = select(
+    chat_messages_table.c.id,
+    chat_messages_table.c.role,
+    chat_messages_table.c.content,
+    chat_messages_table.c.truncated,
+    chat_messages_table.c.created_at,
+    chat_messages_table.c.user_id,
+).where(
+    chat_messages_table.c.book_id == bindparam("book_id")
+).order_by(
+    chat_messages_table.c.created_at.desc(),
+    chat_messages_table.c.id.desc(),
+).limit(bindparam("limit"))
+
+_select_chat_messages_before = _select_chat_messages.where(
+    tuple_(chat_messages_table.c.created_at, chat_messages_table.c.id)
+    < tuple_(bindparam("before_created_at"), bindparam("before_id"))
+)
+
+# Conversation memory: one (book, user) thread; the user filter also matches NULL (anonymous)
+_select_conversation = select(
+    chat_messages_table.c.id,
+    chat_messages_table.c.role,
+    chat_messages_table.c.content,
+    chat_messages_table.c.truncated,
+    chat_messages_table.c.created_at,
+).where(
+    chat_messages_table.c.book_id == bindparam("book_id"),
+    chat_messages_table.c.user_id.is_not_distinct_from(bindparam("user_id")),
+).limit(bindparam("limit"))
+
+_select_conversation_recent = _select_conversation.order_by(
+    chat_messages_table.c.created_at.desc(),
+    chat_messages_table.c.id.desc(),
+)
+
+_select_conversation_oldest = _select_conversation.order_by(
+    chat_messages_table.c.created_at,
+    chat_messages_table.c.id,
+)
+
+_select_conversation_after = _select_conversation_oldest.where(
+    tuple_(chat_messages_table.c.created_at, chat_messages_table.c.id)
+    > tuple_(bindparam("after_created_at"), bindparam("after_id"))
+)
+
+_select_conversation_summary = select(
+    conversation_summaries_table.c.summary,
+    conversation_summaries_table.c.summarized_until,
+    conversation_summaries_table.c.summarized_until_id,
+).where(
+    conversation_summaries_table.c.book_id == bindparam("book_id"),
+    conversation_summaries_table.c.user_key == bindparam("user_key"),
+)
+
+# Compare-and-set on the cursor: a summary is only replaced by one folded from the same starting point
+_upsert_conversation_summary = text(
+    "insert into conversation_summaries as s "
+    "(book_id, user_key, summary, summarized_until, summarized_until_id, updated_at) "
+    "values (:book_id, :user_key, :summary, :summarized_until, :summarized_until_id, now()) "
+    "on conflict (book_id, user_key) do update set "
+    "summary = excluded.summary, summarized_until = excluded.summarized_until, "
+    "summarized_until_id = excluded.summarized_until_id, updated_at = now() "
+    "where s.summarized_until_id is not distinct from CAST(:previous_id AS uuid) "
+    "returning 1"
+)
+
+# pgvector has no asyncpg codec registered, so the embedding is sent as text and cast server-side.
+_match_documents = text(
+    "select id, content, metadata, similarity from match_documents("
+    "CAST(CAST(:query_embedding AS text) AS vector), "
+    ":match_threshold, :match_count, "
+    "CAST(CAST(:filter AS text) AS jsonb), :ef_search)"
+).columns(id=BigInteger, content=Text, metadata=JSONB, similarity=Float)
+
+# Same, plus each match's embedding (pgvector text form) for context selection
+_match_documents_with_embeddings = text(
+    "select m.id, m.content, m.metadata, m.similarity, d.embedding::text as embedding "
+    "from match_documents("
+    "CAST(CAST(:query_embedding AS text) AS vector), "
+    ":match_threshold, :match_count, "
+    "CAST(CAST(:filter AS text) AS jsonb), :ef_search) m "
+    "join documents d on d.id = m.id "
+    "order by m.similarity desc"
+).columns(id=BigInteger, content=Text, metadata=JSONB, similarity=Float, embedding=Text)
+
+_match_documents_lexical = text(
+    "select id, content, metadata, rank, embedding::text as embedding from match_documents_lexical("
+    ":query_text, :match_count, CAST(CAST(:filter AS text) AS jsonb))"
+).columns(id=BigInteger, content=Text, metadata=JSONB, rank=Float, embedding=Text)
+
+def _serialize(value: Any) -> Any:
+    """
+    Convert driver values to the JSON-ish shapes PostgREST returns.
+    """
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+def _row_to_dict(row) -> Dict[str, Any]:
+    return {key: _serialize(value) for key, value in row._mapping.items()}
+
+def _to_uuid(value: Any) -> Optional[uuid.UUID]:
+    if value is None or isinstance(value, uuid.UUID):
+        return value
+    return uuid.UUID(str(value))
+
+def _to_datetime(value: Any) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+# Failures of the connection or the pool, not of the statement: PostgREST may still work
+_CONNECTION_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError, TimeoutError, OSError)
+
+# Per `_run` call: set once a write's COMMIT is sent (see `_begin`)
+_commit_sent: ContextVar[Optional[Dict[str, bool]]] = ContextVar("commit_sent", default=None)
+
+@asynccontextmanager
+async def _begin() -> AsyncIterator:
+    """
+    `engine.begin()` for writes run through `_run`: records when the body has finished
+    and COMMIT is about to be sent, after which a failure leaves the outcome unknown.
+    """
+    async with engine.begin() as conn:
+        yield conn
+        state = _commit_sent.get()
+        if state is not None:
+            state["sent"] = True
+
+def _is_connection_error(e: BaseException) -> bool:
+    if isinstance(e, DBAPIError) and e.connection_invalidated:
+        return True
+    return isinstance(e, _CONNECTION_ERRORS)
+
+async def _run(db_call: Callable, rest_call: Callable):
+    """
+    Run `db_call` on the asyncpg pool, or `rest_call` (sync PostgREST) in a thread as fallback.
+
+    Only connection and pool failures fall back; SQL and data errors propagate. A write
+    whose COMMIT was already sent is not repeated over PostgREST (it may have been applied),
+    its error propagates instead.
+    """
+    if engine is not None:
+        state = {"sent": False}
+        token = _commit_sent.set(state)
+        try:
+            return await db_call()
+        except Exception as e:
+            if not _is_connection_error(e) or state["sent"]:
+                raise
+            print(f"Direct Postgres connection failed, falling back to PostgREST: {e}")
+        finally:
+            _commit_sent.reset(token)
+    return await asyncio.to_thread(rest_call)
+
+
+# --- Books ---
+
+async def get_book(book_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch a single book row by id. Returns None if it does not exist.
+    """
+    try:
+        book_uuid = _to_uuid(book_id)
+    except ValueError:
+        return None
+
+    async def db_call():
+        async with engine.connect() as conn:
+            result = await conn.execute(_select_book, {"book_id": book_uuid})
+            row = result.first()
+            return _row_to_dict(row) if row else None
+
+    def rest_call():
+        response = get_supabase().table("books").select("*").eq("id", str(book_id)).execute()
+        return response.data[0] if response.data else None
+
+    return await _run(db_call, rest_call)
+
+async def update_book(book_id: str, values: Dict[str, Any]) -> None:
+    """
+    Update columns of a book row (status, file_hash, error_message, ...).
+    """
+    async def db_call():
+        stmt = update(books_table).where(books_table.c.id == _to_uuid(book_id)).values(**values)
+        async with _begin() as conn:
+            await conn.execute(stmt)
+
+    def rest_call():
+        get_supabase().table("books").update(values).eq("id", str(book_id)).execute()
+
+    await _run(db_call, rest_call)
+
+
+# --- Personas ---
+
+async def get_persona(book_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch the persona for a book. Returns None if no persona was generated.
+    """
+    async def db_call():
+        async with engine.connect() as conn:
+            result = await conn.execute(_select_persona, {"book_id": _to_uuid(book_id)})
+            row = result.first()
+            return _row_to_dict(row) if row else None
+
+    def rest_call():
+        response = get_supabase().table("personas").select("*").eq("book_id", str(book_id)).execute()
+        return response.data[0] if response.data else None
+
+    return await _run(db_call, rest_call)
+
+async def insert_persona(book_id: str, role_name: str, system_prompt: str) -> None:
+    """
+    Create the persona row for a book.
+    """
+    values = {"book_id": str(book_id), "role_name": role_name, "system_prompt": system_prompt}
+
+    async def db_call():
+        async with _begin() as conn:
+            await conn.execute(_insert_persona, {**values, "book_id": _to_uuid(book_id)})
+
+    def rest_call():
+        get_supabase().table("personas").insert(values).execute()
+
+    await _run(db_call, rest_call)
+
+
+# --- Chat Messages ---
+
+async def insert_chat_messages(messages: List[Dict[str, Any]]) -> None:
+    """
+    Insert chat messages (book_id, user_id, role, content, truncated, created_at) in a single round trip.
+    """
+    if not messages:
+        return
+
+    async def db_call():
+        params = [
+            {
+                **m,
+                "book_id": _to_uuid(m["book_id"]),
+                "user_id": _to_uuid(m.get("user_id")),
+                "created_at": _to_datetime(m.get("created_at")) or datetime.now(timezone.utc),
+            }
+            for m in messages
+        ]
+        async with _begin() as conn:
+            await conn.execute(_insert_chat_messages, params)
+
+    def rest_call():
+        get_supabase().table("chat_messages").insert(messages).execute()
+
+    await _run(db_call, rest_call)
+
+async def list_chat_messages(
+    book_id: str,
+    limit: int,
+    before: Optional[Tuple[datetime, str]] = None,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Return the newest `limit` chat messages of a book strictly older than the
+    keyset cursor `before` (created_at, id), in chronological order,
+    and whether older messages remain.
+    """
+    async def db_call():
+        params = {"book_id": _to_uuid(book_id), "limit": limit + 1}
+        stmt = _select_chat_messages
+        if before:
+            stmt = _select_chat_messages_before
+            params.update({"before_created_at": before[0], "before_id": _to_uuid(before[1])})
+        async with engine.connect() as conn:
+            result = await conn.execute(stmt, params)
+            return [_row_to_dict(row) for row in result]
+
+    def rest_call():
+        query = get_supabase().table("chat_messages")\
+            .select("id, role, content, truncated, created_at, user_id")\
+            .eq("book_id", str(book_id))
+        if before:
+            created_at, message_id = before[0].isoformat(), str(before[1])
+            query = query.or_(f"created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{message_id})")
+        response = query\
+            .order("created_at", desc=True)\
+            .order("id", desc=True)\
+            .limit(limit + 1)\
+            .execute()
+        return response.data or []
+
+    rows = await _run(db_call, rest_call)
+    has_more = len(rows) > limit
+    return list(reversed(rows[:limit])), has_more
+
+
+# --- Conversation memory ---
+
+async def recent_conversation_messages(book_id: str, user_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    """
+    The newest `limit` messages of one (book, user) conversation, in chronological order.
+    """
+    async def db_call():
+        params = {"book_id": _to_uuid(book_id), "user_id": _to_uuid(user_id), "limit": limit}
+        async with engine.connect() as conn:
+            result = await conn.execute(_select_conversation_recent, params)
+            return [_row_to_dict(row) for row in result]
+
+    def rest_call():
+        query = get_supabase().table("chat_messages")\
+            .select("id, role, content, truncated, created_at")\
+            .eq("book_id", str(book_id))
+        query = query.is_("user_id", "null") if user_id is None else query.eq("user_id", str(user_id))
+        response = query\
+            .order("created_at", desc=True)\
+            .order("id", desc=True)\
+            .limit(limit)\
+            .execute()
+        return response.data or []
+
+    return list(reversed(await _run(db_call, rest_call)))
+
+async def conversation_messages_after(
+    book_id: str,
+    user_id: Optional[str],
+    after: Optional[Tuple[Any, str]],
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """
+    The oldest `limit` messages of one (book, user) conversation strictly after the
+    keyset cursor `after` (created_at, id), or from the start, in chronological order.
+    """
+    async def db_call():
+        params = {"book_id": _to_uuid(book_id), "user_id": _to_uuid(user_id), "limit": limit}
+        stmt = _select_conversation_oldest
+        if after:
+            stmt = _select_conversation_after
+            params.update({"after_created_at": _to_datetime(after[0]), "after_id": _to_uuid(after[1])})
+        async with engine.connect() as conn:
+            result = await conn.execute(stmt, params)
+            return [_row_to_dict(row) for row in result]
+
+    def rest_call():
+        query = get_supabase().table("chat_messages")\
+            .select("id, role, content, truncated, created_at")\
+            .eq("book_id", str(book_id))
+        query = query.is_("user_id", "null") if user_id is None else query.eq("user_id", str(user_id))
+        if after:
+            created_at, message_id = _to_datetime(after[0]).isoformat(), str(after[1])
+            query = query.or_(f"created_at.gt.{created_at},and(created_at.eq.{created_at},id.gt.{message_id})")
+        response = query\
+            .order("created_at")\
+            .order("id")\
+            .limit(limit)\
+            .execute()
+        return response.data or []
+
+    return await _run(db_call, rest_call)
+
+async def get_conversation_summary(book_id: str, user_key: str) -> Optional[Dict[str, Any]]:
+    """
+    The rolling summary of a conversation (summary, summarized_until, summarized_until_id), or None.
+    """
+    async def db_call():
+        async with engine.connect() as conn:
+            result = await conn.execute(_select_conversation_summary, {"book_id": _to_uuid(book_id), "user_key": user_key})
+            row = result.first()
+            return _row_to_dict(row) if row else None
+
+    def rest_call():
+        response = get_supabase().table("conversation_summaries")\
+            .select("summary, summarized_until, summarized_until_id")\
+            .eq("book_id", str(book_id))\
+            .eq("user_key", user_key)\
+            .execute()
+        return response.data[0] if response.data else None
+
+    return await _run(db_call, rest_call)
+
+async def save_conversation_summary(
+    book_id: str,
+    user_key: str,
+    summary: str,
+    until: Tuple[Any, str],
+    previous_id: Optional[str],
+) -> bool:
+    """
+    Store a summary folded up to message `until` (created_at, id), unless another worker
+    already moved the cursor past `previous_id`. Returns whether it was stored.
+    """
+    async def db_call():
+        params = {
+            "book_id": _to_uuid(book_id),
+            "user_key": user_key,
+            "summary": summary,
+            "summarized_until": _to_datetime(until[0]),
+            "summarized_until_id": _to_uuid(until[1]),
+            "previous_id": _to_uuid(previous_id),
+        }
+        async with _begin() as conn:
+            result = await conn.execute(_upsert_conversation_summary, params)
+            return result.first() is not None
+
+    def rest_call():
+        # PostgREST has no conditional upsert; callers serialize per conversation in-process
+        get_supabase().table("conversation_summaries").upsert({
+            "book_id": str(book_id),
+            "user_key": user_key,
+            "summary": summary,
+            "summarized_until": _to_datetime(until[0]).isoformat(),
+            "summarized_until_id": str(until[1]),
+        }, on_conflict="book_id,user_key").execute()
+        return True
+
+    return await _run(db_call, rest_call)
+
+
+# --- Documents (Vector Store) ---
+
+async def match_documents(
+    query_embedding: List[float],
+    match_count: int,
+    filter: Optional[Dict[str, Any]] = None,
+    match_threshold: float = 0.0,
+    with_embeddings: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Call the `match_documents` SQL function (see schema.sql).
+    Returns rows with id, content, metadata and similarity (and `embedding`,
+    in pgvector text form, if `with_embeddings`).
+    """
+    filter = filter or {}
+
+    async def db_call():
+        params = {
+            "query_embedding": format_vector(query_embedding),
+            "match_threshold": match_threshold,
+            "match_count": match_count,
+            "filter": json.dumps(filter),
+            "ef_search": settings.VECTOR_SEARCH_EF_SEARCH,
+        }
+        statement = _match_documents_with_embeddings if with_embeddings else _match_documents
+        async with engine.connect() as conn:
+            result = await conn.execute(statement, params)
+            return [dict(row._mapping) for row in result]
+
+    def rest_call():
+        response = get_supabase().rpc("match_documents", {
+            "query_embedding": query_embedding,
+            "match_threshold": match_threshold,
+            "match_count": match_count,
+            "filter": filter,
+            "ef_search": settings.VECTOR_SEARCH_EF_SEARCH,
+        }).execute()
+        rows = response.data or []
+        if with_embeddings and rows:
+            vectors = get_supabase().table("documents")\
+                .select("id, embedding")\
+                .in_("id", [row["id"] for row in rows])\
+                .execute()
+            by_id = {row["id"]: row["embedding"] for row in vectors.data or []}
+            for row in rows:
+                row["embedding"] = by_id.get(row["id"])
+        return rows
+
+    return await _run(db_call, rest_call)
+
+async def match_documents_lexical(
+    query_text: str,
+    match_count: int,
+    filter: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Call the `match_documents_lexical` SQL function (full-text search, see schema.sql).
+    Returns rows with id, content, metadata, rank and embedding (pgvector text form).
+    """
+    filter = filter or {}
+
+    async def db_call():
+        params = {"query_text": query_text, "match_count": match_count, "filter": json.dumps(filter)}
+        async with engine.connect() as conn:
+            result = await conn.execute(_match_documents_lexical, params)
+            return [dict(row._mapping) for row in result]
+
+    def rest_call():
+        response = get_supabase().rpc("match_documents_lexical", {
+            "query_text": query_text,
+            "match_count": match_count,
+            "filter": filter,
+        }).execute()
+        return response.data or []
+
+    return await _run(db_call, rest_call)
+
+_select_document_vectors = text(
+    "select id, content, metadata, embedding::text as embedding "
+    "from documents where file_hash = :file_hash order by id"
+).columns(id=BigInteger, content=Text, metadata=JSONB, embedding=Text)
+
+async def fetch_document_vectors(file_hash: str, page_size: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Load every chunk of a book (id, content, metadata, embedding) for the in-memory vector index.
+    `embedding` is returned in pgvector text form ('[0.1,0.2,...]').
+    """
+    async def db_call():
+        async with engine.connect() as conn:
+            result = await conn.execute(_select_document_vectors, {"file_hash": str(file_hash)})
+            return [dict(row._mapping) for row in result]
+
+    def rest_call():
+        # PostgREST caps rows per response, so page through the book.
+        rows = []
+        start = 0
+        while True:
+            response = get_supabase().table("documents")\
+                .select("id, content, metadata, embedding")\
+                .eq("file_hash", str(file_hash))\
+                .order("id")\
+                .range(start, start + page_size - 1)\
+                .execute()
+            rows.extend(response.data or [])
+            if not response.data or len(response.data) < page_size:
+                return rows
+            start += page_size
+
+    return await _run(db_call, rest_call)
+
+_select_committed_chunks = text(
+    "select distinct (metadata->>'chunk_index')::int as chunk_index "
+    "from documents where file_hash = :file_hash and metadata->>'chunk_index' is not null"
+)
+
+async def committed_chunk_indexes(file_hash: str, page_size: int = 1000) -> Set[int]:
+    """
+    Return the `chunk_index` values already stored for a book (ingestion checkpoint).
+    """
+    async def db_call():
+        async with engine.connect() as conn:
+            result = await conn.execute(_select_committed_chunks, {"file_hash": str(file_hash)})
+            return {row.chunk_index for row in result}
+
+    def rest_call():
+        indexes = set()
+        start = 0
+        while True:
+            response = get_supabase().table("documents")\
+                .select("chunk_index:metadata->>chunk_index")\
+                .eq("file_hash", str(file_hash))\
+                .order("id")\
+                .range(start, start + page_size - 1)\
+                .execute()
+            data = response.data or []
+            indexes.update(int(row["chunk_index"]) for row in data if row.get("chunk_index") is not None)
+            if len(data) < page_size:
+                return indexes
+            start += page_size
+
+    return await _run(db_call, rest_call)
+
+# Chunks numbered by another chunker (or before chunks were tagged) do not line up with the checkpoint
+_delete_stale_chunks_batch = text(
+    "delete from documents where id in ("
+    "  select id from documents where file_hash = :file_hash "
+    "  and metadata->>'chunker' is distinct from :chunker "
+    "  limit :batch_size"
+    ")"
+)
+
+async def delete_stale_chunks(file_hash: str, chunker: str, batch_size: int) -> int:
+    """
+    Delete up to `batch_size` chunks of `file_hash` not made by `chunker`. Returns the number deleted.
+    """
+    async def db_call():
+        async with _begin() as conn:
+            result = await conn.execute(
+                _delete_stale_chunks_batch, {"file_hash": str(file_hash), "chunker": chunker, "batch_size": batch_size}
+            )
+            return result.rowcount
+
+    def rest_call():
+        ids = get_supabase().table("documents").select("id")\
+            .eq("file_hash", str(file_hash))\
+            .or_(f"metadata->>chunker.is.null,metadata->>chunker.neq.{chunker}")\
+            .limit(batch_size)\
+            .execute()
+        id_list = [row["id"] for row in ids.data or []]
+        if not id_list:
+            return 0
+        response = get_supabase().table("documents").delete(count="exact", returning="minimal").in_("id", id_list).execute()
+        return response.count if response.count is not None else len(id_list)
+
+    return await _run(db_call, rest_call)
+
+async def insert_documents(rows: List[Dict[str, Any]]) -> None:
+    """
+    Insert chunks (content, metadata, embedding) as one multi-row INSERT.
+    The batch is committed atomically, so it is either fully stored or not at all.
+    """
+    if not rows:
+        return
+
+    async def db_call():
+        async with _begin() as conn:
+            await conn.execute(insert(documents_table).values(rows))
+
+    def rest_call():
+        get_supabase().table("documents").insert(rows).execute()
+
+    await _run(db_call, rest_call)
+
+_select_books_by_hash = select(
+    books_table.c.id,
+    books_table.c.status,
+    books_table.c.stage,
+    books_table.c.created_at,
+).where(books_table.c.file_hash == bindparam("file_hash")).order_by(books_table.c.created_at)
+
+async def find_books_by_file_hash(file_hash: str) -> List[Dict[str, Any]]:
+    """
+    Return every book (id, status, stage, created_at) sharing a content hash, oldest first.
+    """
+    async def db_call():
+        async with engine.connect() as conn:
+            result = await conn.execute(_select_books_by_hash, {"file_hash": str(file_hash)})
+            return [_row_to_dict(row) for row in result]
+
+    def rest_call():
+        response = get_supabase().table("books")\
+            .select("id, status, stage, created_at")\
+            .eq("file_hash", str(file_hash))\
+            .order("created_at")\
+            .execute()
+        return response.data or []
+
+    return await _run(db_call, rest_call)
+
+
+# --- Ingestion Jobs (durable queue, see schema.sql) ---
+
+class JobQueueUnavailable(RuntimeError):
+    """Raised when the job queue is used without a direct Postgres connection."""
+
+_claim_ingestion_job = text(
+    "update ingestion_jobs set "
+    "status = 'running', attempts = attempts + 1, locked_by = :worker_id, "
+    "lease_expires_at = now() + make_interval(secs => :lease_seconds), updated_at = now() "
+    "where id = ("
+    "  select id from ingestion_jobs "
+    "  where attempts < max_attempts and ("
+    "    (status = 'queued' and run_after <= now()) "
+    "    or (status = 'running' and lease_expires_at < now())"
+    "  ) "
+    "  order by run_after, id "
+    "  for update skip locked "
+    "  limit 1"
+    ") "
+    "returning id, book_id, bucket_name, file_path, attempts, max_attempts"
+)
+
+_heartbeat_ingestion_job = text(
+    "update ingestion_jobs set lease_expires_at = now() + make_interval(secs => :lease_seconds), updated_at = now() "
+    "where id = :job_id and locked_by = :worker_id and status = 'running'"
+)
+
+_complete_ingestion_job = text(
+    "update ingestion_jobs set status = 'done', locked_by = null, lease_expires_at = null, updated_at = now() "
+    "where id = :job_id and locked_by = :worker_id"
+)
+
+_fail_ingestion_job = text(
+    "update ingestion_jobs set "
+    "status = case when attempts < max_attempts then 'queued' else 'failed' end, "
+    "run_after = now() + make_interval(secs => :retry_delay), "
+    "last_error = :error, locked_by = null, lease_expires_at = null, updated_at = now() "
+    "where id = :job_id and locked_by = :worker_id "
+    "returning status"
+)
+
+# Jobs whose worker died during the last attempt: nobody will claim them again
+_reap_ingestion_jobs = text(
+    "update ingestion_jobs set "
+    "status = 'failed', last_error = 'lease expired', locked_by = null, lease_expires_at = null, updated_at = now() "
+    "where id in ("
+    "  select id from ingestion_jobs "
+    "  where status = 'running' and lease_expires_at < now() and attempts >= max_attempts "
+    "  for update skip locked "
+    "  limit :limit"
+    ") "
+    "returning id, book_id"
+)
+
+def _require_engine():
+    if engine is None:
+        raise JobQueueUnavailable("The ingestion job queue requires DATABASE_URL (direct Postgres connection).")
+
+async def enqueue_ingestion_job(book_id: str, bucket_name: str, file_path: str) -> None:
+    """
+    Add a book to the durable ingestion queue.
+    """
+    values = {"book_id": str(book_id), "bucket_name": bucket_name, "file_path": file_path}
+
+    async def db_call():
+        async with _begin() as conn:
+            await conn.execute(
+                text(
+                    "insert into ingestion_jobs (book_id, bucket_name, file_path, max_attempts) "
+                    "values (CAST(:book_id AS uuid), :bucket_name, :file_path, :max_attempts)"
+                ),
+                {**values, "max_attempts": settings.JOB_MAX_ATTEMPTS},
+            )
+
+    def rest_call():
+        get_supabase().table("ingestion_jobs").insert({**values, "max_attempts": settings.JOB_MAX_ATTEMPTS}).execute()
+
+    await _run(db_call, rest_call)
+
+async def claim_ingestion_job(worker_id: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+    """
+    Atomically claim the next runnable job (FOR UPDATE SKIP LOCKED), including
+    jobs whose previous worker let the lease expire. Returns None if the queue is empty.
+    """
+    _require_engine()
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            _claim_ingestion_job, {"worker_id": worker_id, "lease_seconds": lease_seconds}
+        )
+        row = result.first()
+        return _row_to_dict(row) if row else None
+
+async def heartbeat_ingestion_job(job_id: int, worker_id: str, lease_seconds: float) -> bool:
+    """
+    Extend the lease of a running job. Returns False if the lease was lost to another worker.
+    """
+    _require_engine()
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            _heartbeat_ingestion_job,
+            {"job_id": job_id, "worker_id": worker_id, "lease_seconds": lease_seconds},
+        )
+        return result.rowcount > 0
+
+async def complete_ingestion_job(job_id: int, worker_id: str) -> None:
+    _require_engine()
+    async with engine.begin() as conn:
+        await conn.execute(_complete_ingestion_job, {"job_id": job_id, "worker_id": worker_id})
+
+async def fail_ingestion_job(job_id: int, worker_id: str, error: str, retry_delay: float) -> Optional[str]:
+    """
+    Record a failed attempt. The job is re-queued after `retry_delay` seconds while
+    attempts remain. Returns the new status ('queued' or 'failed').
+    """
+    _require_engine()
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            _fail_ingestion_job,
+            {"job_id": job_id, "worker_id": worker_id, "error": error, "retry_delay": retry_delay},
+        )
+        row = result.first()
+        return row.status if row else None
+
+async def reap_ingestion_jobs(limit: int = 100) -> List[Dict[str, Any]]:
+    """
+    Fail running jobs whose lease expired on their last attempt (the worker was killed
+    or redeployed mid-job). Returns the reaped jobs (id, book_id).
+    """
+    _require_engine()
+    async with engine.begin() as conn:
+        result = await conn.execute(_reap_ingestion_jobs, {"limit": limit})
+        return [_row_to_dict(row) for row in result]
+
+# --- Vector lifecycle / garbage collection ---
+# Vectors are shared by every book with the same file_hash; they are garbage once
+# no book references the hash. Deletes run in bounded batches and return counts only.
+
+_count_book_references = text("select count(*) from books where file_hash = :file_hash")
+
+# The NOT EXISTS re-check makes each batch a no-op once a book references the hash again
+_delete_documents_batch = text(
+    "delete from documents where id in ("
+    "  select id from documents where file_hash = :file_hash "
+    "  and not exists (select 1 from books where file_hash = :file_hash) "
+    "  limit :batch_size"
+    ")"
+)
+
+# Loose index scan over documents_file_hash_idx: one index probe per distinct hash
+_select_orphaned_file_hashes = text(
+    "with recursive hashes as ("
+    "  (select file_hash from documents where file_hash is not null order by file_hash limit 1) "
+    "  union all "
+    "  select (select d.file_hash from documents d where d.file_hash > h.file_hash order by d.file_hash limit 1) "
+    "  from hashes h where h.file_hash is not null"
+    ") "
+    "select h.file_hash from hashes h "
+    "where h.file_hash is not null "
+    "and not exists (select 1 from books b where b.file_hash = h.file_hash) "
+    "limit :limit"
+)
+
+_delete_orphaned_personas = text(
+    "delete from personas where id in ("
+    "  select p.id from personas p "
+    "  where p.book_id is null or not exists (select 1 from books b where b.id = p.book_id) "
+    "  limit :batch_size"
+    ")"
+)
+
+# Arbitrary application-wide key for pg_try_advisory_lock: one GC pass at a time
+_GC_LOCK_KEY = 7_264_901
+
+async def count_book_references(file_hash: str) -> int:
+    """
+    Number of books (any status) that use the vectors of `file_hash`.
+    """
+    async def db_call():
+        async with engine.connect() as conn:
+            return (await conn.execute(_count_book_references, {"file_hash": str(file_hash)})).scalar_one()
+
+    def rest_call():
+        response = get_supabase().table("books").select("id", count="exact").eq("file_hash", str(file_hash)).limit(1).execute()
+        return response.count or 0
+
+    return await _run(db_call, rest_call)
+
+async def delete_documents_batch(file_hash: str, batch_size: int) -> int:
+    """
+    Delete up to `batch_size` chunks of an unreferenced file_hash. Returns the number deleted
+    (0 once none are left, or if a book references the hash).
+    """
+    async def db_call():
+        async with _begin() as conn:
+            result = await conn.execute(_delete_documents_batch, {"file_hash": str(file_hash), "batch_size": batch_size})
+            return result.rowcount
+
+    def rest_call():
+        # No atomic re-check over PostgREST; callers check count_book_references first
+        ids = get_supabase().table("documents").select("id").eq("file_hash", str(file_hash)).limit(batch_size).execute()
+        id_list = [row["id"] for row in ids.data or []]
+        if not id_list:
+            return 0
+        response = get_supabase().table("documents").delete(count="exact", returning="minimal").in_("id", id_list).execute()
+        return response.count if response.count is not None else len(id_list)
+
+    return await _run(db_call, rest_call)
+
+async def find_orphaned_file_hashes(limit: int) -> List[str]:
+    """
+    file_hash values that still have vectors but no book. Requires DATABASE_URL.
+    """
+    async with engine.connect() as conn:
+        result = await conn.execute(_select_orphaned_file_hashes, {"limit": limit})
+        return [row.file_hash for row in result]
+
+async def delete_orphaned_personas(batch_size: int) -> int:
+    """
+    Delete up to `batch_size` personas whose book is gone. Requires DATABASE_URL.
+    """
+    async with engine.begin() as conn:
+        result = await conn.execute(_delete_orphaned_personas, {"batch_size": batch_size})
+        return result.rowcount
+
+@asynccontextmanager
+async def gc_lock() -> AsyncIterator[bool]:
+    """
+    Hold a session-level advisory lock for one GC pass; yields False if another
+    process holds it. Requires DATABASE_URL.
+    """
+    async with engine.connect() as conn:
+        acquired = (await conn.execute(text("select pg_try_advisory_lock(:key)"), {"key": _GC_LOCK_KEY})).scalar_one()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute(text("select pg_advisory_unlock(:key)"), {"key": _GC_LOCK_KEY})
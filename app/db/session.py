@@ -1,17 +1,54 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from typing import Optional
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import ArgumentError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+def get_async_database_url(url: Optional[str]) -> Optional[str]:
+    """
+    Normalize DATABASE_URL to the asyncpg driver.
+    Returns None if the URL is missing or is not a Postgres DSN
+    (e.g. the Supabase project https URL), so callers fall back to PostgREST.
+    """
+    if not url:
+        return None
+    try:
+        parsed = make_url(url)
+    except ArgumentError:
+        return None
+    if parsed.get_backend_name() not in ("postgres", "postgresql"):
+        return None
+    
+    # asyncpg prepares every statement; SQLAlchemy keeps its own cache on top of it.
+    return parsed.set(drivername="postgresql+asyncpg").update_query_dict({
+        "prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)
+    }).render_as_string(hide_password=False)
 
-AsyncSessionLocal = sessionmaker(
-    bind=engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autocommit=False,
-    autoflush=False,
-)
+database_url = get_async_database_url(settings.DATABASE_URL)
+
+engine: Optional[AsyncEngine] = None
+AsyncSessionLocal = None
+
+if database_url:
+    engine = create_async_engine(
+        database_url,
+        echo=False,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+        connect_args={"statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE},
+    )
+
+    AsyncSessionLocal = sessionmaker(
+        bind=engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False,
+    )
 
 async def get_db():
     async with AsyncSessionLocal() as session:
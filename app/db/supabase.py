@@ -1,13 +1,14 @@
-from supabase import create_client, Client
+from app.core.clients import shared
 from app.core.config import settings
 
-def get_supabase() -> Client:
+def get_supabase():
     """
-    Return a Supabase client instance.
+    Return the shared Supabase client, created (and the SDK imported) on first use.
     Using SERVICE_KEY to bypass Row Level Security (RLS) for backend operations.
     """
-    url: str = settings.SUPABASE_URL
-    key: str = settings.SUPABASE_SERVICE_KEY
-    return create_client(url, key)
-
-supabase: Client = get_supabase()
+    def build():
+        from supabase import create_client
+        url: str = settings.SUPABASE_URL
+        key: str = settings.SUPABASE_SERVICE_KEY
+        return create_client(url, key)
+    return shared("supabase", build)
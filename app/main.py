@@ -1,7 +1,30 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.api import api_router
+from app.core import clients
 from app.core.config import settings
+from app.services.book_cache import book_cache
+from app.services.chat_history_writer import chat_history_writer
+from app.services.gc_service import garbage_collector
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clients are built in the background; /ready turns 200 once they are
+    warm_up = asyncio.create_task(clients.warm_up())
+    if settings.BOOK_CACHE_LISTEN:
+        await book_cache.start_listener()
+    chat_history_writer.start()
+    if settings.GC_ENABLED:
+        garbage_collector.start()
+    yield
+    warm_up.cancel()
+    await garbage_collector.stop()
+    # Drain buffered chat history before the worker exits (redeploys)
+    await chat_history_writer.stop()
+    await book_cache.stop_listener()
+    await clients.close()
 
 app = FastAPI(
     title="The Morphing Book",
@@ -9,14 +32,17 @@ app = FastAPI(
     version="3.0.0",
     openapi_url=f"/api/v1/openapi.json",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS Configuration
 origins = ["*"]
 
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.core.metrics import render_metrics
 
 # ... (Previous code)
 
@@ -35,6 +61,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Chat history pagination cursor, read by the browser
 )
 
 app.include_router(api_router, prefix="/api/v1")
@@ -46,6 +73,20 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 async def root():
     return FileResponse("app/static/index.html")
 
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    """
+    Readiness probe: 503 until warm-up (clients, database connection) is complete.
+    """
+    return JSONResponse(clients.readiness.status(), status_code=200 if clients.readiness.ready else 503)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus scrape endpoint.
+    """
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
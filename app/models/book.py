@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Boolean, ForeignKey, Enum as SqEnum, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import enum
@@ -12,13 +12,19 @@ class BookStatus(str, enum.Enum):
     FAILED = "failed"
 
 class Book(Base):
+    # Mirrors the `books` table in schema.sql (Supabase)
+    __tablename__ = "books"
+    
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=True) # Null for official books
     title = Column(String, nullable=False)
-    owner_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=True) # Null for official books
-    is_official = Column(Boolean, default=False)
-    file_hash = Column(String, unique=True, index=True, nullable=False)
-    status = Column(SqEnum(BookStatus, native_enum=False), default=BookStatus.PROCESSING)
+    file_path = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default=BookStatus.PROCESSING.value)
+    stage = Column(String, nullable=True) # Ingestion stage: queued, downloading, parsing, ...
+    chunks_indexed = Column(Integer, nullable=True)
+    chunks_total = Column(Integer, nullable=True) # Known once parsing finishes
     error_message = Column(Text, nullable=True)
+    file_hash = Column(String, index=True, nullable=True) # Shared by duplicate uploads
     
     # Relationships
     persona = relationship("Persona", back_populates="book", uselist=False)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, Text, ForeignKey, Enum as SqEnum
+from sqlalchemy import Boolean, Column, String, Text, ForeignKey, false
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import enum
@@ -11,11 +11,14 @@ class ChatRole(str, enum.Enum):
     ASSISTANT = "assistant"
 
 class ChatMessages(Base):
+    __tablename__ = "chat_messages"
+    
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=False)
-    book_id = Column(UUID(as_uuid=True), ForeignKey("book.id"), nullable=False)
-    role = Column(SqEnum(ChatRole, native_enum=False), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=True)
+    book_id = Column(UUID(as_uuid=True), ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    role = Column(String, nullable=False) # ChatRole value
     content = Column(Text, nullable=False)
+    truncated = Column(Boolean, nullable=False, default=False, server_default=false())  # Cut short by a client disconnect
     
     # Relationships
     user = relationship("User", back_populates="chat_messages")
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+
+from app.db.base_class import Base
+
+class ConversationSummary(Base):
+    """
+    Rolling summary of the chat turns of one (book, user) that fell out of the verbatim window.
+    """
+    __tablename__ = "conversation_summaries"
+    
+    book_id = Column(UUID(as_uuid=True), ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    user_key = Column(Text, primary_key=True, server_default="")  # user_id, "" for anonymous chats
+    summary = Column(Text, nullable=False, server_default="")
+    # Last chat_messages row folded into the summary (keyset cursor: created_at, id)
+    summarized_until = Column(DateTime(timezone=True), nullable=True)
+    summarized_until_id = Column(UUID(as_uuid=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,51 @@
+from sqlalchemy import BigInteger, Column, Computed, Table, Text, cast
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.types import UserDefinedType
+
+from app.db.base_class import Base
+
+EMBEDDING_DIM = 768
+
+def format_vector(embedding) -> str:
+    """
+    Render an embedding as a pgvector literal ('[0.1,0.2,...]').
+    """
+    return "[" + ",".join(repr(float(x)) for x in embedding) + "]"
+
+class Vector(UserDefinedType):
+    """
+    pgvector column type. Values are sent as text ('[0.1,0.2,...]') and cast
+    server-side, since asyncpg has no codec registered for `vector`.
+    """
+    cache_ok = True
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def get_col_spec(self, **kw) -> str:
+        return f"vector({self.dim})"
+
+    def bind_processor(self, dialect):
+        def process(value):
+            if value is None or isinstance(value, str):
+                return value
+            return format_vector(value)
+        return process
+
+    def bind_expression(self, bindvalue):
+        return cast(cast(bindvalue, Text), self)
+
+# Documents Table (Vector Store). Managed by schema.sql / LangChain, so it is a plain
+# Table rather than a mapped class (it has no created_at and a `metadata` column).
+documents_table = Table(
+    "documents",
+    Base.metadata,
+    Column("id", BigInteger, primary_key=True),
+    Column("content", Text),
+    Column("metadata", JSONB),
+    Column("embedding", Vector(EMBEDDING_DIM)),
+    # Generated from metadata->>'file_hash' and indexed (schema.sql); never written directly
+    Column("file_hash", Text, Computed("metadata->>'file_hash'", persisted=True), index=True),
+    # Full-text search vector ('simple' config), GIN-indexed in schema.sql
+    Column("content_tsv", TSVECTOR, Computed("to_tsvector('simple', coalesce(content, ''))", persisted=True)),
+)
@@ -6,9 +6,11 @@ from sqlalchemy.orm import relationship
 from app.db.base_class import Base
 
 class Persona(Base):
+    __tablename__ = "personas"
+    
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    book_id = Column(UUID(as_uuid=True), ForeignKey("book.id"), nullable=False)
-    role_name = Column(String, nullable=False)
+    book_id = Column(UUID(as_uuid=True), ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    role_name = Column(String, nullable=True)
     system_prompt = Column(Text, nullable=False)
     
     # Relationships
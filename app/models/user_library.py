@@ -12,7 +12,7 @@ class AccessLevel(str, enum.Enum):
 
 class UserLibrary(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), primary_key=True)
-    book_id = Column(UUID(as_uuid=True), ForeignKey("book.id"), primary_key=True)
+    book_id = Column(UUID(as_uuid=True), ForeignKey("books.id"), primary_key=True)
     access_level = Column(SqEnum(AccessLevel), default=AccessLevel.PURCHASED)
     
     # Relationships
@@ -1,9 +1,11 @@
 from pydantic import BaseModel, ConfigDict
 from uuid import UUID
 from datetime import datetime
+from typing import Literal, Optional
 
 class ChatRequest(BaseModel):
     message: str
+    retrieval_mode: Optional[Literal["vector", "hybrid", "lexical"]] = None  # Defaults to settings.RETRIEVAL_MODE
 
 # Although Streaming Response is used, this helps documentation
 class ChatResponse(BaseModel):
@@ -13,6 +15,7 @@ class ChatMessage(BaseModel):
     id: UUID
     role: str
     content: str
+    truncated: bool = False
     created_at: datetime
     
     model_config = ConfigDict(from_attributes=True)
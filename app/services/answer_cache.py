@@ -0,0 +1,172 @@
+import hashlib
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+def persona_digest(system_content: str) -> str:
+    """
+    Short digest of the system prompt; a changed persona never replays old answers.
+    """
+    return hashlib.sha256(system_content.encode("utf-8")).hexdigest()[:16]
+
+def split_for_replay(answer: str, size: int = 200) -> List[str]:
+    """
+    Cut a stored answer into SSE-sized pieces so a replay streams like a generation.
+    """
+    return [answer[i:i + size] for i in range(0, len(answer), size)] or [""]
+
+class _Scope:
+    """
+    Answered questions of one (file_hash, persona): unit-length question embeddings
+    stacked into a matrix, so a lookup is one matrix-vector product.
+    """
+    def __init__(self):
+        self.entries: List[Tuple[float, str, str]] = []  # (created_at, question, answer)
+        self.vectors: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.stack(self.vectors)
+        return self._matrix
+
+    def add(self, vector: np.ndarray, entry: Tuple[float, str, str], max_entries: int):
+        self.entries.append(entry)
+        self.vectors.append(vector)
+        del self.entries[:-max_entries]
+        del self.vectors[:-max_entries]
+        self._matrix = None
+
+    def expire(self, cutoff: float):
+        keep = [i for i, entry in enumerate(self.entries) if entry[0] >= cutoff]
+        if len(keep) < len(self.entries):
+            self.entries = [self.entries[i] for i in keep]
+            self.vectors = [self.vectors[i] for i in keep]
+            self._matrix = None
+
+class AnswerCache:
+    """
+    Semantic cache of chat answers, scoped per file_hash + persona. A question whose
+    embedding is within `similarity` (cosine) of an answered one gets that answer
+    replayed instead of a retrieval + generation.
+
+    Bounded by a TTL, a per-book cap and a global cap (least recently used books are
+    evicted first). Dropped per file_hash when a book is re-indexed or deleted, and
+    per book_id when the book cache sees the book or its persona change. The
+    book_id -> file_hash map only holds books whose file_hash still has cached answers.
+    """
+    def __init__(self, similarity: float, ttl_seconds: float, max_entries: int, max_per_book: int):
+        self.similarity = similarity
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_per_book = max_per_book
+        self._scopes: "OrderedDict[Tuple[str, str], _Scope]" = OrderedDict()
+        self._book_hashes: Dict[str, str] = {}
+        self._hash_books: Dict[str, Set[str]] = {}
+        self._hash_scopes: Counter = Counter()  # Cached scopes (personas) per file_hash
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, file_hash: str, system_content: str, query_embedding: List[float]) -> Optional[str]:
+        """
+        Return the stored answer for the closest answered question, if similar enough.
+        """
+        key = (file_hash, persona_digest(system_content))
+        scope = self._scopes.get(key)
+        if scope is not None:
+            before = len(scope.entries)
+            scope.expire(time.time() - self.ttl_seconds)
+            self._size -= before - len(scope.entries)
+            if not scope.entries:
+                self._drop_scope(key)
+                scope = None
+
+        if scope is not None:
+            scores = scope.matrix() @ self._normalize(query_embedding)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity:
+                self._scopes.move_to_end(key)
+                self.hits += 1
+                return scope.entries[best][2]
+
+        self.misses += 1
+        return None
+
+    def put(self, book_id: str, file_hash: str, system_content: str, question: str, query_embedding: List[float], answer: str):
+        key = (file_hash, persona_digest(system_content))
+        scope = self._scopes.get(key)
+        if scope is None:
+            scope = self._scopes[key] = _Scope()
+            self._hash_scopes[file_hash] += 1
+        self._scopes.move_to_end(key)
+        previous = self._book_hashes.get(str(book_id))
+        if previous != file_hash:
+            if previous is not None:
+                self._hash_books[previous].discard(str(book_id))
+            self._book_hashes[str(book_id)] = file_hash
+            self._hash_books.setdefault(file_hash, set()).add(str(book_id))
+
+        before = len(scope.entries)
+        scope.add(self._normalize(query_embedding), (time.time(), question, answer), self.max_per_book)
+        self._size += len(scope.entries) - before
+
+        while self._size > self.max_entries and self._scopes:
+            self._drop_scope(next(iter(self._scopes)))
+
+    def _drop_scope(self, key: Tuple[str, str]):
+        self._size -= len(self._scopes.pop(key).entries)
+        file_hash = key[0]
+        self._hash_scopes[file_hash] -= 1
+        if self._hash_scopes[file_hash] <= 0:
+            # Last scope of this content: forget the books that pointed at it
+            del self._hash_scopes[file_hash]
+            for book_id in self._hash_books.pop(file_hash, ()):
+                self._book_hashes.pop(book_id, None)
+
+    def invalidate(self, file_hash: str):
+        """
+        Drop every answer for a book's content (vectors added or deleted).
+        """
+        for key in [key for key in self._scopes if key[0] == file_hash]:
+            self._drop_scope(key)
+
+    def invalidate_book(self, book_id: str):
+        file_hash = self._book_hashes.pop(str(book_id), None)
+        if file_hash:
+            self.invalidate(file_hash)
+
+    def clear(self):
+        self._scopes.clear()
+        self._book_hashes.clear()
+        self._hash_books.clear()
+        self._hash_scopes.clear()
+        self._size = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "books": len(self._scopes),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+answer_cache = AnswerCache(
+    similarity=settings.ANSWER_CACHE_SIMILARITY,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    max_per_book=settings.ANSWER_CACHE_MAX_PER_BOOK,
+)
@@ -0,0 +1,188 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.db import repository
+from app.services.answer_cache import answer_cache
+from app.services.vector_index import vector_index_cache
+
+# Postgres NOTIFY channel fed by the `notify_book_change` trigger (schema.sql)
+BOOK_CHANGED_CHANNEL = "book_changed"
+
+def build_system_content(persona: Optional[Dict[str, Any]]) -> str:
+    """
+    Assemble the chat system prompt from a persona row.
+    """
+    if persona:
+        return f"Role: {persona['role_name']}\nInstructions: {persona['system_prompt']}"
+    return "You are a helpful assistant."
+
+class BookCache:
+    """
+    Read-through cache of what chat needs per book: the book row (status, file_hash,
+    user_id) and the assembled system prompt. Only `ready` books are cached.
+    Entries expire after a TTL and are dropped explicitly when ingestion finishes,
+    or via Postgres NOTIFY when any process changes the book or its persona. A load
+    that was invalidated while in flight is returned but not cached.
+
+    The LISTEN connection is checked every BOOK_CACHE_LISTEN_CHECK_SECONDS and
+    re-opened with backoff when it drops. Notifications sent while it was down are
+    lost, so every cache is cleared when it comes back.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._listener: Optional[asyncio.Task] = None
+        self._loading: Counter = Counter()  # Loads in flight per book
+        self._generations: Dict[str, int] = {}  # Invalidations per book, while it is loading
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, book_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return {"book": row, "system_content": str}, or None if the book does not exist.
+        """
+        entry = self._entries.get(book_id)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+            self._entries.move_to_end(book_id)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        self._loading[book_id] += 1
+        generation = self._generations.get(book_id, 0)
+        try:
+            # Both lookups in parallel: one round trip of latency instead of two
+            book, persona = await asyncio.gather(
+                repository.get_book(book_id),
+                repository.get_persona(book_id),
+            )
+        finally:
+            self._loading[book_id] -= 1
+            invalidated = self._generations.get(book_id, 0) != generation
+            if not self._loading[book_id]:
+                del self._loading[book_id]
+                self._generations.pop(book_id, None)
+        if not book:
+            self._entries.pop(book_id, None)
+            return None
+
+        context = {"book": book, "system_content": build_system_content(persona)}
+        if book.get("status") == "ready" and not invalidated:
+            self._entries[book_id] = (time.monotonic(), context)
+            self._entries.move_to_end(book_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.pop(book_id, None)
+        return context
+
+    def invalidate(self, book_id: str, file_hash: Optional[str] = None):
+        """
+        Drop a book's entry and what was derived from it: cached answers and, when its
+        file_hash is known (here or from the NOTIFY payload), the in-process vector index.
+        """
+        entry = self._entries.pop(str(book_id), None)
+        if str(book_id) in self._loading:
+            # Loads in flight may have read the old row: don't let them cache it
+            self._generations[str(book_id)] = self._generations.get(str(book_id), 0) + 1
+        # Re-indexed or new persona: answers cached for this book are stale too
+        answer_cache.invalidate_book(str(book_id))
+        hashes = {file_hash, entry[1]["book"].get("file_hash") if entry else None} - {None, ""}
+        for stale_hash in hashes:
+            vector_index_cache.invalidate(stale_hash)
+
+    def clear(self):
+        self._entries.clear()
+        for book_id in self._loading:
+            self._generations[book_id] = self._generations.get(book_id, 0) + 1
+        answer_cache.clear()
+        vector_index_cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    # --- Cross-worker invalidation (Postgres LISTEN/NOTIFY) ---
+
+    def _on_notify(self, connection, pid, channel, payload):
+        # Payload: "<book_id>" (persona changes) or "<book_id>:<file_hash>" (book changes)
+        if payload:
+            book_id, _, file_hash = payload.partition(":")
+            self.invalidate(book_id, file_hash or None)
+        else:
+            self.clear()
+
+    async def start_listener(self):
+        """
+        LISTEN on BOOK_CHANGED_CHANNEL using a dedicated connection from the pool,
+        kept open by a background task. Requires DATABASE_URL; without it, entries
+        only expire by TTL.
+        """
+        if repository.engine is None or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop_listener(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self):
+        delay = settings.BOOK_CACHE_LISTEN_RETRY_SECONDS
+        first_attempt = True
+        while True:
+            try:
+                await self._listen_once(clear=not first_attempt)
+                # It was up until now: start the backoff over
+                delay = settings.BOOK_CACHE_LISTEN_RETRY_SECONDS
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Book cache listener failed, retrying in {delay:.0f}s: {e}")
+            first_attempt = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.BOOK_CACHE_LISTEN_RETRY_MAX_SECONDS)
+
+    async def _listen_once(self, clear: bool):
+        """
+        Hold one LISTEN connection until it is lost.
+        """
+        lost = asyncio.Event()
+        conn = await repository.engine.connect()
+        try:
+            raw = await conn.get_raw_connection()
+            driver = raw.driver_connection
+            driver.add_termination_listener(lambda _: lost.set())
+            await driver.add_listener(BOOK_CHANGED_CHANNEL, self._on_notify)
+            if clear:
+                # Changes made while nobody listened were missed
+                self.clear()
+            print(f"Book cache listening on '{BOOK_CHANGED_CHANNEL}'.")
+            while not lost.is_set():
+                try:
+                    await asyncio.wait_for(lost.wait(), settings.BOOK_CACHE_LISTEN_CHECK_SECONDS)
+                except asyncio.TimeoutError:
+                    # A silently dropped connection never reports termination
+                    await asyncio.wait_for(driver.execute("SELECT 1"), settings.BOOK_CACHE_LISTEN_CHECK_SECONDS)
+            print("Book cache listener connection lost, reconnecting.")
+        finally:
+            # It carries a listener (or is dead): never hand it back to the pool
+            await conn.invalidate()
+            await conn.close()
+
+book_cache = BookCache(
+    max_entries=settings.BOOK_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.BOOK_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,114 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.db import repository
+
+class ChatHistoryWriter:
+    """
+    Write-behind buffer for chat history. Streams hand over their user/assistant
+    message pair and return immediately; a single background task flushes pairs
+    from all streams as multi-row inserts when CHAT_HISTORY_BATCH_SIZE rows are
+    buffered or CHAT_HISTORY_FLUSH_INTERVAL has passed.
+
+    The buffer is bounded (CHAT_HISTORY_MAX_PENDING pairs): when the database falls
+    behind, `enqueue` waits (backpressure) instead of growing memory. `stop()` drains
+    everything that is buffered, so a graceful shutdown loses nothing.
+    """
+    def __init__(self, batch_size: int, flush_interval: float, max_pending: int, max_retries: int = 5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task: Optional[asyncio.Task] = None
+        self.flushed_rows = 0
+        self.dropped_rows = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Flush everything buffered, then stop the background task.
+        """
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def enqueue(self, messages: List[Dict[str, Any]]):
+        """
+        Buffer messages that must be stored together (one exchange).
+        Falls back to a direct insert if the writer is not running.
+        """
+        if not self.running:
+            await repository.insert_chat_messages(messages)
+            return
+        await self._queue.put(messages)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = list(item)
+
+            # Collect more exchanges until the batch is full or the interval elapses
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.extend(item)
+
+            await self._flush(batch)
+
+        # Drain: anything enqueued after the stop marker
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                remaining.extend(item)
+        if remaining:
+            await self._flush(remaining)
+
+    async def _flush(self, rows: List[Dict[str, Any]]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await repository.insert_chat_messages(rows)
+                self.flushed_rows += len(rows)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.dropped_rows += len(rows)
+                    print(f"Error saving chat history, dropped {len(rows)} messages: {e}")
+                    return
+                await asyncio.sleep(min(2 ** attempt * 0.5, 10))
+
+    def stats(self) -> dict:
+        return {
+            "pending_exchanges": self._queue.qsize(),
+            "flushed_rows": self.flushed_rows,
+            "dropped_rows": self.dropped_rows,
+        }
+
+chat_history_writer = ChatHistoryWriter(
+    batch_size=settings.CHAT_HISTORY_BATCH_SIZE,
+    flush_interval=settings.CHAT_HISTORY_FLUSH_INTERVAL,
+    max_pending=settings.CHAT_HISTORY_MAX_PENDING,
+)
@@ -0,0 +1,110 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.pdf_service import estimate_tokens
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _normalized_text(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+def select_chunks(
+    docs: List[Document],
+    vectors: Optional[np.ndarray],
+    query_embedding: Optional[List[float]],
+    max_chunks: int,
+    token_budget: int,
+    mmr_lambda: float,
+    dedup_similarity: float,
+) -> Dict[str, Any]:
+    """
+    Greedy maximal-marginal-relevance selection under a token budget.
+
+    Each step takes the candidate with the best `mmr_lambda * relevance -
+    (1 - mmr_lambda) * redundancy` (cosine to the query vs. max cosine to what is
+    already selected). Candidates at least `dedup_similarity` similar to a selected
+    chunk are dropped as near-duplicates; candidates that no longer fit the budget are
+    skipped. Without (matching) vectors or a query embedding, falls back to retrieval order with exact-text dedup.
+    """
+    selected: List[Document] = []
+    tokens = 0
+    dropped_duplicates = 0
+    dropped_budget = 0
+
+    def fits(doc: Document) -> bool:
+        nonlocal tokens, dropped_budget
+        doc_tokens = estimate_tokens(doc.page_content)
+        if tokens + doc_tokens > token_budget:
+            dropped_budget += 1
+            return False
+        tokens += doc_tokens
+        return True
+
+    if (
+        vectors is None
+        or query_embedding is None
+        or len(vectors) != len(docs)
+        or np.shape(vectors)[-1] != len(query_embedding)
+    ):
+        seen = set()
+        for doc in docs:
+            if len(selected) >= max_chunks:
+                break
+            key = _normalized_text(doc.page_content)
+            if key in seen:
+                dropped_duplicates += 1
+            elif fits(doc):
+                seen.add(key)
+                selected.append(doc)
+    else:
+        matrix = _unit_rows(np.asarray(vectors, dtype=np.float32))
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        relevance = matrix @ (query / norm if norm else query)
+        redundancy = np.zeros(len(docs), dtype=np.float32)
+        remaining = set(range(len(docs)))
+
+        while remaining and len(selected) < max_chunks:
+            candidates = sorted(remaining)
+            scores = mmr_lambda * relevance[candidates] - (1 - mmr_lambda) * redundancy[candidates]
+            best = candidates[int(np.argmax(scores))]
+            remaining.discard(best)
+            if not fits(docs[best]):
+                continue
+            selected.append(docs[best])
+
+            # Update redundancy against the new pick; drop its near-duplicates
+            redundancy = np.maximum(redundancy, matrix @ matrix[best])
+            duplicates = {i for i in remaining if redundancy[i] >= dedup_similarity}
+            dropped_duplicates += len(duplicates)
+            remaining -= duplicates
+
+    return {
+        "documents": selected,
+        "tokens": tokens,
+        "dropped_duplicates": dropped_duplicates,
+        "dropped_budget": dropped_budget,
+    }
+
+def assemble_context(docs: List[Document], vectors: Optional[np.ndarray], query_embedding: Optional[List[float]]) -> Dict[str, Any]:
+    """
+    Build the prompt context from retrieved candidates, using the CONTEXT_* settings.
+    Returns the selection (see `select_chunks`) plus the joined `text`.
+    """
+    result = select_chunks(
+        docs,
+        vectors,
+        query_embedding,
+        max_chunks=settings.CONTEXT_MAX_CHUNKS,
+        token_budget=settings.CONTEXT_TOKEN_BUDGET,
+        mmr_lambda=settings.CONTEXT_MMR_LAMBDA,
+        dedup_similarity=settings.CONTEXT_DEDUP_SIMILARITY,
+    )
+    result["text"] = "\n\n".join(doc.page_content for doc in result["documents"])
+    return result
@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from app.core.config import settings
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a query so trivially different spellings share one cache entry.
+    """
+    return " ".join(text.casefold().split())
+
+class EmbeddingCache:
+    """
+    Bounded LRU + TTL cache of query embeddings, keyed by (model, normalized query).
+    An optional SQLite file acts as a second tier that survives restarts and is
+    shared by every uvicorn worker on the host.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    # --- Memory tier ---
+
+    def _get_memory(self, key: str) -> Optional[List[float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, embedding = entry
+        if time.time() - created_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return embedding
+
+    def _set_memory(self, key: str, embedding: List[float], created_at: float):
+        self._entries[key] = (created_at, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # --- Disk tier (SQLite, called from a worker thread) ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, embedding BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embedding_cache_created_at ON embedding_cache (created_at)")
+        return self._db
+
+    def _get_disk(self, key: str) -> Optional[Tuple[float, List[float]]]:
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT created_at, embedding FROM embedding_cache WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.ttl_seconds),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], array("f", row[1]).tolist()
+
+    def _set_disk(self, key: str, model: str, embedding: List[float], created_at: float):
+        with self._db_lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO embedding_cache (key, model, embedding, created_at) VALUES (?, ?, ?, ?)",
+                (key, model, array("f", embedding).tobytes(), created_at),
+            )
+            db.execute("DELETE FROM embedding_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            db.commit()
+
+    # --- Public API ---
+
+    async def get(self, text: str, model: str) -> Optional[List[float]]:
+        key = self.make_key(text, model)
+        embedding = self._get_memory(key)
+        if embedding is not None:
+            self.memory_hits += 1
+            return embedding
+
+        if self.db_path:
+            try:
+                entry = await asyncio.to_thread(self._get_disk, key)
+            except sqlite3.Error as e:
+                print(f"Embedding cache disk read failed: {e}")
+                entry = None
+            if entry is not None:
+                created_at, embedding = entry
+                self._set_memory(key, embedding, created_at)
+                self.disk_hits += 1
+                return embedding
+
+        self.misses += 1
+        return None
+
+    async def set(self, text: str, model: str, embedding: List[float]):
+        key = self.make_key(text, model)
+        created_at = time.time()
+        self._set_memory(key, embedding, created_at)
+        if self.db_path:
+            try:
+                await asyncio.to_thread(self._set_disk, key, model, embedding, created_at)
+            except sqlite3.Error as e:
+                print(f"Embedding cache disk write failed: {e}")
+
+    async def get_or_embed(
+        self,
+        text: str,
+        model: str,
+        embed: Callable[[str], Awaitable[List[float]]],
+    ) -> List[float]:
+        """
+        Return the cached embedding for `text`, calling `embed` on a miss.
+        """
+        embedding = await self.get(text, model)
+        if embedding is None:
+            embedding = await embed(text)
+            await self.set(text, model, embedding)
+        return embedding
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+embedding_cache = EmbeddingCache(
+    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+    db_path=settings.EMBEDDING_CACHE_DB_PATH,
+)
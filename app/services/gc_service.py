@@ -0,0 +1,95 @@
+import asyncio
+import math
+from typing import Optional, Set
+
+from app.core.config import settings
+from app.db import repository
+from app.services.rag_service import delete_vectors_by_file_hash
+
+class GarbageCollector:
+    """
+    Periodically removes `documents` rows whose file_hash no book references any more,
+    and personas whose book is gone, in bounded batches (GC_BATCH_SIZE rows per
+    statement, at most GC_MAX_BATCHES_PER_PASS per pass), so the vector table and its
+    indexes do not bloat.
+
+    A hash is only deleted once it has been orphaned on two consecutive passes: a
+    re-upload of the same file references the hash before it reads its ingestion
+    checkpoint, so vectors it is about to reuse are never collected under it. One pass
+    runs at a time across all processes (Postgres advisory lock).
+    """
+    def __init__(self, interval: float, max_batches: int):
+        self.interval = interval
+        self.max_batches = max_batches
+        self._suspects: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.passes = 0
+        self.deleted_documents = 0
+        self.deleted_personas = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        if repository.engine is None:
+            print("Garbage collector not started: requires DATABASE_URL.")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_pass()
+            except Exception as e:
+                print(f"Garbage collection pass failed: {e}")
+
+    async def run_pass(self):
+        async with repository.gc_lock() as acquired:
+            if not acquired:
+                return
+            self.passes += 1
+            budget = self.max_batches
+
+            orphans = await repository.find_orphaned_file_hashes(limit=budget)
+            confirmed = [h for h in orphans if h in self._suspects]
+            self._suspects = set(orphans)
+            for file_hash in confirmed:
+                if budget <= 0:
+                    break
+                deleted = await delete_vectors_by_file_hash(file_hash, max_batches=budget)
+                self.deleted_documents += deleted
+                budget -= max(1, math.ceil(deleted / settings.GC_BATCH_SIZE))
+
+            while budget > 0:
+                deleted = await repository.delete_orphaned_personas(settings.GC_BATCH_SIZE)
+                self.deleted_personas += deleted
+                budget -= 1
+                if deleted < settings.GC_BATCH_SIZE:
+                    break
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "passes": self.passes,
+            "suspected_hashes": len(self._suspects),
+            "deleted_documents": self.deleted_documents,
+            "deleted_personas": self.deleted_personas,
+        }
+
+garbage_collector = GarbageCollector(
+    interval=settings.GC_INTERVAL_SECONDS,
+    max_batches=settings.GC_MAX_BATCHES_PER_PASS,
+)
@@ -0,0 +1,308 @@
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from app.services.pdf_service import MarkdownStreamSplitter, parse_pdf, parse_pdf_pages, split_markdown
+from app.services.rag_service import load_checkpoint, upsert_documents
+from app.services.persona_service import generate_system_prompt
+from app.services.book_cache import book_cache
+from app.services.storage_service import download_file_from_storage, scratch_path
+from app.core.config import settings
+from app.core.metrics import INGESTION_STAGE_SECONDS, span, start_spans
+from app.db import repository
+
+# Recorded on every chunk: the two modes split the text differently, so a checkpoint
+# is only valid for the chunker that wrote it
+SEQUENTIAL_CHUNKER = "markdown"
+STREAMING_CHUNKER = "markdown-stream"
+
+# file_hash -> Future resolved with the id of the finished book (or None if it failed).
+# Lets duplicate uploads in this process attach to the in-flight job.
+_inflight_jobs: Dict[str, asyncio.Future] = {}
+
+async def find_duplicate_source(book_id: str, file_hash: str) -> Optional[str]:
+    """
+    Return the id of a `ready` book with the same content, if any.
+    If an older book with the same hash is still processing (here or on another worker),
+    wait for it instead of parsing/embedding the same file twice.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.DEDUP_WAIT_TIMEOUT
+    me = await repository.get_book(book_id)
+
+    while True:
+        future = _inflight_jobs.get(file_hash)
+        if future is not None:
+            print(f"Book {book_id}: attaching to in-flight job for hash {file_hash}")
+            return await asyncio.shield(future)
+
+        others = [b for b in await repository.find_books_by_file_hash(file_hash) if b["id"] != book_id]
+        # A progressively ingested book is `ready` while still indexing; only reuse finished ones
+        ready = next((b for b in others if b["status"] == "ready" and b.get("stage") in (None, "done")), None)
+        if ready:
+            return ready["id"]
+
+        # Only wait on older jobs, so two duplicates never wait on each other
+        older_processing = [
+            b for b in others
+            if (b["status"] == "processing" or b.get("stage") == "indexing") and me and (b["created_at"], b["id"]) < (me["created_at"], me["id"])
+        ]
+        if not older_processing or loop.time() >= deadline:
+            future = _inflight_jobs.get(file_hash)
+            return await asyncio.shield(future) if future is not None else None
+
+        await asyncio.sleep(settings.DEDUP_POLL_INTERVAL)
+
+async def clone_book(book_id: str, source_book_id: str, file_hash: str):
+    """
+    Mark a duplicate upload ready by reusing the vectors (shared file_hash) and persona of `source_book_id`.
+    """
+    persona = await repository.get_persona(source_book_id)
+    if persona:
+        await repository.insert_persona(book_id, persona["role_name"], persona["system_prompt"])
+    await repository.update_book(book_id, {"status": "ready", "stage": "done", "file_hash": file_hash})
+    print(f"Book {book_id} deduplicated from {source_book_id}.")
+
+async def set_stage(book_id: str, stage: str):
+    """
+    Record the current ingestion stage on the books row (downloading, parsing, embedding, ...).
+    """
+    await repository.update_book(book_id, {"stage": stage})
+
+async def run_sequential(book_id: str, local_path: str, file_hash: str):
+    """
+    Parse the whole book, then split, embed everything, then generate the persona.
+    """
+    # 4. Parse PDF
+    await set_stage(book_id, "parsing")
+    with span("parse"):
+        full_text = await parse_pdf(local_path, file_hash)
+
+    # 5. Split
+    await set_stage(book_id, "splitting")
+    with span("split"):
+        docs = split_markdown(full_text)
+
+    await set_stage(book_id, "embedding")
+    await upsert_documents(docs, file_hash, SEQUENTIAL_CHUNKER)
+
+    # 6. Generate Persona
+    await set_stage(book_id, "persona")
+    with span("persona"):
+        persona_data = await generate_system_prompt(full_text)
+
+    # 7. Update Book Status & Save Persona in Supabase
+    # Create Persona first, so a book is never `ready` without it
+    # Supabase UUID usually auto-generated if omitted.
+    await repository.insert_persona(
+        book_id,
+        persona_data["role_name"],
+        persona_data["system_prompt"]
+    )
+
+    # Update Book
+    print(f"Updating book {book_id} status to ready...")
+    await repository.update_book(book_id, {
+        "status": "ready",
+        "stage": "done",
+        "file_hash": file_hash
+    })
+
+async def run_pipelined(book_id: str, local_path: str, file_hash: str):
+    """
+    Overlap the stages: parsed pages are chunked and handed to the embedder as they
+    arrive, and the persona is generated from the opening pages while embedding runs.
+    The book becomes `ready` (stage `indexing`) as soon as it has a persona and its
+    first committed batch; chunks_indexed / chunks_total report progress until `done`.
+    """
+    await set_stage(book_id, "parsing")
+    committed = await load_checkpoint(file_hash, STREAMING_CHUNKER)
+    chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE)
+    progress = {"indexed": 0, "persona": False, "ready": False}
+
+    async def mark_ready_if_usable():
+        if progress["persona"] and progress["indexed"] > 0 and not progress["ready"]:
+            progress["ready"] = True
+            await repository.update_book(book_id, {"status": "ready", "stage": "indexing"})
+            book_cache.invalidate(book_id)
+            print(f"Book {book_id} is ready for chat while indexing continues.")
+
+    async def embed_chunks():
+        next_index = 0
+        pending = []
+        # Up to EMBED_CONCURRENCY batches embed at once; (task, chunks) in chunk order
+        in_flight: Deque[Tuple[asyncio.Task, int]] = deque()
+
+        async def complete_oldest():
+            # Progress advances in chunk order, so chunks_indexed never skips a gap
+            task, count = in_flight[0]
+            await task
+            in_flight.popleft()
+            progress["indexed"] += count
+            await repository.update_book(book_id, {"chunks_indexed": progress["indexed"]})
+            await mark_ready_if_usable()
+
+        async def flush(batch):
+            nonlocal next_index
+            while len(in_flight) >= settings.EMBED_CONCURRENCY:
+                await complete_oldest()
+            task = asyncio.create_task(upsert_documents(
+                batch, file_hash, STREAMING_CHUNKER, start_index=next_index, committed=committed
+            ))
+            in_flight.append((task, len(batch)))
+            next_index += len(batch)
+
+        try:
+            while True:
+                docs = await chunk_queue.get()
+                if docs is None:
+                    break
+                pending.extend(docs)
+                while len(pending) >= settings.EMBED_BATCH_SIZE:
+                    batch, pending = pending[:settings.EMBED_BATCH_SIZE], pending[settings.EMBED_BATCH_SIZE:]
+                    await flush(batch)
+            if pending:
+                await flush(pending)
+            while in_flight:
+                await complete_oldest()
+        except BaseException:
+            for task, _ in in_flight:
+                task.cancel()
+            raise
+
+    async def send(item):
+        # Fail fast if the embedder died instead of blocking on a full queue
+        put = asyncio.ensure_future(chunk_queue.put(item))
+        await asyncio.wait([put, embedder], return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            embedder.result()
+
+    async def create_persona(sample: str):
+        # A retried job may already have saved the persona
+        if await repository.get_persona(book_id) is None:
+            with span("persona"):
+                persona_data = await generate_system_prompt(sample)
+            await repository.insert_persona(book_id, persona_data["role_name"], persona_data["system_prompt"])
+        progress["persona"] = True
+        await mark_ready_if_usable()
+
+    embedder = asyncio.create_task(embed_chunks())
+    persona_task: Optional[asyncio.Task] = None
+    opening = []
+    try:
+        splitter = MarkdownStreamSplitter()
+        total = 0
+        pages = parse_pdf_pages(local_path, file_hash)
+        while True:
+            # Time only the parser, not waits on a full chunk queue
+            with span("parse"):
+                try:
+                    page = await pages.__anext__()
+                except StopAsyncIteration:
+                    break
+            if persona_task is None:
+                opening.append(page)
+                if sum(len(p) for p in opening) >= settings.PERSONA_SAMPLE_CHARS:
+                    persona_task = asyncio.create_task(create_persona("\n\n".join(opening)))
+            with span("split"):
+                docs = splitter.feed(page)
+            if docs:
+                total += len(docs)
+                await send(docs)
+        with span("split"):
+            docs = splitter.flush()
+        total += len(docs)
+        await send(docs)
+        await send(None)
+        values = {"chunks_total": total}
+        if not progress["ready"]:
+            values["stage"] = "embedding"
+        await repository.update_book(book_id, values)
+
+        # Short books: fewer opening characters than the sample size
+        if persona_task is None:
+            persona_task = asyncio.create_task(create_persona("\n\n".join(opening)))
+
+        await asyncio.gather(embedder, persona_task)
+    except BaseException:
+        embedder.cancel()
+        if persona_task is not None:
+            persona_task.cancel()
+        raise
+
+    print(f"Updating book {book_id} status to ready...")
+    await repository.update_book(book_id, {
+        "status": "ready",
+        "stage": "done",
+        "file_hash": file_hash
+    })
+
+async def run_ingestion(book_id: str, bucket_name: str, file_path: str):
+    """
+    Download, parse, split, embed and generate the persona for a book.
+    Raises on failure; callers decide whether to retry or mark the book failed.
+    """
+    local_path = scratch_path(f"{book_id}.pdf")
+    job: Optional[asyncio.Future] = None
+    spans = start_spans("ingestion", INGESTION_STAGE_SECONDS, book_id)
+    fields = {"status": "failed"}
+
+    try:
+        # 1-2. Download from Supabase, hashing in the same pass (for Deduplication/Reference)
+        await set_stage(book_id, "downloading")
+        with spans.span("download"):
+            file_hash = await download_file_from_storage(bucket_name, file_path, local_path)
+        await repository.update_book(book_id, {"file_hash": file_hash})
+
+        # 3. Deduplicate: reuse an identical book instead of parsing/embedding again
+        source_book_id = await find_duplicate_source(book_id, file_hash)
+        if source_book_id:
+            await clone_book(book_id, source_book_id, file_hash)
+            fields = {"status": "deduplicated"}
+            return
+        job = asyncio.get_running_loop().create_future()
+        _inflight_jobs[file_hash] = job
+
+        if settings.INGESTION_PIPELINED:
+            await run_pipelined(book_id, local_path, file_hash)
+        else:
+            await run_sequential(book_id, local_path, file_hash)
+
+        print(f"Book {book_id} processed successfully.")
+        fields = {"status": "ready", "pipelined": settings.INGESTION_PIPELINED}
+        job.set_result(book_id)
+
+    finally:
+        spans.add("total", time.perf_counter() - spans.started)
+        spans.finish(**fields)
+        # Status / persona changed: drop any cached chat context for this book
+        book_cache.invalidate(book_id)
+        if job is not None:
+            if not job.done():
+                job.set_result(None)
+            if _inflight_jobs.get(file_hash) is job:
+                del _inflight_jobs[file_hash]
+        # Cleanup
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+async def mark_book_failed(book_id: str, error: Exception):
+    await repository.update_book(book_id, {
+        "status": "failed",
+        "error_message": str(error)
+    })
+    book_cache.invalidate(book_id)
+
+async def process_book_task(book_id: str, bucket_name: str, file_path: str):
+    """
+    Background task to process the PDF from Supabase Storage.
+    """
+    try:
+        await run_ingestion(book_id, bucket_name, file_path)
+    except Exception as e:
+        print(f"Error processing book {book_id}: {e}")
+        # Update Status to Failed
+        await mark_book_failed(book_id, e)
@@ -0,0 +1,164 @@
+"""
+Conversation memory for chat, per (book, user).
+
+The prompt carries the last MEMORY_RECENT_TURNS turns verbatim plus a rolling summary
+of every older turn. The summary is folded forward incrementally in the background:
+each fold adds the turns between its cursor (the last message already summarized)
+and the verbatim window, so it is never regenerated from the full history. Summary
+and turns together are held to MEMORY_TOKEN_BUDGET, so the prompt cost of a request
+stays constant however long the conversation runs.
+
+Only authenticated callers have a conversation (`app.core.auth.caller_id`); chat
+skips memory for anonymous requests.
+"""
+import asyncio
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from app.core.clients import get_chat_model
+from app.core.config import settings
+from app.db import repository
+from app.services.pdf_service import estimate_tokens
+
+SUMMARY_PROMPT = """You maintain the running summary of a conversation between a reader and an assistant about a book.
+Update the summary with the new turns. Keep what later questions may refer back to: the
+reader's questions and interests, names, facts and conclusions from the answers. Drop
+greetings and repetition. Write at most {max_words} words, as plain prose.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+# Background folds per conversation in this process (also keeps the tasks referenced)
+_folds: Dict[str, asyncio.Task] = {}
+
+def user_key(user_id: Optional[str]) -> str:
+    return str(user_id) if user_id else ""
+
+def clip_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut `text` to about `max_tokens` estimated tokens.
+    """
+    max_chars = int(max_tokens * settings.CHUNK_CHARS_PER_TOKEN)
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + " …"
+
+def _cursor_of(message: Dict[str, Any]):
+    created_at = message["created_at"]
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return created_at, str(message["id"])
+
+def _message_text(message: Dict[str, Any]) -> str:
+    text = clip_tokens(message["content"], settings.MEMORY_MESSAGE_MAX_TOKENS)
+    return f"{text} [interrupted]" if message.get("truncated") else text
+
+async def load_memory(book_id: str, user_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Summary and verbatim turns for the next prompt, within MEMORY_TOKEN_BUDGET.
+    Schedules a background fold when turns older than the window are not summarized yet.
+    """
+    window = 2 * settings.MEMORY_RECENT_TURNS
+    summary_row, messages = await asyncio.gather(
+        repository.get_conversation_summary(book_id, user_key(user_id)),
+        repository.recent_conversation_messages(book_id, user_id, window + 1),
+    )
+
+    # Messages already folded into the summary are not repeated verbatim
+    if summary_row and summary_row.get("summarized_until_id"):
+        cursor = _cursor_of({"created_at": summary_row["summarized_until"], "id": summary_row["summarized_until_id"]})
+        messages = [m for m in messages if _cursor_of(m) > cursor]
+    if len(messages) > window:
+        schedule_fold(book_id, user_id)
+        messages = messages[-window:]
+
+    # Summary first, then the newest turns while they fit
+    budget = settings.MEMORY_TOKEN_BUDGET
+    summary = clip_tokens((summary_row or {}).get("summary") or "", min(settings.MEMORY_SUMMARY_MAX_TOKENS, budget))
+    tokens = estimate_tokens(summary)
+    kept = []
+    for message in reversed(messages):
+        text = _message_text(message)
+        if tokens + estimate_tokens(text) > budget:
+            break
+        tokens += estimate_tokens(text)
+        kept.append({"role": message["role"], "content": text})
+    kept.reverse()
+    # Keep whole turns: never start on an answer whose question was dropped
+    while kept and kept[0]["role"] != "user":
+        tokens -= estimate_tokens(kept.pop(0)["content"])
+
+    if not summary and not kept:
+        # No history yet: same as no memory (first turns stay coalescable and cacheable)
+        return empty_memory()
+    digest = hashlib.sha256(
+        "\x00".join([summary] + [f"{m['role']}:{m['content']}" for m in kept]).encode("utf-8")
+    ).hexdigest()[:16]
+    return {"summary": summary, "messages": kept, "tokens": tokens, "digest": digest}
+
+def empty_memory() -> Dict[str, Any]:
+    return {"summary": "", "messages": [], "tokens": 0, "digest": ""}
+
+def memory_messages(memory: Dict[str, Any]) -> List[BaseMessage]:
+    """
+    The verbatim turns as chat messages (the summary goes into the system prompt).
+    """
+    return [
+        HumanMessage(content=m["content"]) if m["role"] == "user" else AIMessage(content=m["content"])
+        for m in memory["messages"]
+    ]
+
+def schedule_fold(book_id: str, user_id: Optional[str]):
+    key = f"{book_id}:{user_key(user_id)}"
+    if key in _folds:
+        return
+    task = asyncio.create_task(fold_backlog(book_id, user_id))
+    _folds[key] = task
+    task.add_done_callback(lambda _: _folds.pop(key, None))
+
+async def summarize(summary: str, messages: List[Dict[str, Any]]) -> str:
+    turns = "\n".join(
+        f"{'Reader' if m['role'] == 'user' else 'Assistant'}: {_message_text(m)}" for m in messages
+    )
+    prompt = SUMMARY_PROMPT.format(
+        max_words=int(settings.MEMORY_SUMMARY_MAX_TOKENS * 0.75),
+        summary=summary or "(empty)",
+        turns=turns,
+    )
+    response = await get_chat_model().ainvoke([HumanMessage(content=prompt)])
+    return clip_tokens(str(response.content).strip(), settings.MEMORY_SUMMARY_MAX_TOKENS)
+
+async def fold_backlog(book_id: str, user_id: Optional[str]):
+    """
+    Fold the turns between the summary cursor and the verbatim window into the summary,
+    MEMORY_SUMMARY_BATCH_TURNS turns per model call, until only the window is left.
+    Stops if another worker moved the cursor first.
+    """
+    window = 2 * settings.MEMORY_RECENT_TURNS
+    batch = 2 * settings.MEMORY_SUMMARY_BATCH_TURNS
+    key = user_key(user_id)
+    try:
+        while True:
+            row = await repository.get_conversation_summary(book_id, key) or {}
+            previous_id = row.get("summarized_until_id")
+            cursor = (row["summarized_until"], previous_id) if previous_id else None
+            pending = await repository.conversation_messages_after(book_id, user_id, cursor, batch + window)
+            # Only messages older than the newest `window` fetched ones are outside the window
+            fold = pending[:max(0, len(pending) - window)]
+            if not fold:
+                return
+            summary = await summarize(row.get("summary") or "", fold)
+            stored = await repository.save_conversation_summary(
+                book_id, key, summary, _cursor_of(fold[-1]), previous_id
+            )
+            if not stored:
+                return
+            print(f"Conversation {book_id}/{key or 'anonymous'}: folded {len(fold)} messages into the summary.")
+    except Exception as e:
+        print(f"Conversation summary update failed for {book_id}: {e}")
@@ -0,0 +1,93 @@
+import os
+import json
+import gzip
+import asyncio
+import hashlib
+from typing import List, Optional
+
+from app.core.config import settings
+from app.db.supabase import get_supabase
+
+def parser_fingerprint(parser: str, **options) -> str:
+    """
+    Short digest of the parser name and its settings; part of the cache key,
+    so changing parser options never serves stale markdown.
+    """
+    payload = json.dumps({"parser": parser, **options}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def _object_name(file_hash: str, fingerprint: str) -> str:
+    return f"{file_hash}/{fingerprint}.json.gz"
+
+def _encode(pages: List[str]) -> bytes:
+    return gzip.compress(json.dumps(pages, ensure_ascii=False).encode("utf-8"))
+
+def _decode(data: bytes) -> List[str]:
+    return json.loads(gzip.decompress(data).decode("utf-8"))
+
+class ParseCache:
+    """
+    Content-addressed store of parsed markdown pages (gzipped JSON), keyed by
+    file_hash + parser fingerprint. Backed by local disk or a Supabase Storage bucket.
+    """
+    def __init__(self, backend: str, directory: str, bucket: str):
+        self.backend = backend
+        self.directory = directory
+        self.bucket = bucket
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend in ("disk", "storage")
+
+    def _read(self, name: str) -> Optional[bytes]:
+        if self.backend == "disk":
+            path = os.path.join(self.directory, name)
+            if not os.path.exists(path):
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+
+        try:
+            return get_supabase().storage.from_(self.bucket).download(name)
+        except Exception:
+            # Storage raises on a missing object
+            return None
+
+    def _write(self, name: str, data: bytes):
+        if self.backend == "disk":
+            path = os.path.join(self.directory, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            return
+
+        get_supabase().storage.from_(self.bucket).upload(
+            name, data, file_options={"content-type": "application/gzip", "upsert": "true"}
+        )
+
+    async def get(self, file_hash: str, fingerprint: str) -> Optional[List[str]]:
+        if not self.enabled:
+            return None
+        try:
+            data = await asyncio.to_thread(self._read, _object_name(file_hash, fingerprint))
+            return await asyncio.to_thread(_decode, data) if data else None
+        except Exception as e:
+            print(f"Parse cache read failed for {file_hash}: {e}")
+            return None
+
+    async def put(self, file_hash: str, fingerprint: str, pages: List[str]):
+        if not self.enabled:
+            return
+        try:
+            data = await asyncio.to_thread(_encode, pages)
+            await asyncio.to_thread(self._write, _object_name(file_hash, fingerprint), data)
+        except Exception as e:
+            print(f"Parse cache write failed for {file_hash}: {e}")
+
+parse_cache = ParseCache(
+    backend=settings.PARSE_CACHE_BACKEND,
+    directory=settings.PARSE_CACHE_DIR,
+    bucket=settings.PARSE_CACHE_BUCKET,
+)
@@ -0,0 +1,178 @@
+"""
+Local PDF text extraction (pypdf) for text-native PDFs, as markdown page by page.
+
+Headings are recovered from font sizes: short lines set clearly larger than the
+body text become `#` / `##` / `###` headers, so the header-based chunker sees the
+same structure LlamaParse gives it. Tables, columns and images are not
+reconstructed; `pdf_service` sends documents that need that to LlamaParse.
+
+The functions here run in worker processes: they take and return plain data and
+import nothing from the app, so a spawned worker only loads pypdf.
+"""
+import math
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+HEADING_MIN_RATIO = 1.15  # Font size relative to body text from which a line is a heading
+HEADING_LEVEL_RATIOS = (1.8, 1.4)  # At least this much larger: level 1, level 2 (else 3)
+HEADING_MAX_CHARS = 120
+PARAGRAPH_GAP = 1.6  # Vertical gap (in line heights) that starts a new paragraph
+RICH_PAGE_CHARS = 500  # Pages with less text use the document's body size, not their own
+
+@contextmanager
+def _open(file_path: str):
+    """
+    A reader over the file as a stream: pypdf reads objects from it on demand instead
+    of loading the whole file into memory. The file is closed on exit.
+    """
+    from pypdf import PdfReader
+    with open(file_path, "rb") as stream:
+        reader = PdfReader(stream)
+        if reader.is_encrypted:
+            # Owner-password-only PDFs (print/copy restrictions) open with an empty user password
+            reader.decrypt("")
+        yield reader
+
+def _lines(page) -> List[Dict[str, Any]]:
+    """
+    The page's text lines in content order: text, font size and baseline.
+    """
+    lines: List[Dict[str, Any]] = []
+
+    def new_line(y: float):
+        lines.append({"text": "", "size": 0.0, "y": y})
+
+    def visit(text, cm, tm, font_dict, font_size):
+        if not text:
+            return
+        # Rendered size and baseline: text matrix in user space (tm x cm)
+        c = tm[2] * cm[0] + tm[3] * cm[2]
+        d = tm[2] * cm[1] + tm[3] * cm[3]
+        y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+        size = round(font_size * math.hypot(c, d), 1)
+        if lines and not lines[-1]["text"].strip():
+            # A line starts where its first visible text is
+            lines[-1]["y"] = y
+        elif not lines or abs(y - lines[-1]["y"]) > size * 0.5:
+            new_line(y)
+        for i, part in enumerate(text.split("\n")):
+            if i:
+                new_line(y)
+            lines[-1]["text"] += part
+            if part.strip():
+                lines[-1]["size"] = max(lines[-1]["size"], size)
+
+    page.extract_text(visitor_text=visit)
+    result = []
+    for line in lines:
+        line["text"] = " ".join(line["text"].split())
+        if line["text"]:
+            result.append(line)
+    return result
+
+def _body_size(lines: List[Dict[str, Any]]) -> Optional[float]:
+    sizes = Counter()
+    for line in lines:
+        sizes[line["size"]] += len(line["text"])
+    return sizes.most_common(1)[0][0] if sizes else None
+
+def _heading_level(line: Dict[str, Any], body_size: Optional[float]) -> int:
+    if not body_size or len(line["text"]) > HEADING_MAX_CHARS:
+        return 0
+    ratio = line["size"] / body_size
+    if ratio < HEADING_MIN_RATIO:
+        return 0
+    if ratio >= HEADING_LEVEL_RATIOS[0]:
+        return 1
+    return 2 if ratio >= HEADING_LEVEL_RATIOS[1] else 3
+
+def page_markdown(page, body_size: Optional[float] = None) -> str:
+    """
+    One page as markdown: headings by font size, wrapped lines joined into paragraphs.
+    `body_size` (from `probe`) is used on pages with too little text to tell on their own.
+    """
+    lines = _lines(page)
+    if sum(len(line["text"]) for line in lines) >= RICH_PAGE_CHARS or body_size is None:
+        body_size = _body_size(lines) or body_size
+
+    blocks: List[str] = []
+    paragraph: List[str] = []
+    previous = None
+    heading = (0, "")
+
+    def end_paragraph():
+        if paragraph:
+            blocks.append(" ".join(paragraph))
+            paragraph.clear()
+
+    def end_heading():
+        nonlocal heading
+        if heading[0]:
+            blocks.append(f"{'#' * heading[0]} {heading[1]}")
+        heading = (0, "")
+
+    for line in lines:
+        level = _heading_level(line, body_size)
+        if level:
+            end_paragraph()
+            # A heading wrapped over several lines stays one heading
+            if heading[0] == level:
+                heading = (level, f"{heading[1]} {line['text']}")
+            else:
+                end_heading()
+                heading = (level, line["text"])
+        else:
+            end_heading()
+            gap = abs(previous["y"] - line["y"]) if previous else 0.0
+            if paragraph and gap > PARAGRAPH_GAP * max(line["size"], 1.0):
+                end_paragraph()
+            # Re-join words hyphenated across a line break
+            if paragraph and paragraph[-1].endswith("-") and line["text"][:1].islower():
+                paragraph[-1] = paragraph[-1][:-1] + line["text"]
+            else:
+                paragraph.append(line["text"])
+        previous = line
+    end_paragraph()
+    end_heading()
+    return "\n\n".join(blocks)
+
+def extract_pages(file_path: str, start: int, stop: int, body_size: Optional[float] = None) -> List[str]:
+    """
+    Markdown of pages [start, stop). One process-pool task; the file is open only
+    for the batch.
+    """
+    with _open(file_path) as reader:
+        return [page_markdown(reader.pages[i], body_size) for i in range(start, stop)]
+
+def probe(file_path: str, sample_pages: int) -> Dict[str, Any]:
+    """
+    Sample up to `sample_pages` pages spread over the document and measure its text layer:
+    page count, characters per page, share of pages without text (scans), share of
+    unmapped glyphs (fonts without a usable encoding) and the body font size.
+    """
+    with _open(file_path) as reader:
+        pages = len(reader.pages)
+        count = min(pages, sample_pages)
+        indexes = sorted({(i * pages) // count for i in range(count)}) if count else []
+
+        chars = empty = unmapped = 0
+        sizes = Counter()
+        for i in indexes:
+            lines = _lines(reader.pages[i])
+            text = "".join(line["text"] for line in lines)
+            chars += len(text)
+            if len(text.strip()) < 20:
+                empty += 1
+            unmapped += sum(1 for ch in text if ch == "�" or (ord(ch) < 32 and ch not in "\t\n\r"))
+            unmapped += text.count("(cid:")
+            for line in lines:
+                sizes[line["size"]] += len(line["text"])
+    return {
+        "pages": pages,
+        "sampled": len(indexes),
+        "chars_per_page": chars / len(indexes) if indexes else 0.0,
+        "empty_pages": empty / len(indexes) if indexes else 1.0,
+        "unmapped_ratio": unmapped / chars if chars else 0.0,
+        "body_size": sizes.most_common(1)[0][0] if sizes else None,
+    }
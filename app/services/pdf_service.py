@@ -1,39 +1,269 @@
 import os
-from llama_parse import LlamaParse
-from langchain_text_splitters import MarkdownHeaderTextSplitter
+import re
+import math
+import time
+import asyncio
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+from langchain_core.documents import Document
+from app.core.clients import get_process_pool
 from app.core.config import settings
+from app.core.metrics import PDF_PARSE_PAGES_PER_SECOND, note
+from app.services.parse_cache import parse_cache, parser_fingerprint
 
-async def parse_pdf(file_path: str) -> str:
-    """
-    Parse PDF using LlamaParse (Markdown mode).
-    Returns the full markdown content.
-    """
-    parser = LlamaParse(
+HEADERS_TO_SPLIT_ON = [
+    ("#", "Header 1"),
+    ("##", "Header 2"),
+    ("###", "Header 3"),
+]
+
+_HEADER_LINE = re.compile(r"^(#{1,3})\s+(.+?)\s*$", re.MULTILINE)
+
+LLAMA_PARSE_OPTIONS = {
+    "result_type": "markdown",  # "markdown" and "text" are available
+}
+
+# Part of the parse cache fingerprint: bump when the local extraction output changes
+LOCAL_PARSE_OPTIONS = {
+    "engine": "pypdf",
+    "version": 1,
+}
+
+# The parsing stack (llama_parse, pypdf, langchain_text_splitters) is imported on first use,
+# so chat-only processes that need `estimate_tokens` never load it.
+
+def _llama_parser():
+    from llama_parse import LlamaParse
+    return LlamaParse(
         api_key=settings.LLAMA_CLOUD_API_KEY,
-        result_type="markdown",  # "markdown" and "text" are available
         verbose=True,
+        **LLAMA_PARSE_OPTIONS,
     )
+
+async def probe_pdf(file_path: str) -> Optional[dict]:
+    """
+    Measure the PDF's text layer locally (see `pdf_local.probe`), or None if it
+    cannot be read locally (pypdf missing, damaged or encrypted file).
+    """
+    try:
+        from app.services import pdf_local
+        return await asyncio.to_thread(pdf_local.probe, file_path, settings.PDF_PROBE_PAGES)
+    except Exception as e:
+        print(f"Local PDF probe failed for {file_path}: {type(e).__name__}: {e}")
+        return None
+
+def choose_parser(probe: Optional[dict]) -> str:
+    """
+    Parser backend for one document: "local" for text-native PDFs, "llamaparse" when
+    the text layer is missing, sparse or garbled (scans, image-heavy layouts, broken
+    font encodings). PDF_PARSER forces either.
+    """
+    if settings.PDF_PARSER != "auto":
+        return settings.PDF_PARSER
+    if (
+        not probe
+        or not probe["pages"]
+        or probe["chars_per_page"] < settings.PDF_LOCAL_MIN_CHARS_PER_PAGE
+        or probe["empty_pages"] > settings.PDF_LOCAL_MAX_EMPTY_PAGES
+        or probe["unmapped_ratio"] > settings.PDF_LOCAL_MAX_UNMAPPED_RATIO
+    ):
+        return "llamaparse"
+    return "local"
+
+async def _parse_local(file_path: str, probe: dict, timing: dict) -> AsyncIterator[str]:
+    """
+    Parse PDF_PARSE_BATCH_PAGES-page batches on the process pool, yielding pages in order
+    as their batch completes. One batch more than there are workers is in flight; the next
+    is submitted as each completes, independent of how fast the caller consumes the pages.
+    `timing["done"]` is set when the last batch finishes.
+    """
+    from app.services import pdf_local
+    pool = get_process_pool()
+    batch = settings.PDF_PARSE_BATCH_PAGES
+    window = (settings.PDF_PARSE_WORKERS or os.cpu_count() or 1) + 1
+    starts = iter(range(0, probe["pages"], batch))
+    futures = []
+    stopped = False
+
+    def submit():
+        start = next(starts, None)
+        if stopped or start is None:
+            return
+        future = asyncio.wrap_future(pool.submit(
+            pdf_local.extract_pages, file_path, start, min(start + batch, probe["pages"]), probe["body_size"]
+        ))
+        future.add_done_callback(finished)
+        futures.append(future)
+
+    def finished(future):
+        timing["done"] = time.perf_counter()
+        if not future.cancelled():
+            submit()
+
+    for _ in range(window):
+        submit()
+    try:
+        # `finished` runs before the awaiting code resumes, so the next batch is already queued
+        index = 0
+        while index < len(futures):
+            for page in await futures[index]:
+                yield page
+            index += 1
+    finally:
+        stopped = True
+        for future in futures:
+            future.cancel()
+
+async def _parse_llamaparse(file_path: str, timing: dict) -> AsyncIterator[str]:
+    parser = _llama_parser()
+
+    # Note: parser.aload_data returns a list of Document objects (one per page)
+    documents = await parser.aload_data(file_path)
+    timing["done"] = time.perf_counter()
+    for doc in documents:
+        yield doc.text
+
+async def parse_pdf_pages(file_path: str, file_hash: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Parse PDF to markdown, yielding it page by page. The backend is picked per document
+    (`choose_parser`): the local page-parallel engine or LlamaParse (Markdown mode).
+    If `file_hash` is given, the parsed-markdown cache is consulted first and filled afterwards.
+    Backend, page count and pages/sec go to the current job's log line and metrics.
+    """
+    probe = await probe_pdf(file_path) if settings.PDF_PARSER != "llamaparse" else None
+    parser = choose_parser(probe)
+    if parser == "local" and probe is None:
+        raise ValueError(f"{file_path} cannot be read by the local PDF parser")
+    options = LOCAL_PARSE_OPTIONS if parser == "local" else LLAMA_PARSE_OPTIONS
+    fingerprint = parser_fingerprint(parser, **options)
+    if file_hash:
+        pages = await parse_cache.get(file_hash, fingerprint)
+        if pages is not None:
+            print(f"Parse cache hit for {file_hash} ({len(pages)} pages).")
+            note(parser=parser, parse_cache="hit", pages=len(pages))
+            for page in pages:
+                yield page
+            return
+
+    start = time.perf_counter()
+    timing = {}
+    if parser == "local":
+        stream = _parse_local(file_path, probe, timing)
+    else:
+        stream = _parse_llamaparse(file_path, timing)
+    pages = []
+    async for page in stream:
+        pages.append(page)
+        yield page
+
+    elapsed = timing.get("done", time.perf_counter()) - start
+    pages_per_second = len(pages) / elapsed if elapsed > 0 else 0.0
+    PDF_PARSE_PAGES_PER_SECOND.labels(parser=parser).observe(pages_per_second)
+    note(parser=parser, pages=len(pages), pages_per_sec=round(pages_per_second, 1))
+    print(f"Parsed {file_path} with {parser}: {len(pages)} pages, {pages_per_second:.1f} pages/sec.")
+    if file_hash:
+        await parse_cache.put(file_hash, fingerprint, pages)
+
+async def parse_pdf(file_path: str, file_hash: Optional[str] = None) -> str:
+    """
+    Parse PDF to markdown (backend per `parse_pdf_pages`).
+    Returns the full markdown content.
+    """
+    pages = [page async for page in parse_pdf_pages(file_path, file_hash)]
     
-    # LlamaParse.load_data can be blocking or async depending on implementation, 
-    # but currently official SDK often runs sync under the hood or via event loop.
-    # For safety in async FastAPI, we might offload if it was heavy, 
-    # but LlamaParse does HTTP calls, so it should be fine or we wrap it.
-    # Note: parser.load_data returns a list of Document objects
-    documents = await parser.aload_data(file_path) 
-    
-    full_text = "\n\n".join([doc.text for doc in documents])
+    full_text = "\n\n".join(pages)
     return full_text
 
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local token estimate (no tokenizer call), CHUNK_CHARS_PER_TOKEN chars per token.
+    """
+    return math.ceil(len(text) / settings.CHUNK_CHARS_PER_TOKEN)
+
+def bound_chunks(chunks: Iterable[Document]) -> Iterator[Document]:
+    """
+    Second-stage splitter: re-split header sections longer than CHUNK_MAX_TOKENS
+    into overlapping pieces (CHUNK_OVERLAP_TOKENS), keeping the header metadata.
+    Generator, so only one section is held in memory at a time.
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.CHUNK_MAX_TOKENS,
+        chunk_overlap=settings.CHUNK_OVERLAP_TOKENS,
+        length_function=estimate_tokens,
+        separators=["\n\n", "\n", ". ", " ", ""],
+    )
+    for chunk in chunks:
+        if estimate_tokens(chunk.page_content) <= settings.CHUNK_MAX_TOKENS:
+            yield chunk
+            continue
+        for piece in splitter.split_text(chunk.page_content):
+            yield Document(page_content=piece, metadata=dict(chunk.metadata))
+
 def split_markdown(text: str):
     """
-    Split markdown content into chunks based on headers.
+    Split markdown content into chunks based on headers,
+    then bound each chunk to CHUNK_MAX_TOKENS.
     """
-    headers_to_split_on = [
-        ("#", "Header 1"),
-        ("##", "Header 2"),
-        ("###", "Header 3"),
-    ]
-    
-    splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on)
+    from langchain_text_splitters import MarkdownHeaderTextSplitter
+    splitter = MarkdownHeaderTextSplitter(headers_to_split_on=HEADERS_TO_SPLIT_ON)
     chunks = splitter.split_text(text)
-    return chunks
+    return list(bound_chunks(chunks))
+
+class MarkdownStreamSplitter:
+    """
+    Incremental version of `split_markdown` for pages that arrive one at a time.
+    Chunks are token-bounded the same way.
+    
+    Text is buffered up to the last header seen; everything before it is a finished
+    section and is split immediately. The enclosing headers are re-applied to the next
+    piece, so header metadata matches splitting the whole book at once. A section that
+    grows past CHUNK_MAX_TOKENS without a new header (or a book without headers) is
+    cut at its last paragraph break instead, so the buffer stays about one chunk long.
+    Only newly fed text is scanned for headers.
+    """
+    def __init__(self):
+        from langchain_text_splitters import MarkdownHeaderTextSplitter
+        self._splitter = MarkdownHeaderTextSplitter(headers_to_split_on=HEADERS_TO_SPLIT_ON)
+        self._buffer = ""
+        self._last_header: Optional[int] = None  # Offset of the last header in the buffer
+        self._header_stack: List[Tuple[int, str]] = []
+
+    def _context(self) -> str:
+        return "".join(f"{'#' * level} {title}\n" for level, title in self._header_stack)
+
+    def _split(self, text: str):
+        chunks = self._splitter.split_text(self._context() + text)
+        for match in _HEADER_LINE.finditer(text):
+            level = len(match.group(1))
+            self._header_stack = [h for h in self._header_stack if h[0] < level] + [(level, match.group(2))]
+        return chunks
+
+    def feed(self, page: str):
+        """
+        Add a page; return the chunks that are now complete.
+        """
+        start = len(self._buffer)
+        self._buffer += page + "\n\n"
+        for match in _HEADER_LINE.finditer(self._buffer, start):
+            self._last_header = match.start()
+
+        chunks = []
+        if self._last_header:
+            cut = self._last_header
+            chunks += self._split(self._buffer[:cut])
+            self._buffer, self._last_header = self._buffer[cut:], 0
+        if len(self._buffer) > settings.CHUNK_MAX_TOKENS * settings.CHUNK_CHARS_PER_TOKEN:
+            # Long section: keep only its last paragraph, it may continue on the next page
+            cut = self._buffer.rfind("\n\n", 0, len(self._buffer) - 2)
+            if cut <= 0:
+                cut = len(self._buffer)
+            chunks += self._split(self._buffer[:cut])
+            self._buffer, self._last_header = self._buffer[cut:].lstrip("\n"), None
+        return list(bound_chunks(chunks))
+
+    def flush(self):
+        """
+        Return the chunks of whatever is still buffered (end of book).
+        """
+        complete, self._buffer = self._buffer, ""
+        return list(bound_chunks(self._split(complete))) if complete.strip() else []
@@ -1,14 +1,7 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
+from app.core.clients import get_chat_model
 from app.core.config import settings
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    google_api_key=settings.GOOGLE_API_KEY,
-    temperature=0.7,
-    convert_system_message_to_human=True # Gemini sometimes needs this for system prompts in certain chains (optional but safe)
-)
-
 async def generate_system_prompt(book_text_sample: str) -> dict:
     """
     Analyze the beginning of the book to generate a persona name and system prompt.
@@ -35,10 +28,10 @@ async def generate_system_prompt(book_text_sample: str) -> dict:
     # For MVP, we'll trust GPT-4o with simple json prompt.
     
     prompt = PromptTemplate(template=template, input_variables=["text"])
-    chain = prompt | llm
+    chain = prompt | get_chat_model()
     
     # Using first 2000 chars roughly as sample
-    sample = book_text_sample[:8000] # GPT-4o context is large, 8000 chars is safe
+    sample = book_text_sample[:settings.PERSONA_SAMPLE_CHARS] # GPT-4o context is large, 8000 chars is safe
     
     response = await chain.ainvoke({"text": sample})
     content = response.content
@@ -1,53 +1,280 @@
-import os
-from typing import List
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import SupabaseVectorStore
+import asyncio
+import json
+import random
+from typing import Awaitable, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from app.core.clients import get_embeddings
 from app.core.config import settings
-from app.db.supabase import supabase
+from app.core.metrics import span
+from app.db import repository
+from app.services.answer_cache import answer_cache
+from app.services.embedding_cache import embedding_cache
+from app.services.vector_index import vector_index_cache
 
-# Explicitly set env var for libraries that rely on it
-os.environ["GOOGLE_API_KEY"] = settings.GOOGLE_API_KEY
+def _is_rate_limited(error: Exception) -> bool:
+    message = f"{type(error).__name__} {error}".lower()
+    return "429" in message or "resourceexhausted" in message or "quota" in message or "rate limit" in message
 
-embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=settings.GOOGLE_API_KEY)
+async def _with_retry(operation, description: str):
+    """
+    Run an async operation with exponential backoff + jitter.
+    Rate-limit errors (429 / ResourceExhausted) back off more aggressively.
+    """
+    for attempt in range(settings.EMBED_MAX_RETRIES + 1):
+        try:
+            return await operation()
+        except Exception as e:
+            if attempt == settings.EMBED_MAX_RETRIES:
+                raise
+            delay = settings.EMBED_RETRY_BASE_DELAY * (2 ** attempt)
+            if _is_rate_limited(e):
+                delay *= 4
+            delay += random.uniform(0, delay / 2)
+            print(f"{description} failed (attempt {attempt + 1}): {e}. Retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
 
-# Supabase Vector Store
-vectorstore = SupabaseVectorStore(
-    client=supabase,
-    embedding=embeddings,
-    table_name="documents",
-    query_name="match_documents"
-)
+async def load_checkpoint(file_hash: str, chunker: str) -> Set[int]:
+    """
+    The `chunk_index` values already stored for `file_hash` (ingestion checkpoint).
+    Indexes from another chunker (INGESTION_PIPELINED changed between attempts) cover
+    different text, so those chunks are deleted and the book restarts from chunk 0.
+    """
+    removed = 0
+    while True:
+        deleted = await repository.delete_stale_chunks(file_hash, chunker, settings.GC_BATCH_SIZE)
+        removed += deleted
+        if deleted < settings.GC_BATCH_SIZE:
+            break
+    if removed:
+        print(f"Restarting {file_hash}: removed {removed} chunks not made by the {chunker} chunker.")
+    return await repository.committed_chunk_indexes(file_hash)
 
-async def upsert_documents(documents: List[any], file_hash: str):
+async def upsert_documents(
+    documents: List[any],
+    file_hash: str,
+    chunker: str,
+    start_index: int = 0,
+    committed: Optional[Set[int]] = None,
+):
     """
     Upsert documents (chunks) to Supabase with file_hash metadata.
+    
+    Chunks are embedded in batches of EMBED_BATCH_SIZE (at most EMBED_CONCURRENCY in flight)
+    and each batch is written as one multi-row insert. Every chunk carries its `chunk_index`
+    (numbered from `start_index`) and the `chunker` that made it, so re-running a failed
+    book skips batches that were already committed by the same chunker (see `load_checkpoint`).
+    `committed` lets streaming callers pass the checkpoint once instead of per call.
     """
     # Create metadata for each doc
-    for doc in documents:
+    for i, doc in enumerate(documents, start=start_index):
         doc.metadata["file_hash"] = str(file_hash)
+        doc.metadata["chunk_index"] = i
+        doc.metadata["chunker"] = chunker
     
-    # Langchain Supabase add_documents
-    vectorstore.add_documents(documents)
+    batch_size = settings.EMBED_BATCH_SIZE
+    batches = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+    
+    # Resume: skip batches already committed by a previous attempt
+    if committed is None:
+        committed = await load_checkpoint(file_hash, chunker)
+    pending = [
+        batch for batch in batches
+        if not all(doc.metadata["chunk_index"] in committed for doc in batch)
+    ]
+    if len(pending) < len(batches):
+        print(f"Resuming {file_hash}: {len(batches) - len(pending)}/{len(batches)} batches already stored.")
+    
+    semaphore = asyncio.Semaphore(settings.EMBED_CONCURRENCY)
+    
+    async def process_batch(batch):
+        async with semaphore:
+            texts = [doc.page_content for doc in batch]
+            with span("embed"):
+                vectors = await _with_retry(lambda: get_embeddings().aembed_documents(texts), "Embedding batch")
+            rows = [
+                {"content": doc.page_content, "metadata": doc.metadata, "embedding": vector}
+                for doc, vector in zip(batch, vectors)
+            ]
+            with span("insert"):
+                await _with_retry(lambda: repository.insert_documents(rows), "Inserting batch")
+    
+    try:
+        results = await asyncio.gather(*(process_batch(batch) for batch in pending), return_exceptions=True)
+    finally:
+        vector_index_cache.invalidate(str(file_hash))
+        answer_cache.invalidate(str(file_hash))
+    
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        raise RuntimeError(
+            f"{len(errors)}/{len(pending)} embedding batches failed for {file_hash} "
+            f"(committed batches are kept and skipped on retry): {errors[0]}"
+        )
 
-async def retrieve_context(query: str, file_hash: str, k: int = 5):
+async def embed_query(query: str) -> List[float]:
+    """
+    Embed a user question, served from the query-embedding cache when possible.
+    """
+    return await embedding_cache.get_or_embed(query, settings.EMBEDDING_MODEL, get_embeddings().aembed_query)
+
+async def retrieve_context(query: str, file_hash: str, k: int = 5, query_embedding: Optional[List[float]] = None):
     """
     Retrieve context relevant to the query from the specific book (via file_hash).
+    Pass `query_embedding` if the caller has already embedded the query.
+    Vector search through `retrieve_candidates`, without the embeddings.
     """
-    # Filter syntax for Supabase Vector Store (PostgREST)
-    # metadata column is jsonb.
-    # We want metadata->>'file_hash' == file_hash
-    filter_dict = {"file_hash": str(file_hash)}
-    docs = vectorstore.similarity_search(query, k=k, filter=filter_dict)
+    docs, _ = await retrieve_candidates(query, file_hash, k, query_embedding)
     return docs
 
-async def delete_vectors_by_file_hash(file_hash: str):
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+
+def _rows_to_candidates(rows: List[dict], score_key: str) -> Tuple[List[any], Optional[np.ndarray]]:
+    """
+    Documents plus their embeddings (None if any row lacks one) from repository rows.
+    """
+    docs = [
+        Document(page_content=row["content"], metadata={**(row["metadata"] or {}), score_key: row[score_key]})
+        for row in rows
+    ]
+    raw_vectors = [row.get("embedding") for row in rows]
+    if not rows or any(e is None for e in raw_vectors):
+        return docs, None
+    vectors = np.asarray([json.loads(e) if isinstance(e, str) else e for e in raw_vectors], dtype=np.float32)
+    return docs, vectors
+
+def reciprocal_rank_fusion(rankings: List[List[any]], k: int = 60) -> List[any]:
+    """
+    Merge ranked document lists: score = sum of 1 / (k + rank) over the lists a chunk
+    appears in (rank from 1). Chunks are identified by content; the first occurrence
+    is kept and gets `rrf_score` in its metadata.
+    """
+    scores = {}
+    first = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            first.setdefault(key, doc)
+    fused = sorted(first, key=lambda key: scores[key], reverse=True)
+    for key in fused:
+        first[key].metadata["rrf_score"] = scores[key]
+    return [first[key] for key in fused]
+
+async def embed_for_retrieval(query: str, mode: str) -> Optional[List[float]]:
+    """
+    Query embedding for a retrieval mode. None for `lexical`, and for `hybrid` when the
+    embedding service fails or takes longer than EMBED_QUERY_TIMEOUT (lexical fast path).
+    """
+    if mode == "lexical":
+        return None
+    if mode == "vector":
+        return await embed_query(query)
+    try:
+        return await asyncio.wait_for(embed_query(query), timeout=settings.EMBED_QUERY_TIMEOUT)
+    except Exception as e:
+        print(f"Query embedding unavailable, answering from lexical search: {type(e).__name__} {e}")
+        return None
+
+async def search_lexical(query: str, file_hash: str, k: int) -> Tuple[List[any], Optional[np.ndarray]]:
+    """
+    Full-text candidates (and their embeddings) from one book. Empty on failure,
+    so hybrid retrieval degrades to vector-only.
+    """
+    try:
+        rows = await repository.match_documents_lexical(query, match_count=k, filter={"file_hash": str(file_hash)})
+    except Exception as e:
+        print(f"Lexical search failed for {file_hash}: {e}")
+        return [], None
+    return _rows_to_candidates(rows, "rank")
+
+async def _search_vectors(
+    query_embedding: List[float], file_hash: str, k: int, indexed: bool = True
+) -> Tuple[List[any], Optional[np.ndarray]]:
+    # A book still being indexed is searched in the database, which sees every new
+    # batch; an in-process index loaded now would be partial
+    if settings.VECTOR_INDEX_ENABLED and file_hash and indexed:
+        index = await vector_index_cache.get(str(file_hash))
+        if index is not None:
+            return index.search_with_vectors(query_embedding, k=k)
+    
+    rows = await repository.match_documents(
+        query_embedding, match_count=k, filter={"file_hash": str(file_hash)}, with_embeddings=True
+    )
+    return _rows_to_candidates(rows, "similarity")
+
+async def retrieve_candidates(
+    query: str,
+    file_hash: str,
+    k: int,
+    query_embedding: Optional[List[float]] = None,
+    mode: str = "vector",
+    lexical: Optional[Awaitable] = None,
+    indexed: bool = True,
+) -> Tuple[List[any], Optional[np.ndarray]]:
+    """
+    Retrieve candidate chunks from one book (via file_hash) together with their
+    embeddings (one row per document), so context assembly can deduplicate and
+    diversify without re-embedding.
+    The embeddings are None if any of them could not be loaded.
+
+    `mode` is one of RETRIEVAL_MODES. `hybrid` fuses vector and full-text results with
+    reciprocal-rank fusion, or uses full-text only if `query_embedding` is None.
+    `lexical` may be an already started `search_lexical` call. Pass `indexed=False`
+    while the book is still being indexed, so the in-process vector index is bypassed.
+    """
+    if mode == "vector":
+        if query_embedding is None:
+            query_embedding = await embed_query(query)
+        return await _search_vectors(query_embedding, file_hash, k, indexed)
+    
+    if lexical is None:
+        lexical = search_lexical(query, file_hash, k)
+    if mode == "lexical" or query_embedding is None:
+        return await lexical
+    
+    (vector_docs, vector_vectors), (lexical_docs, lexical_vectors) = await asyncio.gather(
+        _search_vectors(query_embedding, file_hash, k, indexed), lexical
+    )
+    fused = reciprocal_rank_fusion([vector_docs, lexical_docs], k=settings.RRF_K)[:k]
+    
+    # Carry the embeddings over to the fused order
+    by_content = {}
+    for docs, vectors in ((vector_docs, vector_vectors), (lexical_docs, lexical_vectors)):
+        if vectors is not None:
+            for doc, vector in zip(docs, vectors):
+                by_content.setdefault(doc.page_content, vector)
+    if not fused or any(doc.page_content not in by_content for doc in fused):
+        return fused, None
+    return fused, np.stack([by_content[doc.page_content] for doc in fused])
+
+async def delete_vectors_by_file_hash(file_hash: str, max_batches: Optional[int] = None) -> int:
     """
     Delete all vectors associated with a specific file_hash.
-    Used when the last reference to a file is deleted.
+    Used when the last reference to a file is deleted: does nothing while any book
+    still references the hash. Deletes GC_BATCH_SIZE rows per statement (counts only,
+    no rows returned), at most `max_batches` batches. Returns the number of rows deleted.
     """
+    deleted = 0
     try:
-        # Use Supabase Client to delete directly
-        response = supabase.table("documents").delete().eq("metadata->>file_hash", str(file_hash)).execute()
-        print(f"Vectors for hash {file_hash} deleted. Count: {len(response.data) if response.data else 0}")
+        references = await repository.count_book_references(file_hash)
+        if references:
+            print(f"Vectors for hash {file_hash} kept: still used by {references} book(s).")
+            return 0
+        
+        vector_index_cache.invalidate(str(file_hash))
+        answer_cache.invalidate(str(file_hash))
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            count = await repository.delete_documents_batch(file_hash, settings.GC_BATCH_SIZE)
+            deleted += count
+            batches += 1
+            if count < settings.GC_BATCH_SIZE:
+                break
+            # Give autovacuum and concurrent queries room between batches
+            await asyncio.sleep(settings.GC_BATCH_PAUSE)
+        print(f"Vectors for hash {file_hash} deleted. Count: {deleted}")
     except Exception as e:
         print(f"Error deleting vectors for {file_hash}: {e}")
+    return deleted
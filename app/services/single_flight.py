@@ -0,0 +1,127 @@
+import asyncio
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+class Flight:
+    """
+    One in-flight upstream call whose output frames are fanned out to every subscriber.
+    Frames are kept for the lifetime of the flight, so a late subscriber first
+    receives everything published so far, then follows live.
+
+    Subscribers are counted from `SingleFlight.join` until `leave`; when the last
+    one leaves before the flight is done, the producer is cancelled.
+    """
+    def __init__(self):
+        self.frames: List[str] = []
+        self.contents: List[str] = []  # Answer text carried by each frame ("" for control frames)
+        self.result: Optional[str] = None  # Set by a successful producer, None on failure
+        self.headers: Dict[str, str] = {}  # Response headers, set by the producer before its first frame
+        self.done = False
+        self.subscribers = 0
+        self.cancelled = False
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _notify(self):
+        # Wake every waiting subscriber; later waits block on a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, frame: str, content: str = ""):
+        self.frames.append(frame)
+        self.contents.append(content)
+        self._notify()
+
+    def text(self, frames: Optional[int] = None) -> str:
+        """
+        Answer text of the first `frames` frames (all by default).
+        """
+        return "".join(self.contents[:frames])
+
+    def leave(self):
+        """
+        A subscriber is gone; cancel the producer once nobody is listening.
+        """
+        self.subscribers -= 1
+        if self.subscribers <= 0 and not self.done and self._task is not None:
+            self.cancelled = True
+            self._task.cancel()
+
+    def finish(self, result: Optional[str] = None):
+        if not self.done:
+            self.result = result
+            self.done = True
+            self._notify()
+
+    async def wait_started(self):
+        """
+        Wait for the first frame (or the end of the flight).
+        """
+        while not self.frames and not self.done:
+            await self._changed.wait()
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        position = 0
+        while True:
+            while position < len(self.frames):
+                yield self.frames[position]
+                position += 1
+            if self.done:
+                return
+            await self._changed.wait()
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent requests: the first caller for a key starts the
+    producer in a background task (so it outlives the client that started it), and
+    every caller for the same key, first one included, subscribes to its frames.
+    The key is released as soon as the producer finishes, or is cancelled because
+    every subscriber left.
+    """
+    def __init__(self):
+        self._flights: Dict[Hashable, Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.cancelled = 0
+
+    def join(self, key: Hashable, produce: Callable[[Flight], Awaitable[None]]) -> Flight:
+        """
+        Subscribe to the flight for `key`, starting it if needed. Callers must `leave()` it.
+        """
+        flight = self._flights.get(key)
+        if flight is not None and not flight.cancelled:
+            self.followers += 1
+            flight.subscribers += 1
+            return flight
+
+        self.leaders += 1
+        flight = self._flights[key] = Flight()
+        flight.subscribers = 1
+        flight._task = asyncio.create_task(self._drive(key, flight, produce))
+        # A done callback, not a finally: a task cancelled before it first runs skips its body
+        flight._task.add_done_callback(lambda _: self._land(key, flight))
+        return flight
+
+    async def _drive(self, key: Hashable, flight: Flight, produce: Callable[[Flight], Awaitable[None]]):
+        try:
+            await produce(flight)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Coalesced request {key} failed: {e}")
+
+    def _land(self, key: Hashable, flight: Flight):
+        if flight.cancelled:
+            self.cancelled += 1
+        flight.finish()
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "cancelled": self.cancelled,
+        }
+
+chat_flights = SingleFlight()
@@ -1,20 +1,46 @@
 import os
-from app.db.supabase import supabase
+import asyncio
+import hashlib
+from urllib.parse import quote
 
-async def download_file_from_storage(bucket_name: str, file_path: str, destination_path: str):
+from app.core.clients import get_http_client
+from app.core.config import settings
+
+def scratch_path(filename: str) -> str:
+    """
+    Return a path inside the configured scratch directory (created on demand).
+    """
+    os.makedirs(settings.SCRATCH_DIR, exist_ok=True)
+    return os.path.join(settings.SCRATCH_DIR, filename)
+
+async def download_file_from_storage(bucket_name: str, file_path: str, destination_path: str) -> str:
     """
-    Download a file from Supabase Storage to a local destination.
+    Stream a file from Supabase Storage to a local destination.
+    The SHA-256 is computed in the same pass, so memory stays bounded by
+    DOWNLOAD_CHUNK_SIZE regardless of the file size.
+    Returns the hex SHA-256 of the file.
     """
     print(f"Downloading from bucket '{bucket_name}', path '{file_path}' to '{destination_path}'...")
+    url = f"{settings.SUPABASE_URL.rstrip('/')}/storage/v1/object/{quote(bucket_name)}/{quote(file_path)}"
+    headers = {
+        "Authorization": f"Bearer {settings.SUPABASE_SERVICE_KEY}",
+        "apikey": settings.SUPABASE_SERVICE_KEY,
+    }
+    sha256 = hashlib.sha256()
+    size = 0
     try:
-        # Supabase Storage download returns bytes
-        response = supabase.storage.from_(bucket_name).download(file_path)
-        
-        with open(destination_path, "wb") as f:
-            f.write(response)
+        async with get_http_client().stream("GET", url, headers=headers) as response:
+            response.raise_for_status()
+            with open(destination_path, "wb") as f:
+                async for chunk in response.aiter_bytes(settings.DOWNLOAD_CHUNK_SIZE):
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    await asyncio.to_thread(f.write, chunk)
             
-        print("Download complete.")
-        return True
+        print(f"Download complete ({size} bytes).")
+        return sha256.hexdigest()
     except Exception as e:
         print(f"Error downloading file: {e}")
+        if os.path.exists(destination_path):
+            os.remove(destination_path)
         raise e
@@ -0,0 +1,51 @@
+import asyncio
+from typing import AsyncIterator, List, Optional
+
+async def coalesce(pieces: AsyncIterator[str], interval: float, max_bytes: int) -> AsyncIterator[str]:
+    """
+    Merge small text pieces (model chunks) into fewer, larger ones.
+
+    At most one merged piece is yielded per `interval` seconds, earlier once `max_bytes`
+    (UTF-8) are pending. A piece arriving after a quiet `interval` (the first one
+    included: time to first token) is yielded at once, and the timer runs even while
+    upstream is silent, so no text is held back longer than `interval`. Closing or
+    cancelling the consumer cancels the upstream iterator.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = pieces.__aiter__()
+    buffer: List[str] = []
+    size = 0
+    deadline: Optional[float] = None
+    last_yield: Optional[float] = None
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if done:
+                step, pending = pending, None
+                try:
+                    piece = step.result()
+                except StopAsyncIteration:
+                    break
+                if not piece:
+                    continue
+                buffer.append(piece)
+                size += len(piece.encode("utf-8"))
+                if deadline is None:
+                    deadline = loop.time() if last_yield is None else last_yield + interval
+                if size < max_bytes and loop.time() < deadline:
+                    continue
+            if buffer:
+                text, buffer, size, deadline = "".join(buffer), [], 0, None
+                last_yield = loop.time()
+                yield text
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
+        elif hasattr(iterator, "aclose"):
+            await iterator.aclose()
@@ -0,0 +1,157 @@
+import asyncio
+import json
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.db import repository
+
+class BookVectorIndex:
+    """
+    Exact in-memory cosine search over the chunks of one book (one file_hash).
+    Rows are L2-normalized once, so a query is a single matrix-vector product.
+    """
+    def __init__(self, ids: List[int], contents: List[str], metadatas: List[dict], matrix: np.ndarray):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.ids = ids
+        self.contents = contents
+        self.metadatas = metadatas
+        self.matrix = (matrix / norms).astype(np.float32)
+        self.nbytes = self.matrix.nbytes + sum(len(c) for c in contents)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> "BookVectorIndex":
+        ids, contents, metadatas, vectors = [], [], [], []
+        for row in rows:
+            embedding = row["embedding"]
+            if isinstance(embedding, str):
+                embedding = json.loads(embedding)
+            ids.append(row["id"])
+            contents.append(row["content"] or "")
+            metadatas.append(row["metadata"] or {})
+            vectors.append(embedding)
+        matrix = np.asarray(vectors, dtype=np.float32)
+        return cls(ids, contents, metadatas, matrix)
+
+    def search_with_vectors(self, query_embedding: List[float], k: int = 5) -> Tuple[List[Document], np.ndarray]:
+        """
+        Return the top-k chunks by cosine similarity (same ranking as `match_documents`),
+        plus their unit-length embeddings (one row per document).
+        """
+        if not self.ids:
+            return [], np.empty((0, 0), dtype=np.float32)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = self.matrix @ query
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        docs = [
+            Document(
+                page_content=self.contents[i],
+                metadata={**self.metadatas[i], "similarity": float(scores[i])}
+            )
+            for i in top
+        ]
+        return docs, self.matrix[top]
+
+class VectorIndexCache:
+    """
+    LRU cache of BookVectorIndex per file_hash, bounded by total memory (bytes).
+    Indexes are loaded lazily from `documents` on first use. A load lock exists only
+    while requests for that book are loading or waiting on it.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._indexes: "OrderedDict[str, BookVectorIndex]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._waiting: Counter = Counter()  # Requests holding or waiting on each load lock
+        self._stale: Set[str] = set()  # Books invalidated while their index was loading
+        self._bytes = 0
+
+    async def get(self, file_hash: str) -> Optional[BookVectorIndex]:
+        """
+        Return the index for a book, loading it on a miss.
+        Returns None if the book has no vectors (caller falls back to `match_documents`).
+        """
+        index = self._indexes.get(file_hash)
+        if index is not None:
+            self._indexes.move_to_end(file_hash)
+            return index
+
+        lock = self._locks.setdefault(file_hash, asyncio.Lock())
+        self._waiting[file_hash] += 1
+        try:
+            async with lock:
+                # Another request may have loaded it while we waited
+                index = self._indexes.get(file_hash)
+                if index is not None:
+                    self._indexes.move_to_end(file_hash)
+                    return index
+
+                self._stale.discard(file_hash)
+                rows = await repository.fetch_document_vectors(file_hash)
+                if not rows:
+                    return None
+                index = await asyncio.to_thread(BookVectorIndex.from_rows, rows)
+
+                # Skip caching if the book was invalidated during the load
+                if file_hash not in self._stale:
+                    self._put(file_hash, index)
+                return index
+        finally:
+            self._waiting[file_hash] -= 1
+            if not self._waiting[file_hash]:
+                del self._waiting[file_hash]
+                self._locks.pop(file_hash, None)
+                self._stale.discard(file_hash)
+
+    def _put(self, file_hash: str, index: BookVectorIndex):
+        if index.nbytes > self.max_bytes:
+            print(f"Vector index for {file_hash} ({index.nbytes} bytes) exceeds cache cap, not cached.")
+            return
+        self._pop(file_hash)
+        self._indexes[file_hash] = index
+        self._bytes += index.nbytes
+        while self._bytes > self.max_bytes:
+            _, evicted = self._indexes.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def _pop(self, file_hash: str):
+        index = self._indexes.pop(file_hash, None)
+        if index is not None:
+            self._bytes -= index.nbytes
+
+    def invalidate(self, file_hash: str):
+        """
+        Drop the cached index for a book (vectors added or deleted).
+        """
+        if file_hash in self._locks:
+            self._stale.add(file_hash)
+        self._pop(file_hash)
+
+    def clear(self):
+        """
+        Drop every cached index, and discard loads still in progress.
+        """
+        for file_hash in set(self._indexes) | set(self._locks):
+            self.invalidate(file_hash)
+
+    def stats(self) -> dict:
+        return {
+            "books": len(self._indexes),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+vector_index_cache = VectorIndexCache(max_bytes=settings.VECTOR_INDEX_MAX_BYTES)
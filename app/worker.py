@@ -0,0 +1,143 @@
+"""
+Ingestion worker: consumes the `ingestion_jobs` queue outside the API process.
+
+    python -m app.worker
+
+Requires DATABASE_URL. Run as many replicas as needed; jobs are claimed with
+FOR UPDATE SKIP LOCKED and held by a lease that is renewed by a heartbeat.
+"""
+import asyncio
+import os
+import signal
+import socket
+import uuid
+from typing import Dict, Set
+
+from app.core import clients
+from app.core.config import settings
+from app.db import repository
+from app.services.gc_service import garbage_collector
+from app.services.ingestion_service import mark_book_failed, run_ingestion, set_stage
+
+class IngestionWorker:
+    def __init__(self, concurrency: int, lease_seconds: float, poll_interval: float):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._tasks: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+        self._next_reap = 0.0
+
+    def stop(self):
+        print(f"Worker {self.worker_id}: shutting down, no new jobs will be claimed.")
+        self._stopping.set()
+
+    async def run(self):
+        print(f"Worker {self.worker_id} started (concurrency={self.concurrency}).")
+        loop = asyncio.get_running_loop()
+        while not self._stopping.is_set():
+            # A lease cannot expire faster than lease_seconds, so reaping more often is pointless
+            if loop.time() >= self._next_reap:
+                self._next_reap = loop.time() + self.lease_seconds
+                await self._reap()
+
+            if len(self._tasks) >= self.concurrency:
+                await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            try:
+                job = await repository.claim_ingestion_job(self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"Worker {self.worker_id}: failed to claim job: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._process(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        # Let running jobs finish; anything left when the process is killed is
+        # re-claimed by another worker once its lease expires.
+        if self._tasks:
+            await asyncio.wait(self._tasks)
+
+    async def _reap(self):
+        """
+        Fail the books of jobs that died on their last attempt; the claim query skips them.
+        """
+        try:
+            jobs = await repository.reap_ingestion_jobs()
+        except Exception as e:
+            print(f"Worker {self.worker_id}: failed to reap expired jobs: {e}")
+            return
+        for job in jobs:
+            print(f"Worker {self.worker_id}: job {job['id']} lost its worker on the last attempt, failing book {job['book_id']}.")
+            try:
+                await mark_book_failed(str(job["book_id"]), RuntimeError("Ingestion worker stopped during the last attempt (lease expired)"))
+            except Exception as e:
+                print(f"Worker {self.worker_id}: failed to mark book {job['book_id']} failed: {e}")
+
+    async def _heartbeat(self, job: Dict, job_task: asyncio.Task):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                alive = await repository.heartbeat_ingestion_job(job["id"], self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"Worker {self.worker_id}: heartbeat for job {job['id']} failed: {e}")
+                continue
+            if not alive:
+                print(f"Worker {self.worker_id}: lost lease on job {job['id']}, cancelling.")
+                job_task.cancel()
+                return
+
+    async def _process(self, job: Dict):
+        book_id = str(job["book_id"])
+        print(f"Worker {self.worker_id}: job {job['id']} (book {book_id}), attempt {job['attempts']}/{job['max_attempts']}")
+
+        job_task = asyncio.current_task()
+        heartbeat = asyncio.create_task(self._heartbeat(job, job_task))
+        try:
+            await run_ingestion(book_id, job["bucket_name"], job["file_path"])
+            await repository.complete_ingestion_job(job["id"], self.worker_id)
+        except asyncio.CancelledError:
+            # Lease lost: another worker owns the job now
+            pass
+        except Exception as e:
+            print(f"Worker {self.worker_id}: job {job['id']} failed: {e}")
+            retry_delay = settings.JOB_RETRY_BASE_DELAY * (2 ** (job["attempts"] - 1))
+            status = await repository.fail_ingestion_job(job["id"], self.worker_id, str(e), retry_delay)
+            if status == "failed":
+                await mark_book_failed(book_id, e)
+            else:
+                await set_stage(book_id, "retrying")
+        finally:
+            heartbeat.cancel()
+
+async def main():
+    if repository.engine is None:
+        raise SystemExit("app.worker requires DATABASE_URL (direct Postgres connection).")
+    worker = IngestionWorker(
+        concurrency=settings.WORKER_CONCURRENCY,
+        lease_seconds=settings.JOB_LEASE_SECONDS,
+        poll_interval=settings.JOB_POLL_INTERVAL,
+    )
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    if settings.GC_ENABLED:
+        garbage_collector.start()
+    try:
+        await worker.run()
+    finally:
+        await garbage_collector.stop()
+        await clients.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
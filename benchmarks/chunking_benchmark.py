@@ -0,0 +1,76 @@
+"""
+Chunking benchmark: chunk-size distribution and throughput of `split_markdown`
+and the page-streaming `MarkdownStreamSplitter`.
+
+    python -m benchmarks.chunking_benchmark                  # synthetic book
+    python -m benchmarks.chunking_benchmark path/to/book.md  # real parsed markdown
+"""
+import sys
+import time
+import random
+import statistics
+
+from app.core.config import settings
+from app.services.pdf_service import MarkdownStreamSplitter, estimate_tokens, split_markdown
+
+def synthetic_book(chapters: int = 40, seed: int = 0) -> str:
+    """
+    A book mixing short header sections with long header-less chapters.
+    """
+    rng = random.Random(seed)
+    words = "the reader learns that every system trades latency for throughput under load".split()
+    parts = []
+    for c in range(chapters):
+        parts.append(f"# Chapter {c + 1}")
+        sections = rng.randint(0, 4)
+        if sections == 0:
+            # Long chapter without sub-headers
+            paragraphs = rng.randint(40, 120)
+        else:
+            paragraphs = rng.randint(2, 8)
+        for s in range(max(sections, 1)):
+            if sections:
+                parts.append(f"## Section {c + 1}.{s + 1}")
+            for _ in range(paragraphs):
+                parts.append(" ".join(rng.choice(words) for _ in range(rng.randint(40, 160))) + ".")
+    return "\n\n".join(parts)
+
+def paginate(text: str, page_chars: int = 3000):
+    return [text[i:i + page_chars] for i in range(0, len(text), page_chars)]
+
+def percentile(values, q: float) -> int:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def report(name: str, chunks, elapsed: float):
+    sizes = [estimate_tokens(c.page_content) for c in chunks]
+    print(f"{name}")
+    print(f"  chunks:        {len(chunks)}")
+    print(f"  tokens/chunk:  min {min(sizes)}  p50 {percentile(sizes, 0.5)}  "
+          f"p95 {percentile(sizes, 0.95)}  max {max(sizes)}  mean {statistics.mean(sizes):.0f}")
+    print(f"  over limit:    {sum(1 for s in sizes if s > settings.CHUNK_MAX_TOKENS)}")
+    print(f"  throughput:    {len(chunks) / elapsed:,.0f} chunks/sec ({elapsed * 1000:.1f} ms)")
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = synthetic_book()
+    print(f"Input: {len(text):,} chars (~{estimate_tokens(text):,} tokens), "
+          f"CHUNK_MAX_TOKENS={settings.CHUNK_MAX_TOKENS}, CHUNK_OVERLAP_TOKENS={settings.CHUNK_OVERLAP_TOKENS}")
+
+    start = time.perf_counter()
+    chunks = split_markdown(text)
+    report("split_markdown (whole book)", chunks, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    splitter = MarkdownStreamSplitter()
+    streamed = []
+    for page in paginate(text):
+        streamed.extend(splitter.feed(page))
+    streamed.extend(splitter.flush())
+    report("MarkdownStreamSplitter (page by page)", streamed, time.perf_counter() - start)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+"""
+Local stand-ins for the external services, so benchmarks can drive `app.main:app`
+without Supabase, Google or LlamaCloud:
+
+  FakeStore        in-memory replacement for the `app.db.repository` functions the
+                   chat and ingestion paths call (books, personas, chat messages,
+                   conversation summaries, documents with exact cosine / word-overlap
+                   search)
+  FakeEmbeddings   deterministic hashed bag-of-words vectors (EMBEDDING_DIM wide)
+  FakeChatModel    streams a canned answer with configurable first-token / per-token
+                   latency; also answers the persona prompt with JSON
+  FakeParser       canned markdown pages generated from the downloaded "PDF"
+
+`install()` patches them into the app modules. Import this module before anything
+from `app`: it fills in the settings the app requires and forces the in-memory path
+(no DATABASE_URL).
+"""
+import os
+
+for _name, _value in {
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_SERVICE_KEY": "benchmark",
+    "GOOGLE_API_KEY": "benchmark",
+    "LLAMA_CLOUD_API_KEY": "benchmark",
+}.items():
+    os.environ.setdefault(_name, _value)
+os.environ["DATABASE_URL"] = ""
+
+import re
+import json
+import zlib
+import random
+import asyncio
+import hashlib
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.runnables import Runnable
+
+from app.models.document import EMBEDDING_DIM
+
+_WORD = re.compile(r"\w+")
+
+VOCABULARY = (
+    "latency throughput cache index vector query stream token batch queue worker lease "
+    "replica shard commit snapshot page chapter reader author argument evidence model "
+    "signal noise budget memory disk network socket thread process lock retry backoff"
+).split()
+
+def words(text: str) -> List[str]:
+    return _WORD.findall(text.casefold())
+
+class FakeStore:
+    """
+    In-memory tables behind the same async signatures as `app.db.repository`.
+    Every call sleeps `latency` seconds first to stand in for a database round trip.
+    """
+    def __init__(self, latency: float = 0.002):
+        self.latency = latency
+        self.books: Dict[str, Dict[str, Any]] = {}
+        self.personas: Dict[str, Dict[str, Any]] = {}
+        self.chat_messages: List[Dict[str, Any]] = []
+        self.summaries: Dict[tuple, Dict[str, Any]] = {}
+        self.documents: Dict[str, List[Dict[str, Any]]] = {}
+        self._matrices: Dict[str, np.ndarray] = {}
+        self._next_id = 1
+        self.calls = 0
+
+    async def _round_trip(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+    def add_book(self, book_id: str, **values) -> Dict[str, Any]:
+        book = {
+            "id": str(book_id),
+            "user_id": None,
+            "title": f"Book {book_id}",
+            "file_path": f"{book_id}.pdf",
+            "status": "processing",
+            "stage": None,
+            "chunks_indexed": None,
+            "chunks_total": None,
+            "error_message": None,
+            "file_hash": None,
+            "created_at": datetime.now(timezone.utc),
+            **values,
+        }
+        self.books[str(book_id)] = book
+        return book
+
+    # --- Books / personas / chat messages ---
+
+    async def get_book(self, book_id: str) -> Optional[Dict[str, Any]]:
+        await self._round_trip()
+        book = self.books.get(str(book_id))
+        return dict(book) if book else None
+
+    async def update_book(self, book_id: str, values: Dict[str, Any]) -> None:
+        await self._round_trip()
+        book = self.books.get(str(book_id))
+        if book:
+            book.update(values)
+
+    async def get_persona(self, book_id: str) -> Optional[Dict[str, Any]]:
+        await self._round_trip()
+        persona = self.personas.get(str(book_id))
+        return dict(persona) if persona else None
+
+    async def insert_persona(self, book_id: str, role_name: str, system_prompt: str) -> None:
+        await self._round_trip()
+        self.personas[str(book_id)] = {
+            "id": str(book_id), "book_id": str(book_id), "role_name": role_name, "system_prompt": system_prompt,
+        }
+
+    async def insert_chat_messages(self, messages: List[Dict[str, Any]]) -> None:
+        await self._round_trip()
+        for message in messages:
+            created_at = message.get("created_at") or datetime.now(timezone.utc)
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(created_at)
+            self.chat_messages.append({**message, "id": str(uuid.uuid4()), "created_at": created_at})
+
+    async def list_chat_messages(self, book_id: str, limit: int, before=None):
+        await self._round_trip()
+        messages = sorted(
+            (m for m in self.chat_messages if m["book_id"] == str(book_id)),
+            key=lambda m: (m["created_at"], m["id"]),
+            reverse=True,
+        )
+        if before:
+            messages = [m for m in messages if (m["created_at"], m["id"]) < (before[0], str(before[1]))]
+        page = [dict(m) for m in messages[:limit + 1]]
+        return list(reversed(page[:limit])), len(page) > limit
+
+    def _conversation(self, book_id: str, user_id: Optional[str]) -> List[Dict[str, Any]]:
+        messages = [
+            m for m in self.chat_messages
+            if m["book_id"] == str(book_id) and (m.get("user_id") or None) == (user_id or None)
+        ]
+        return sorted(messages, key=lambda m: (m["created_at"], m["id"]))
+
+    async def recent_conversation_messages(self, book_id: str, user_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        return [dict(m) for m in self._conversation(book_id, user_id)[-limit:]]
+
+    async def conversation_messages_after(self, book_id: str, user_id: Optional[str], after, limit: int) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        messages = self._conversation(book_id, user_id)
+        if after:
+            messages = [m for m in messages if (m["created_at"], m["id"]) > (after[0], str(after[1]))]
+        return [dict(m) for m in messages[:limit]]
+
+    async def get_conversation_summary(self, book_id: str, user_key: str) -> Optional[Dict[str, Any]]:
+        await self._round_trip()
+        summary = self.summaries.get((str(book_id), user_key))
+        return dict(summary) if summary else None
+
+    async def save_conversation_summary(self, book_id: str, user_key: str, summary: str, until, previous_id) -> bool:
+        await self._round_trip()
+        current = self.summaries.get((str(book_id), user_key), {})
+        if current.get("summarized_until_id") != previous_id:
+            return False
+        self.summaries[(str(book_id), user_key)] = {
+            "summary": summary, "summarized_until": until[0], "summarized_until_id": str(until[1]),
+        }
+        return True
+
+    async def find_books_by_file_hash(self, file_hash: str) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        books = [dict(b) for b in self.books.values() if b["file_hash"] == file_hash]
+        return sorted(books, key=lambda b: b["created_at"])
+
+    async def count_book_references(self, file_hash: str) -> int:
+        await self._round_trip()
+        return sum(1 for b in self.books.values() if b["file_hash"] == file_hash)
+
+    # --- Documents ---
+
+    async def insert_documents(self, rows: List[Dict[str, Any]]) -> None:
+        await self._round_trip()
+        for row in rows:
+            file_hash = row["metadata"]["file_hash"]
+            self.documents.setdefault(file_hash, []).append({
+                "id": self._next_id,
+                "content": row["content"],
+                "metadata": dict(row["metadata"]),
+                "embedding": list(row["embedding"]),
+            })
+            self._matrices.pop(file_hash, None)
+            self._next_id += 1
+
+    async def committed_chunk_indexes(self, file_hash: str, page_size: int = 1000) -> Set[int]:
+        await self._round_trip()
+        return {row["metadata"]["chunk_index"] for row in self.documents.get(str(file_hash), [])}
+
+    async def delete_stale_chunks(self, file_hash: str, chunker: str, batch_size: int) -> int:
+        await self._round_trip()
+        rows = self.documents.get(str(file_hash), [])
+        stale = [row for row in rows if row["metadata"].get("chunker") != chunker][:batch_size]
+        if stale:
+            ids = {row["id"] for row in stale}
+            self.documents[str(file_hash)] = [row for row in rows if row["id"] not in ids]
+            self._matrices.pop(str(file_hash), None)
+        return len(stale)
+
+    async def fetch_document_vectors(self, file_hash: str, page_size: int = 1000) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        return [dict(row) for row in self.documents.get(str(file_hash), [])]
+
+    def _matrix(self, file_hash: str) -> np.ndarray:
+        matrix = self._matrices.get(file_hash)
+        if matrix is None:
+            matrix = np.asarray([row["embedding"] for row in self.documents[file_hash]], dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix = self._matrices[file_hash] = matrix / norms
+        return matrix
+
+    async def match_documents(
+        self,
+        query_embedding: List[float],
+        match_count: int,
+        filter: Optional[Dict[str, Any]] = None,
+        match_threshold: float = 0.0,
+        with_embeddings: bool = False,
+    ) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        file_hash = (filter or {}).get("file_hash")
+        rows = self.documents.get(file_hash) or []
+        if not rows:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self._matrix(file_hash) @ (query / norm if norm else query)
+        top = np.argsort(-scores)[:match_count]
+        matches = []
+        for i in top:
+            if scores[i] <= match_threshold:
+                continue
+            row = {"id": rows[i]["id"], "content": rows[i]["content"], "metadata": rows[i]["metadata"], "similarity": float(scores[i])}
+            if with_embeddings:
+                row["embedding"] = rows[i]["embedding"]
+            matches.append(row)
+        return matches
+
+    async def match_documents_lexical(
+        self,
+        query_text: str,
+        match_count: int,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        terms = set(words(query_text))
+        ranked = []
+        for row in self.documents.get((filter or {}).get("file_hash"), []):
+            rank = sum(1 for w in words(row["content"]) if w in terms)
+            if rank:
+                ranked.append((rank, row))
+        ranked.sort(key=lambda item: (-item[0], item[1]["id"]))
+        return [
+            {"id": row["id"], "content": row["content"], "metadata": row["metadata"], "rank": float(rank), "embedding": row["embedding"]}
+            for rank, row in ranked[:match_count]
+        ]
+
+class FakeEmbeddings:
+    """
+    Hashed bag of words: texts sharing words get similar vectors, the same text always
+    gets the same vector. `latency` is slept per call (query or document batch).
+    """
+    def __init__(self, latency: float = 0.05, dim: int = EMBEDDING_DIM):
+        self.latency = latency
+        self.dim = dim
+        self.calls = 0
+
+    def embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in words(text):
+            h = zlib.crc32(word.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [self.embed(text) for text in texts]
+
+class FakeChatModel(Runnable):
+    """
+    Streams `tokens` words, the first after `first_token_latency` seconds and each
+    following one after `token_latency`. Non-streaming calls (the persona chain)
+    return persona JSON after `first_token_latency`.
+    """
+    def __init__(self, tokens: int = 200, token_latency: float = 0.01, first_token_latency: float = 0.3):
+        self.tokens = tokens
+        self.token_latency = token_latency
+        self.first_token_latency = first_token_latency
+        self.calls = 0
+
+    def invoke(self, input, config=None, **kwargs):
+        raise NotImplementedError("FakeChatModel is async only")
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.first_token_latency)
+        return AIMessage(content=json.dumps({
+            "role_name": "Benchmark Narrator",
+            "system_prompt": "You answer questions about this book, strictly from its content.",
+        }))
+
+    async def astream(self, input, config=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.first_token_latency)
+        for i in range(self.tokens):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            yield AIMessageChunk(content=VOCABULARY[i % len(VOCABULARY)] + " ")
+
+def book_pages(seed: str, pages: int, page_words: int = 400) -> List[str]:
+    """
+    Deterministic markdown for one book: a chapter header every 5 pages, a section
+    header per page, paragraphs of VOCABULARY words plus a few book-specific terms.
+    """
+    rng = random.Random(seed)
+    terms = [f"{word}{rng.randint(0, 999)}" for word in rng.sample(VOCABULARY, 8)]
+    result = []
+    for p in range(pages):
+        lines = []
+        if p % 5 == 0:
+            lines.append(f"# Chapter {p // 5 + 1}")
+        lines.append(f"## Section {p + 1}")
+        for _ in range(4):
+            lines.append(" ".join(rng.choice(VOCABULARY + terms) for _ in range(page_words // 4)) + ".")
+        result.append("\n\n".join(lines))
+    return result
+
+@dataclass
+class _ParsedPage:
+    text: str
+
+class FakeParser:
+    """
+    `LlamaParse` stand-in: reads the seed written by `FakeDownloader` and returns
+    `pages` canned markdown pages after `page_latency` seconds per page.
+    """
+    def __init__(self, pages: int = 50, page_latency: float = 0.02):
+        self.pages = pages
+        self.page_latency = page_latency
+        self.parsed_pages = 0
+
+    async def aload_data(self, file_path: str) -> List[_ParsedPage]:
+        with open(file_path, encoding="utf-8") as f:
+            seed = f.read()
+        await asyncio.sleep(self.pages * self.page_latency)
+        self.parsed_pages += self.pages
+        return [_ParsedPage(text) for text in book_pages(seed, self.pages)]
+
+class FakeDownloader:
+    """
+    `download_file_from_storage` stand-in: writes the storage path as the file content,
+    so every distinct path is a distinct book (and re-used paths deduplicate).
+    """
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+
+    async def __call__(self, bucket_name: str, file_path: str, destination_path: str) -> str:
+        await asyncio.sleep(self.latency)
+        with open(destination_path, "w", encoding="utf-8") as f:
+            f.write(file_path)
+        return hashlib.sha256(file_path.encode("utf-8")).hexdigest()
+
+REPOSITORY_FUNCTIONS = (
+    "get_book", "update_book", "get_persona", "insert_persona", "insert_chat_messages", "list_chat_messages",
+    "recent_conversation_messages", "conversation_messages_after",
+    "get_conversation_summary", "save_conversation_summary",
+    "find_books_by_file_hash", "count_book_references", "insert_documents",
+    "committed_chunk_indexes", "delete_stale_chunks", "fetch_document_vectors", "match_documents", "match_documents_lexical",
+)
+
+@dataclass
+class Fakes:
+    store: FakeStore
+    embeddings: FakeEmbeddings
+    chat_model: FakeChatModel
+    parser: FakeParser
+    downloader: FakeDownloader
+
+class _Permanent:
+    """
+    The `setattr` / `setitem` of pytest's monkeypatch, without undo (benchmarks).
+    """
+    def setattr(self, target, name: str, value):
+        setattr(target, name, value)
+
+    def setitem(self, mapping, key, value):
+        mapping[key] = value
+
+def install(
+    store: Optional[FakeStore] = None,
+    embeddings: Optional[FakeEmbeddings] = None,
+    chat_model: Optional[FakeChatModel] = None,
+    parser: Optional[FakeParser] = None,
+    downloader: Optional[FakeDownloader] = None,
+    monkeypatch=None,
+) -> Fakes:
+    """
+    Patch the fakes into the app modules and switch off what needs real services
+    (GC, LISTEN, parse cache, rate limit). Returns the installed fakes.
+    With pytest's `monkeypatch`, everything is restored when the test ends; without
+    it (benchmarks), the patches last for the process.
+    """
+    from app.core import clients
+    from app.core.config import settings
+    from app.core.limiter import limiter
+    from app.db import repository
+    from app.services import ingestion_service, parse_cache, pdf_service
+
+    patch = monkeypatch or _Permanent()
+    fakes = Fakes(
+        store=store or FakeStore(),
+        embeddings=embeddings or FakeEmbeddings(),
+        chat_model=chat_model or FakeChatModel(),
+        parser=parser or FakeParser(),
+        downloader=downloader or FakeDownloader(),
+    )
+    for name in REPOSITORY_FUNCTIONS:
+        patch.setattr(repository, name, getattr(fakes.store, name))
+    # The store replaces the repository functions, so PostgREST is never called
+    for name, client in {"embeddings": fakes.embeddings, "chat_model": fakes.chat_model, "supabase": fakes.store}.items():
+        patch.setitem(clients._instances, name, client)
+    patch.setattr(pdf_service, "_llama_parser", lambda: fakes.parser)
+    patch.setattr(ingestion_service, "download_file_from_storage", fakes.downloader)
+
+    patch.setattr(settings, "GC_ENABLED", False)
+    patch.setattr(settings, "BOOK_CACHE_LISTEN", False)
+    patch.setattr(settings, "DEDUP_POLL_INTERVAL", 0.05)
+    patch.setattr(settings, "PDF_PARSER", "llamaparse")  # The fake "PDFs" are text; FakeParser stands in for LlamaParse
+    patch.setattr(parse_cache.parse_cache, "backend", "none")
+    patch.setattr(limiter, "enabled", False)
+    return fakes
@@ -0,0 +1,87 @@
+"""
+Import-time benchmark: what importing the API and the worker costs, with a budget.
+
+    python -m benchmarks.import_time_benchmark
+    python -m benchmarks.import_time_benchmark --api-budget-ms 800 --worker-budget-ms 1500
+
+Each entry point is imported in a fresh interpreter under `python -X importtime`
+(best of --runs). Reports the cumulative time and the slowest top-level packages, and
+exits non-zero if a budget is exceeded or the API (INGESTION_MODE=queue) imports a
+module it should only load lazily or never (SDKs, the parsing / ingestion stack).
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, Tuple
+
+ENTRY_POINTS = {
+    "api": ("app.main", {"INGESTION_MODE": "queue"}),
+    "worker": ("app.worker", {"INGESTION_MODE": "queue"}),
+}
+
+# Built on first use (app.core.clients) or only needed by ingestion
+API_FORBIDDEN = (
+    "langchain_google_genai",
+    "supabase",
+    "llama_parse",
+    "llama_index",
+    "langchain_text_splitters",
+    "app.services.ingestion_service",
+    "app.services.persona_service",
+)
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def measure(module: str, env: Dict[str, str]) -> Tuple[int, Dict[str, int]]:
+    """
+    Cumulative import time of `module` in microseconds, plus every imported module's cumulative time.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(2))
+    return modules[module], modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget of the API and worker entry points")
+    parser.add_argument("--api-budget-ms", type=float, default=1500)
+    parser.add_argument("--worker-budget-ms", type=float, default=3000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    budgets = {"api": args.api_budget_ms, "worker": args.worker_budget_ms}
+
+    failures = []
+    for name, (module, env) in ENTRY_POINTS.items():
+        total, modules = min((measure(module, env) for _ in range(args.runs)), key=lambda m: m[0])
+        status = "ok" if total / 1000 <= budgets[name] else "OVER BUDGET"
+        print(f"{name} ({module}): {total / 1000:.0f} ms, budget {budgets[name]:.0f} ms  {status}")
+        if status != "ok":
+            failures.append(f"{name} import time over budget")
+
+        top_level = {m: t for m, t in modules.items() if "." not in m}
+        for package, micros in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {micros / 1000:8.1f} ms  {package}")
+
+        if name == "api":
+            loaded = sorted(m for m in modules if any(m == f or m.startswith(f + ".") for f in API_FORBIDDEN))
+            if loaded:
+                print(f"  imported eagerly: {', '.join(loaded)}")
+                failures.append("api imports modules it should load lazily")
+
+    if failures:
+        raise SystemExit("; ".join(failures))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+PDF parsing benchmark: pages/sec of the local engine per worker count, for sizing
+the ingestion fleet.
+
+    python -m benchmarks.pdf_parse_benchmark path/to/book.pdf
+    python -m benchmarks.pdf_parse_benchmark path/to/book.pdf --workers 1 2 4 8 --batch-pages 8
+
+Prints the probe of the file and the backend PDF_PARSER=auto would pick, then parses
+it with `parse_pdf_pages` (forced local, parse cache off) once per worker count.
+LlamaParse is not measured here: its throughput is set by the remote queue. In
+production both backends report into the pdf_parse_pages_per_second histogram.
+"""
+import os
+import time
+import asyncio
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from app.core import clients
+from app.core.config import settings
+from app.services.parse_cache import parse_cache
+from app.services.pdf_service import _HEADER_LINE, choose_parser, parse_pdf_pages, probe_pdf
+
+def warm(_):
+    # Import pypdf in the worker before timing starts
+    import app.services.pdf_local
+    return os.getpid()
+
+async def run(path: str, workers: int):
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    clients.override(process_pool=pool)
+    try:
+        list(pool.map(warm, range(workers)))
+        start = time.perf_counter()
+        pages = [page async for page in parse_pdf_pages(path)]
+        return pages, time.perf_counter() - start
+    finally:
+        pool.shutdown()
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local PDF parsing throughput")
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument("--batch-pages", type=int, default=settings.PDF_PARSE_BATCH_PAGES)
+    args = parser.parse_args()
+
+    probe = await probe_pdf(args.path)
+    print(f"Probe: {probe}")
+    settings.PDF_PARSER = "auto"
+    print(f"PDF_PARSER=auto picks: {choose_parser(probe)}")
+    if probe is None:
+        return
+
+    settings.PDF_PARSER = "local"
+    settings.PDF_PARSE_BATCH_PAGES = args.batch_pages
+    parse_cache.backend = "none"
+    for workers in sorted(set(args.workers)):
+        pages, elapsed = await run(args.path, workers)
+        text = "\n\n".join(pages)
+        headers = len(_HEADER_LINE.findall(text))
+        print(f"  {workers:>3} workers  {len(pages) / elapsed:8.1f} pages/sec  "
+              f"({len(pages)} pages, {elapsed:.2f}s, {len(text):,} chars, {headers} headers)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""
+Retrieval benchmark: recall@k and latency of vector, lexical and hybrid (RRF) retrieval.
+
+    DATABASE_URL=postgresql://... python -m benchmarks.retrieval_benchmark
+    DATABASE_URL=postgresql://... python -m benchmarks.retrieval_benchmark 5000
+
+Argument: chunks in the synthetic book. Needs a Postgres with pgvector; everything
+happens in a TEMP table on one connection and mirrors the bodies of
+`match_documents` / `match_documents_lexical` (schema.sql).
+
+The synthetic book has topics (chunks of a topic share vocabulary and sit around a
+topic centroid in embedding space) and a unique name per chunk. Two query sets:
+
+  exact     "what does <name> do": the embedding only knows the topic, the name is
+            the only way to find the right chunk (lexical territory)
+  semantic  a paraphrase sharing no words with the chunk, embedded next to it
+            (vector territory)
+
+Hybrid latency here is both queries back to back; the chat path runs them concurrently.
+"""
+import sys
+import time
+import asyncio
+
+import numpy as np
+from langchain_core.documents import Document
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import engine
+from app.models.document import EMBEDDING_DIM, format_vector
+from app.services.rag_service import reciprocal_rank_fusion
+
+CREATE_TABLE = f"""
+create temp table bench_documents (
+  id bigserial primary key,
+  content text,
+  embedding vector({EMBEDDING_DIM}),
+  content_tsv tsvector generated always as (to_tsvector('simple', coalesce(content, ''))) stored
+)
+"""
+
+CREATE_INDEXES = [
+    "create index on bench_documents using gin (content_tsv)",
+]
+
+VECTOR = text("""
+with book as materialized (
+  select id, content, embedding <=> CAST(CAST(:q AS text) AS vector) as distance from bench_documents
+)
+select id, content from book order by distance limit :k
+""")
+
+LEXICAL = text("""
+with q as (
+  select to_tsquery('simple', coalesce(string_agg(quote_literal(lexeme), ' | '), '')) as query
+  from unnest(tsvector_to_array(to_tsvector('simple', :query_text))) as lexeme
+)
+select d.id, d.content from bench_documents d, q
+where d.content_tsv @@ q.query
+order by ts_rank_cd(d.content_tsv, q.query) desc, d.id
+limit :k
+""")
+
+def synthetic_book(rng: np.random.Generator, chunks: int, topics: int = 20):
+    centroids = rng.normal(size=(topics, EMBEDDING_DIM))
+    contents, vectors, names = [], [], []
+    for i in range(chunks):
+        topic = i % topics
+        words = [f"topic{topic}word{j}" for j in rng.integers(0, 30, size=40)]
+        name = f"name{i:05d}"
+        contents.append(f"{name} " + " ".join(words))
+        vectors.append(centroids[topic] + 0.3 * rng.normal(size=EMBEDDING_DIM))
+        names.append(name)
+    return contents, np.asarray(vectors), centroids, names
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def run_query(conn, statement, params):
+    result = await conn.execute(statement, params)
+    return [Document(page_content=row.content, metadata={"id": row.id}) for row in result]
+
+async def retrieve(conn, mode: str, query_text: str, query_vector: np.ndarray, k: int):
+    if mode == "lexical":
+        return await run_query(conn, LEXICAL, {"query_text": query_text, "k": k})
+    vector_docs = await run_query(conn, VECTOR, {"q": format_vector(query_vector), "k": k})
+    if mode == "vector":
+        return vector_docs
+    lexical_docs = await run_query(conn, LEXICAL, {"query_text": query_text, "k": k})
+    return reciprocal_rank_fusion([vector_docs, lexical_docs], k=settings.RRF_K)[:k]
+
+async def main():
+    if engine is None:
+        raise SystemExit("retrieval_benchmark requires DATABASE_URL (Postgres with pgvector).")
+    chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    queries, k = 100, 5
+    rng = np.random.default_rng(0)
+    contents, vectors, centroids, names = synthetic_book(rng, chunks)
+
+    query_sets = {"exact": [], "semantic": []}
+    for i in rng.choice(chunks, size=queries, replace=False):
+        topic = i % len(centroids)
+        query_sets["exact"].append((i, f"what does {names[i]} do", centroids[topic] + 0.3 * rng.normal(size=EMBEDDING_DIM)))
+        query_sets["semantic"].append((i, "explain that passage again please", vectors[i] + 0.05 * rng.normal(size=EMBEDDING_DIM)))
+
+    async with engine.connect() as conn:
+        await conn.execute(text(CREATE_TABLE))
+        for statement in CREATE_INDEXES:
+            await conn.execute(text(statement))
+        insert = text("insert into bench_documents (content, embedding) values (:content, CAST(CAST(:embedding AS text) AS vector))")
+        await conn.execute(insert, [
+            {"content": content, "embedding": format_vector(vector)} for content, vector in zip(contents, vectors)
+        ])
+        await conn.execute(text("analyze bench_documents"))
+
+        print(f"{chunks} chunks, {queries} queries per set, recall@{k}")
+        print(f"{'mode':>8}  {'exact':>6}  {'semantic':>8}  {'p50/p95 latency':>18}")
+        for mode in ("vector", "lexical", "hybrid"):
+            recalls, latencies = {}, []
+            for name, query_set in query_sets.items():
+                hits = 0
+                for target, query_text, query_vector in query_set:
+                    start = time.perf_counter()
+                    docs = await retrieve(conn, mode, query_text, query_vector, k)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    hits += any(doc.page_content == contents[target] for doc in docs)
+                recalls[name] = hits / len(query_set)
+            print(f"{mode:>8}  {recalls['exact']:6.2f}  {recalls['semantic']:8.2f}  "
+                  f"{percentile(latencies, 0.5):7.2f}/{percentile(latencies, 0.95):7.2f}ms")
+        await conn.rollback()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,191 @@
+"""
+Service benchmark: `app.main:app` under concurrent ingestion and chat load, offline.
+
+    python -m benchmarks.service_benchmark
+    python -m benchmarks.service_benchmark --requests 500 --concurrency 50 --token-latency 0.02
+
+Runs the real app in uvicorn on a local port and drives it over HTTP, with every
+external service replaced by the stand-ins in `benchmarks.fakes` (in-memory store,
+hashed embeddings, a streaming chat model and a parser with configurable latency).
+
+  1. ingestion  --books books are posted to /books/process-book at once and polled
+                until ready; reports pages/sec and per-book duration
+  2. chat       --requests streams with at most --concurrency in flight, spread over
+                the ingested books; reports time to first token, full-stream latency
+                and requests/sec
+
+Questions are distinct unless --question-pool is set (then identical questions
+coalesce / hit the caches, as popular questions do in production). The fakes' latencies
+are the knobs: results compare code changes, not absolute production numbers.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import socket
+import time
+import uuid
+
+from benchmarks import fakes
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def latency_line(name: str, seconds) -> str:
+    if not seconds:
+        return f"  {name:<18} n/a"
+    ms = [s * 1000 for s in seconds]
+    return (f"  {name:<18} p50 {percentile(ms, 0.5):8.1f}  p95 {percentile(ms, 0.95):8.1f}  "
+            f"p99 {percentile(ms, 0.99):8.1f} ms")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def ingest(client, store, book_ids, poll_interval: float = 0.05):
+    """
+    Post every book for processing at once; return per-book durations (seconds) and failures.
+    """
+    started = {}
+    for book_id in book_ids:
+        store.add_book(book_id)
+    responses = await asyncio.gather(*(
+        client.post("/api/v1/books/process-book", json={"book_id": book_id, "file_path": f"bench/{book_id}.pdf"})
+        for book_id in book_ids
+    ))
+    for book_id, response in zip(book_ids, responses):
+        response.raise_for_status()
+        started[book_id] = time.perf_counter()
+
+    durations, failed = {}, []
+    while len(durations) + len(failed) < len(book_ids):
+        await asyncio.sleep(poll_interval)
+        for book_id in book_ids:
+            if book_id in durations or book_id in failed:
+                continue
+            book = store.books[book_id]
+            if book["status"] == "failed":
+                failed.append(book_id)
+            elif book["status"] == "ready" and book["stage"] == "done":
+                durations[book_id] = time.perf_counter() - started[book_id]
+    return durations, failed
+
+async def chat_once(client, book_id: str, question: str, result: dict):
+    start = time.perf_counter()
+    first_token = None
+    async with client.stream("POST", f"/api/v1/books/{book_id}/chat", json={"message": question}) as response:
+        if response.status_code != 200:
+            result["errors"] += 1
+            await response.aread()
+            return
+        async for line in response.aiter_lines():
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            frame = json.loads(line[len("data: "):])
+            if "error" in frame:
+                result["errors"] += 1
+                return
+            if first_token is None:
+                first_token = time.perf_counter() - start
+    result["ttft"].append(first_token if first_token is not None else time.perf_counter() - start)
+    result["total"].append(time.perf_counter() - start)
+
+async def chat_load(client, book_ids, args):
+    rng = random.Random(0)
+    pages = {b: fakes.book_pages(f"bench/{b}.pdf", args.pages) for b in book_ids}
+
+    def question(i: int):
+        book_id = book_ids[i % len(book_ids)]
+        text = rng.choice(pages[book_id]).split("\n\n")[-1].split()
+        start = rng.randrange(max(1, len(text) - 8))
+        return book_id, f"What does the book say about {' '.join(text[start:start + 8])}?"
+
+    count = args.question_pool or args.requests
+    pool = [question(i) for i in range(count)]
+    jobs = [pool[i % count] for i in range(args.requests)]
+
+    result = {"ttft": [], "total": [], "errors": 0}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run(book_id, text):
+        async with semaphore:
+            try:
+                await chat_once(client, book_id, text, result)
+            except Exception:
+                result["errors"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run(book_id, text) for book_id, text in jobs))
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion + chat benchmark of app.main:app")
+    parser.add_argument("--books", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=50, help="pages per book")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--question-pool", type=int, default=0, help="distinct questions (0 = all distinct)")
+    parser.add_argument("--tokens", type=int, default=200, help="tokens per answer")
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--page-latency", type=float, default=0.02)
+    parser.add_argument("--db-latency", type=float, default=0.002)
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own log output")
+    args = parser.parse_args()
+
+    installed = fakes.install(
+        store=fakes.FakeStore(latency=args.db_latency),
+        embeddings=fakes.FakeEmbeddings(latency=args.embed_latency),
+        chat_model=fakes.FakeChatModel(args.tokens, args.token_latency, args.first_token_latency),
+        parser=fakes.FakeParser(args.pages, args.page_latency),
+    )
+
+    import httpx
+    import uvicorn
+    from app.main import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    book_ids = [str(uuid.uuid4()) for _ in range(args.books)]
+    limits = httpx.Limits(max_connections=args.concurrency + args.books)
+    log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+            while (await client.get("/ready")).status_code != 200:
+                await asyncio.sleep(0.01)
+            with log:
+                start = time.perf_counter()
+                durations, failed = await ingest(client, installed.store, book_ids)
+                ingest_elapsed = time.perf_counter() - start
+                ready = [b for b in book_ids if b in durations]
+                chat = await chat_load(client, ready, args) if ready else None
+    finally:
+        server.should_exit = True
+        await serving
+
+    pages = len(durations) * args.pages
+    print(f"Ingestion: {args.books} books x {args.pages} pages, {len(failed)} failed")
+    print(f"  pages/sec          {pages / ingest_elapsed:8.1f}  ({ingest_elapsed:.2f}s wall)")
+    print(latency_line("book duration", list(durations.values())))
+    if chat is None:
+        return
+    completed = len(chat["total"])
+    print(f"Chat: {args.requests} requests, concurrency {args.concurrency}, {chat['errors']} errors")
+    print(f"  requests/sec       {completed / chat['elapsed']:8.1f}  ({chat['elapsed']:.2f}s wall)")
+    print(latency_line("time to 1st token", chat["ttft"]))
+    print(latency_line("full stream", chat["total"]))
+    print(f"  upstream calls     {installed.chat_model.calls - len(durations)} chat, "
+          f"{installed.embeddings.calls} embedding, {installed.store.calls} store")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+"""
+Vector search benchmark: `match_documents` latency against catalogue size.
+
+    DATABASE_URL=postgresql://... python -m benchmarks.vector_search_benchmark
+    DATABASE_URL=postgresql://... python -m benchmarks.vector_search_benchmark 10,100,400 300
+
+Arguments: comma-separated catalogue sizes (books) and chunks per book.
+Needs a Postgres with pgvector. Everything happens in a TEMP table on one connection
+(nothing is written to `documents`), so the queries below mirror the bodies of the
+old and new `match_documents` (schema.sql) against that table:
+
+  legacy     distance computed twice, `metadata @> filter` on unindexed jsonb (seq scan)
+  per-book   promoted file_hash column + btree, exact ranking of one book's rows
+  catalogue  no filter, HNSW index with VECTOR_SEARCH_EF_SEARCH candidates
+"""
+import sys
+import json
+import time
+import asyncio
+
+import numpy as np
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import engine
+from app.models.document import EMBEDDING_DIM, format_vector
+
+CREATE_TABLE = f"""
+create temp table bench_documents (
+  id bigserial primary key,
+  content text,
+  metadata jsonb,
+  embedding vector({EMBEDDING_DIM}),
+  file_hash text generated always as (metadata->>'file_hash') stored
+)
+"""
+
+CREATE_INDEXES = [
+    "create index on bench_documents (file_hash)",
+    "create index on bench_documents using hnsw (embedding vector_cosine_ops) with (m = 16, ef_construction = 64)",
+]
+
+LEGACY = text("""
+select id, content, metadata, 1 - (embedding <=> CAST(CAST(:q AS text) AS vector)) as similarity
+from bench_documents
+where 1 - (embedding <=> CAST(CAST(:q AS text) AS vector)) > 0
+and metadata @> CAST(CAST(:filter AS text) AS jsonb)
+order by embedding <=> CAST(CAST(:q AS text) AS vector)
+limit :k
+""")
+
+PER_BOOK = text("""
+with book as materialized (
+  select id, content, metadata, embedding <=> CAST(CAST(:q AS text) AS vector) as distance
+  from bench_documents
+  where file_hash = :file_hash
+)
+select id, content, metadata, 1 - distance as similarity
+from book where 1 - distance > 0
+order by distance limit :k
+""")
+
+CATALOGUE = text("""
+select id, content, metadata, 1 - distance as similarity from (
+  select id, content, metadata, embedding <=> CAST(CAST(:q AS text) AS vector) as distance
+  from bench_documents order by distance limit :k
+) m where 1 - distance > 0 order by distance
+""")
+
+def book_vectors(rng: np.random.Generator, chunks: int) -> np.ndarray:
+    """
+    Chunks of one book cluster around a book-specific centroid.
+    """
+    centroid = rng.normal(size=EMBEDDING_DIM)
+    return centroid + 0.5 * rng.normal(size=(chunks, EMBEDDING_DIM))
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def insert_books(conn, rng: np.random.Generator, first: int, count: int, chunks: int):
+    insert = text("insert into bench_documents (content, metadata, embedding) values (:content, CAST(CAST(:metadata AS text) AS jsonb), CAST(CAST(:embedding AS text) AS vector))")
+    for b in range(first, first + count):
+        vectors = book_vectors(rng, chunks)
+        rows = [
+            {
+                "content": f"book {b} chunk {c}",
+                "metadata": json.dumps({"file_hash": f"hash-{b}", "chunk_index": c}),
+                "embedding": format_vector(vectors[c]),
+            }
+            for c in range(chunks)
+        ]
+        await conn.execute(insert, rows)
+
+async def time_query(conn, statement, params_list) -> list:
+    latencies = []
+    for params in params_list:
+        start = time.perf_counter()
+        await conn.execute(statement, params)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+async def main():
+    if engine is None:
+        raise SystemExit("vector_search_benchmark requires DATABASE_URL (Postgres with pgvector).")
+    sizes = [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else [10, 50, 200]
+    chunks = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    queries, k = 50, 5
+    rng = np.random.default_rng(0)
+
+    async with engine.connect() as conn:
+        await conn.execute(text(CREATE_TABLE))
+        for statement in CREATE_INDEXES:
+            await conn.execute(text(statement))
+        await conn.execute(text(f"set hnsw.ef_search = {settings.VECTOR_SEARCH_EF_SEARCH}"))
+
+        print(f"{'books':>6} {'rows':>8}  {'legacy p50/p95':>16}  {'per-book p50/p95':>18}  {'catalogue p50/p95':>19}")
+        loaded = 0
+        for size in sizes:
+            await insert_books(conn, rng, loaded, size - loaded, chunks)
+            loaded = size
+            await conn.execute(text("analyze bench_documents"))
+
+            params = []
+            for _ in range(queries):
+                book = int(rng.integers(loaded))
+                q = format_vector(rng.normal(size=EMBEDDING_DIM))
+                params.append({"q": q, "k": k, "file_hash": f"hash-{book}", "filter": json.dumps({"file_hash": f"hash-{book}"})})
+
+            results = []
+            for statement in (LEGACY, PER_BOOK, CATALOGUE):
+                latencies = await time_query(conn, statement, params)
+                results.append(f"{percentile(latencies, 0.5):7.2f}/{percentile(latencies, 0.95):7.2f}ms")
+            print(f"{loaded:>6} {loaded * chunks:>8}  {results[0]:>16}  {results[1]:>18}  {results[2]:>19}")
+        await conn.rollback()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -60,7 +60,10 @@ export function useChatStream({ bookId, initialHistory = [] }: UseChatStreamProp
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    // 'Authorization': ... (Add token here if needed)
+                    // Conversation memory is per signed-in user (same token as lib/api.ts)
+                    ...(localStorage.getItem('token')
+                        ? { Authorization: `Bearer ${localStorage.getItem('token')}` }
+                        : {}),
                 },
                 body: JSON.stringify({ message: content }),
                 signal: abortController.signal,
@@ -9,10 +9,21 @@ create table if not exists books (
   file_path text not null, -- Path in Supabase Storage
   status text not null default 'processing', -- processing, ready, failed
   error_message text,
-  file_hash text unique, -- For deduplication
+  file_hash text, -- For deduplication (shared by books with identical content)
   created_at timestamp with time zone default timezone('utc'::text, now()) not null
 );
 
+-- Migration: duplicate uploads share one file_hash (and its vectors)
+alter table books drop constraint if exists books_file_hash_key;
+create index if not exists books_file_hash_idx on books (file_hash);
+
+-- Migration: per-stage ingestion status (queued, downloading, parsing, splitting, embedding, persona, done)
+alter table books add column if not exists stage text;
+
+-- Migration: progressive ingestion progress (chat is allowed while stage = 'indexing')
+alter table books add column if not exists chunks_indexed int;
+alter table books add column if not exists chunks_total int;
+
 -- Documents Table (Vector Store)
 create table if not exists documents (
   id bigserial primary key,
@@ -21,6 +32,26 @@ create table if not exists documents (
   embedding vector(768) -- Gemini 2.5 Flash / text-embedding-004 size
 );
 
+-- Migration: promote metadata->>'file_hash' to an indexed column, so per-book queries
+-- (search, index loads, checkpoints, deletes) read one book's rows instead of scanning
+-- the whole catalogue. A stored generated column backfills existing rows when it is
+-- added (one table rewrite) and stays in sync with every writer.
+alter table documents
+  add column if not exists file_hash text generated always as (metadata->>'file_hash') stored;
+create index if not exists documents_file_hash_idx on documents (file_hash);
+
+-- ANN index for catalogue-wide searches (no file_hash filter).
+-- Recall/latency trade-off per query: match_documents(..., ef_search).
+create index if not exists documents_embedding_hnsw_idx
+  on documents using hnsw (embedding vector_cosine_ops) with (m = 16, ef_construction = 64);
+
+-- Migration: full-text search over chunk content (lexical / hybrid retrieval).
+-- 'simple' configuration: no stemming or stop words, so it works for any language
+-- and keeps exact terms (names, formulas, page numbers) intact.
+alter table documents
+  add column if not exists content_tsv tsvector generated always as (to_tsvector('simple', coalesce(content, ''))) stored;
+create index if not exists documents_content_tsv_idx on documents using gin (content_tsv);
+
 -- Personas Table
 create table if not exists personas (
   id uuid primary key default gen_random_uuid(),
@@ -31,33 +62,84 @@ create table if not exists personas (
 );
 
 -- Create a function to search for documents
+-- Migration: replaces the 4-argument version (distance computed twice, unindexed jsonb filter)
+drop function if exists match_documents(vector, float, int, jsonb);
+
+-- `filter->>'file_hash'` (the chat path) searches one book exactly: its rows come from
+-- documents_file_hash_idx and are ranked with full recall. Without it, the HNSW index
+-- is used with `ef_search` candidates. The distance is computed once per row.
 create or replace function match_documents (
   query_embedding vector(768),
   match_threshold float,
   match_count int,
-  filter jsonb default '{}'
+  filter jsonb default '{}',
+  ef_search int default 40
 ) returns table (
   id bigint,
   content text,
   metadata jsonb,
   similarity float
-) language plpgsql stable as $$
+) language plpgsql as $$ -- volatile: sets hnsw.ef_search for the transaction
+declare
+  book_hash text := filter->>'file_hash';
 begin
-  return query(
-    select
-      documents.id,
-      documents.content,
-      documents.metadata,
-      1 - (documents.embedding <=> query_embedding) as similarity
-    from documents
-    where 1 - (documents.embedding <=> query_embedding) > match_threshold
-    and documents.metadata @> filter
-    order by documents.embedding <=> query_embedding
-    limit match_count
-  );
+  if book_hash is not null then
+    return query
+      with book as materialized (
+        select d.id, d.content, d.metadata, d.embedding <=> query_embedding as distance
+        from documents d
+        where d.file_hash = book_hash
+        and d.metadata @> (filter - 'file_hash')
+      )
+      select book.id, book.content, book.metadata, 1 - book.distance
+      from book
+      where 1 - book.distance > match_threshold
+      order by book.distance
+      limit match_count;
+  else
+    perform set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+    return query
+      select m.id, m.content, m.metadata, 1 - m.distance
+      from (
+        select d.id, d.content, d.metadata, d.embedding <=> query_embedding as distance
+        from documents d
+        where d.metadata @> filter
+        order by distance
+        limit match_count
+      ) m
+      where 1 - m.distance > match_threshold
+      order by m.distance;
+  end if;
 end;
 $$;
 
+-- Lexical search: chunks matching any term of `query_text`, ranked by ts_rank_cd
+-- (chunks matching more / closer terms first). Returns the embedding too, so hybrid
+-- retrieval can run MMR over the fused candidates without another query.
+create or replace function match_documents_lexical (
+  query_text text,
+  match_count int,
+  filter jsonb default '{}'
+) returns table (
+  id bigint,
+  content text,
+  metadata jsonb,
+  rank float,
+  embedding vector(768)
+) language sql stable as $$
+  with q as (
+    select to_tsquery('simple', coalesce(string_agg(quote_literal(lexeme), ' | '), '')) as query
+    from unnest(tsvector_to_array(to_tsvector('simple', query_text))) as lexeme
+  )
+  select d.id, d.content, d.metadata, ts_rank_cd(d.content_tsv, q.query)::float as rank, d.embedding
+  from documents d, q
+  where d.content_tsv @@ q.query
+  and (filter->>'file_hash' is null or d.file_hash = filter->>'file_hash')
+  and d.metadata @> (filter - 'file_hash')
+  order by rank desc, d.id
+  limit match_count;
+$$;
+
 -- Chat Messages Table
 create table if not exists chat_messages (
   id uuid primary key default gen_random_uuid(),
@@ -66,4 +148,72 @@ create table if not exists chat_messages (
   role text not null, -- 'user', 'assistant'
   content text not null,
   created_at timestamp with time zone default timezone('utc'::text, now()) not null
-);
\ No newline at end of file
+);
+
+-- Migration: assistant answers cut short by a client disconnect are saved with truncated = true
+alter table chat_messages add column if not exists truncated boolean not null default false;
+
+-- Keyset pagination of a book's history: (book_id, created_at, id) matches the
+-- ORDER BY / cursor predicate exactly, so a page is one short backward index scan.
+create index if not exists chat_messages_book_created_idx
+  on chat_messages (book_id, created_at, id);
+
+-- Conversation memory: rolling summary of the chat turns of one (book, user) that
+-- are older than the verbatim window. Folded in incrementally; the cursor is the last
+-- chat_messages row (created_at, id) already in the summary.
+create table if not exists conversation_summaries (
+  book_id uuid references books(id) on delete cascade,
+  user_key text not null default '', -- user_id, '' for anonymous chats
+  summary text not null default '',
+  summarized_until timestamp with time zone,
+  summarized_until_id uuid,
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+  updated_at timestamp with time zone default timezone('utc'::text, now()) not null,
+  primary key (book_id, user_key)
+);
+
+-- Ingestion Jobs (durable queue consumed by `python -m app.worker`)
+create table if not exists ingestion_jobs (
+  id bigserial primary key,
+  book_id uuid references books(id) on delete cascade,
+  bucket_name text not null,
+  file_path text not null,
+  status text not null default 'queued', -- queued, running, done, failed
+  attempts int not null default 0,
+  max_attempts int not null default 5,
+  run_after timestamp with time zone not null default now(),
+  locked_by text, -- worker id holding the lease
+  lease_expires_at timestamp with time zone,
+  last_error text,
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+  updated_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+create index if not exists ingestion_jobs_runnable_idx
+  on ingestion_jobs (run_after, id)
+  where status in ('queued', 'running');
+
+-- Notify API workers when a book or its persona changes, so their in-process
+-- chat metadata caches drop the entry (LISTEN book_changed). Book changes carry
+-- "<id>:<file_hash>" so workers also drop their vector index for that content.
+create or replace function notify_book_change() returns trigger
+language plpgsql as $$
+begin
+  if TG_TABLE_NAME = 'personas' then
+    perform pg_notify('book_changed', coalesce(new.book_id, old.book_id)::text);
+  else
+    perform pg_notify('book_changed', coalesce(new.id, old.id)::text || ':' || coalesce(new.file_hash, old.file_hash, ''));
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists books_notify_change on books;
+create trigger books_notify_change
+  after update of status, file_hash or delete on books
+  for each row execute function notify_book_change();
+
+drop trigger if exists personas_notify_change on personas;
+create trigger personas_notify_change
+  after insert or update or delete on personas
+  for each row execute function notify_book_change();
@@ -0,0 +1,34 @@
+"""
+The app reads these settings at import time. DATABASE_URL is cleared so nothing
+connects to Postgres: tests that touch the data layer install `benchmarks.fakes`.
+"""
+import os
+
+for _name, _value in {
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_SERVICE_KEY": "test",
+    "GOOGLE_API_KEY": "test",
+    "LLAMA_CLOUD_API_KEY": "test",
+}.items():
+    os.environ.setdefault(_name, _value)
+os.environ["DATABASE_URL"] = ""
+
+import pytest
+
+@pytest.fixture
+def installed(monkeypatch):
+    """
+    `benchmarks.fakes` with no latency, undone after the test; the in-process caches
+    are emptied so nothing carries over to the next test.
+    """
+    from benchmarks import fakes
+    from app.services.book_cache import book_cache
+
+    installed = fakes.install(
+        store=fakes.FakeStore(latency=0),
+        embeddings=fakes.FakeEmbeddings(latency=0),
+        chat_model=fakes.FakeChatModel(tokens=5, token_latency=0, first_token_latency=0),
+        monkeypatch=monkeypatch,
+    )
+    yield installed
+    book_cache.clear()
@@ -0,0 +1,25 @@
+from app.services.answer_cache import AnswerCache
+
+def test_book_map_follows_cached_scopes():
+    cache = AnswerCache(similarity=0.9, ttl_seconds=60, max_entries=2, max_per_book=2)
+    for i in range(10):
+        cache.put(f"book-{i}", f"hash-{i}", "persona", "question", [1.0, 0.0], "answer")
+
+    # Evicted content takes its books with it; only the cached ones stay mapped
+    assert cache.stats()["entries"] == 2
+    assert cache._book_hashes == {"book-8": "hash-8", "book-9": "hash-9"}
+
+    cache.invalidate("hash-9")
+    assert cache._book_hashes == {"book-8": "hash-8"}
+    assert cache.lookup("hash-8", "persona", [1.0, 0.0]) == "answer"
+
+def test_invalidate_book_drops_its_answers():
+    cache = AnswerCache(similarity=0.9, ttl_seconds=60, max_entries=10, max_per_book=2)
+    cache.put("book", "hash-1", "persona", "question", [1.0, 0.0], "old")
+    # Re-uploaded with new content
+    cache.put("book", "hash-2", "persona", "question", [1.0, 0.0], "new")
+    cache.invalidate_book("book")
+
+    assert cache.lookup("hash-2", "persona", [1.0, 0.0]) is None
+    assert cache.lookup("hash-1", "persona", [1.0, 0.0]) == "old"
+    assert not cache._book_hashes and not cache._hash_books.get("hash-2")
@@ -0,0 +1,63 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+import uuid
+
+import pytest
+from starlette.requests import Request
+
+from app.core import auth
+from app.core.config import settings
+
+SECRET = "test-jwt-secret"
+
+def b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def token(claims: dict, secret: str = SECRET, alg: str = "HS256") -> str:
+    header = b64(json.dumps({"alg": alg, "typ": "JWT"}).encode())
+    payload = b64(json.dumps(claims).encode())
+    signature = hmac.new(secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{b64(signature) if alg != 'none' else ''}"
+
+def request(authorization=None) -> Request:
+    headers = [(b"authorization", authorization.encode())] if authorization is not None else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+@pytest.fixture(autouse=True)
+def secret(monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", SECRET)
+
+def test_valid_token_identifies_the_caller():
+    user_id = str(uuid.uuid4())
+    assert auth.caller_id(request(f"Bearer {token({'sub': user_id, 'exp': time.time() + 60})}")) == user_id
+
+@pytest.mark.parametrize("authorization", [
+    None,
+    "",
+    "Bearer ",
+    "Basic dXNlcjpwYXNz",
+    f"Bearer {token({'sub': str(uuid.uuid4())}, secret='another-secret')}",
+    f"Bearer {token({'sub': str(uuid.uuid4()), 'exp': time.time() - 1})}",
+    f"Bearer {token({'sub': str(uuid.uuid4()), 'exp': 'never'})}",
+    f"Bearer {token({'sub': 'not-a-uuid'})}",
+    f"Bearer {token({'role': 'anon'})}",
+    "Bearer not.a.jwt",
+])
+def test_invalid_credentials_are_anonymous(authorization):
+    assert auth.caller_id(request(authorization)) is None
+
+@pytest.mark.parametrize("alg", ["none", "HS512", "RS256"])
+def test_only_hs256_is_accepted(alg):
+    assert auth.verify_token(token({"sub": str(uuid.uuid4())}, alg=alg), SECRET) is None
+
+def test_forged_payload_fails_the_signature_check():
+    header, _, signature = token({"sub": str(uuid.uuid4())}).split(".")
+    forged = b64(json.dumps({"sub": str(uuid.uuid4())}).encode())
+    assert auth.verify_token(f"{header}.{forged}.{signature}", SECRET) is None
+
+def test_without_a_secret_every_caller_is_anonymous(monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", None)
+    assert auth.caller_id(request(f"Bearer {token({'sub': str(uuid.uuid4())})}")) is None
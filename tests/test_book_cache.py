@@ -0,0 +1,121 @@
+import asyncio
+import uuid
+
+from app.services.book_cache import book_cache
+from app.services.vector_index import vector_index_cache
+
+def test_book_change_notification_drops_vector_index(installed):
+    file_hash = uuid.uuid4().hex
+    installed.store.documents[file_hash] = [
+        {"id": 1, "content": "chapter one", "metadata": {"file_hash": file_hash}, "embedding": [1.0] * 8},
+    ]
+
+    async def scenario():
+        assert await vector_index_cache.get(file_hash) is not None
+        assert file_hash in vector_index_cache._indexes
+        # Another process re-indexed the book: NOTIFY carries "<book_id>:<file_hash>"
+        book_cache._on_notify(None, 0, "book_changed", f"{uuid.uuid4()}:{file_hash}")
+        assert file_hash not in vector_index_cache._indexes
+
+    asyncio.run(scenario())
+
+def test_invalidation_during_load_is_not_cached(installed, monkeypatch):
+    from app.db import repository
+
+    book_id = str(uuid.uuid4())
+    installed.store.add_book(book_id, status="ready", stage="done")
+    read_persona = installed.store.get_persona
+
+    async def slow_get_persona(book_id: str):
+        # Reads the row, then the response takes a while to arrive
+        persona = await read_persona(book_id)
+        await asyncio.sleep(0.05)
+        return persona
+
+    monkeypatch.setattr(repository, "get_persona", slow_get_persona)
+
+    async def scenario():
+        load = asyncio.create_task(book_cache.get(book_id))
+        await asyncio.sleep(0.01)
+        # The persona changes while the load is reading the old one
+        installed.store.personas[book_id] = {"book_id": book_id, "role_name": "Narrator", "system_prompt": "Speak in verse."}
+        book_cache._on_notify(None, 0, "book_changed", book_id)
+        stale = await load
+        fresh = await book_cache.get(book_id)
+        return stale, fresh
+
+    stale, fresh = asyncio.run(scenario())
+    assert "Narrator" not in stale["system_content"]
+    assert "Narrator" in fresh["system_content"]
+    assert not book_cache._loading and not book_cache._generations
+
+class FakeDriver:
+    def __init__(self):
+        self.on_terminate = None
+        self.listening = False
+
+    def add_termination_listener(self, callback):
+        self.on_terminate = callback
+
+    async def add_listener(self, channel, callback):
+        self.listening = True
+
+    async def execute(self, query):
+        return "SELECT 1"
+
+class FakeConnection:
+    def __init__(self):
+        self.driver_connection = FakeDriver()
+        self.closed = False
+
+    async def get_raw_connection(self):
+        return self
+
+    async def invalidate(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+class FakeEngine:
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.connections = []
+
+    async def connect(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database is starting up")
+        self.connections.append(FakeConnection())
+        return self.connections[-1]
+
+def test_listener_reconnects_and_clears_caches(monkeypatch):
+    from app.core.config import settings
+    from app.db import repository
+    from app.services.answer_cache import answer_cache
+
+    engine = FakeEngine(failures=2)
+    monkeypatch.setattr(repository, "engine", engine)
+    monkeypatch.setattr(settings, "BOOK_CACHE_LISTEN_RETRY_SECONDS", 0.01)
+
+    async def wait_for_connections(count: int):
+        while len(engine.connections) < count or not engine.connections[-1].driver_connection.listening:
+            await asyncio.sleep(0.005)
+
+    async def scenario():
+        await book_cache.start_listener()
+        try:
+            # Backs off through the failed attempts, then listens
+            await asyncio.wait_for(wait_for_connections(1), 1)
+            answer_cache.put("book", "hash", "persona", "question", [1.0, 0.0], "answer")
+
+            # The server drops the connection: reconnect, and drop what may have been missed
+            engine.connections[0].driver_connection.on_terminate(None)
+            await asyncio.wait_for(wait_for_connections(2), 1)
+            assert engine.connections[0].closed
+            assert answer_cache.stats()["entries"] == 0
+        finally:
+            await book_cache.stop_listener()
+        assert engine.connections[1].closed
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+import uuid
+
+import httpx
+import pytest
+
+from app.core.config import settings
+
+SECRET = "test-secret"
+
+def make_token(user_id: str) -> str:
+    def b64(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+    header = b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    payload = b64(json.dumps({"sub": user_id, "exp": time.time() + 60}).encode())
+    signature = hmac.new(SECRET.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{b64(signature)}"
+
+@pytest.fixture
+def chat(installed, monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", SECRET)
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "MEMORY_ENABLED", True)
+    return installed
+
+async def ask(client, book_id: str, user_id: str, question: str) -> httpx.Response:
+    return await client.post(
+        f"/api/v1/books/{book_id}/chat",
+        json={"message": question},
+        headers={"Authorization": f"Bearer {make_token(user_id)}"},
+    )
+
+def test_first_turn_request_hits_answer_cache(chat):
+    from app.main import app
+
+    async def scenario():
+        book_id = str(uuid.uuid4())
+        chat.store.add_book(book_id, status="ready", stage="done", file_hash=uuid.uuid4().hex)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await ask(client, book_id, str(uuid.uuid4()), "Who is the narrator?")
+            # Another reader's first turn: no history, so the cached answer is replayed
+            second = await ask(client, book_id, str(uuid.uuid4()), "Who is the narrator?")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.status_code == 200 and second.status_code == 200
+    assert "X-Answer-Cache" not in first.headers
+    assert second.headers.get("X-Answer-Cache") == "hit"
+    assert "[DONE]" in second.text
+
+def test_follow_up_skips_answer_cache(chat):
+    from app.main import app
+
+    async def scenario():
+        book_id = str(uuid.uuid4())
+        user_id = str(uuid.uuid4())
+        chat.store.add_book(book_id, status="ready", stage="done", file_hash=uuid.uuid4().hex)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await ask(client, book_id, user_id, "Who is the narrator?")
+            return await ask(client, book_id, user_id, "Who is the narrator?")
+
+    follow_up = asyncio.run(scenario())
+    assert follow_up.status_code == 200
+    assert "X-Answer-Cache" not in follow_up.headers
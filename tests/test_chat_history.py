@@ -0,0 +1,73 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+def add_messages(store, book_id: str, count: int):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    # Pairs share a timestamp, so page boundaries fall between equal created_at values
+    messages = [
+        {"book_id": book_id, "user_id": None, "role": "user" if i % 2 == 0 else "assistant",
+         "content": f"message {i}", "created_at": start + timedelta(seconds=i // 2)}
+        for i in range(count)
+    ]
+    asyncio.run(store.insert_chat_messages(messages))
+
+async def get_page(client, book_id: str, **params):
+    return await client.get(f"/api/v1/books/{book_id}/messages", params=params)
+
+def test_cursor_walks_every_message_once(installed):
+    from app.main import app
+
+    book_id = str(uuid.uuid4())
+    add_messages(installed.store, book_id, 23)
+
+    async def scenario():
+        pages = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await get_page(client, book_id, limit=5)
+            pages.append(response)
+            while "X-Next-Cursor" in response.headers:
+                response = await get_page(client, book_id, limit=5, before=response.headers["X-Next-Cursor"])
+                pages.append(response)
+        return pages
+
+    pages = asyncio.run(scenario())
+    assert all(page.status_code == 200 for page in pages)
+    assert [len(page.json()) for page in pages] == [5, 5, 5, 5, 3]
+    # The last page has no cursor (no more messages)
+    assert "X-Next-Cursor" not in pages[-1].headers
+
+    # Newest page first, each page oldest first: reversing the pages restores the history
+    walked = [m["id"] for page in reversed(pages) for m in page.json()]
+    expected = sorted(installed.store.chat_messages, key=lambda m: (m["created_at"], m["id"]))
+    assert walked == [m["id"] for m in expected]
+
+def test_default_page_size(installed):
+    from app.core.config import settings
+    from app.main import app
+
+    book_id = str(uuid.uuid4())
+    add_messages(installed.store, book_id, settings.CHAT_HISTORY_PAGE_SIZE + 3)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await get_page(client, book_id)
+
+    # Without `limit`, one page, not the whole history
+    response = asyncio.run(scenario())
+    assert len(response.json()) == settings.CHAT_HISTORY_PAGE_SIZE
+    assert "X-Next-Cursor" in response.headers
+
+def test_malformed_cursor_is_rejected(installed):
+    from app.main import app
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await get_page(client, str(uuid.uuid4()), before="not-a-cursor")
+
+    assert asyncio.run(scenario()).status_code == 400
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from app.db import repository
+from app.services.chat_history_writer import ChatHistoryWriter
+
+def exchange(i: int):
+    return [{"role": "user", "content": f"q{i}"}, {"role": "assistant", "content": f"a{i}"}]
+
+@pytest.fixture
+def inserts(monkeypatch):
+    calls = []
+
+    async def insert_chat_messages(messages):
+        calls.append([m["content"] for m in messages])
+
+    monkeypatch.setattr(repository, "insert_chat_messages", insert_chat_messages)
+    return calls
+
+def test_enqueued_exchanges_are_batched(inserts):
+    async def scenario():
+        writer = ChatHistoryWriter(batch_size=100, flush_interval=0.05, max_pending=100)
+        writer.start()
+        for i in range(5):
+            await writer.enqueue(exchange(i))
+        await asyncio.sleep(0.1)
+        flushed = list(inserts)
+        await writer.stop()
+        return flushed
+
+    assert asyncio.run(scenario()) == [[f"{kind}{i}" for i in range(5) for kind in "qa"]]
+
+def test_full_buffer_makes_enqueue_wait(monkeypatch):
+    release = asyncio.Event()
+
+    async def slow_insert(messages):
+        await release.wait()
+
+    monkeypatch.setattr(repository, "insert_chat_messages", slow_insert)
+
+    async def scenario():
+        writer = ChatHistoryWriter(batch_size=2, flush_interval=0.01, max_pending=2)
+        writer.start()
+        # The first exchange is taken by the stuck flush; two more fill the buffer
+        for i in range(3):
+            await asyncio.wait_for(writer.enqueue(exchange(i)), 1)
+        await asyncio.sleep(0.05)
+        blocked = asyncio.create_task(writer.enqueue(exchange(3)))
+        await asyncio.sleep(0.05)
+        waited = not blocked.done()
+        release.set()
+        await asyncio.wait_for(blocked, 1)
+        await writer.stop()
+        return waited
+
+    assert asyncio.run(scenario())
+
+def test_stop_drains_the_buffer(inserts):
+    async def scenario():
+        writer = ChatHistoryWriter(batch_size=100, flush_interval=60, max_pending=100)
+        writer.start()
+        for i in range(3):
+            await writer.enqueue(exchange(i))
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert sum(len(rows) for rows in inserts) == 6
+    assert writer.flushed_rows == 6 and not writer.running
+
+def test_failed_flush_is_retried(monkeypatch):
+    calls = []
+
+    async def flaky_insert(messages):
+        calls.append(len(messages))
+        if len(calls) == 1:
+            raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(repository, "insert_chat_messages", flaky_insert)
+
+    async def scenario():
+        writer = ChatHistoryWriter(batch_size=2, flush_interval=0.01, max_pending=10, max_retries=1)
+        writer.start()
+        await writer.enqueue(exchange(0))
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert calls == [2, 2]
+    assert writer.flushed_rows == 2 and writer.dropped_rows == 0
+
+def test_dropped_batch_does_not_block_later_ones(monkeypatch):
+    stored = []
+
+    async def insert(messages):
+        if messages[0]["content"] == "q0":
+            raise ValueError("invalid input syntax for type uuid")
+        stored.extend(m["content"] for m in messages)
+
+    monkeypatch.setattr(repository, "insert_chat_messages", insert)
+
+    async def scenario():
+        writer = ChatHistoryWriter(batch_size=2, flush_interval=0.01, max_pending=10, max_retries=0)
+        writer.start()
+        await writer.enqueue(exchange(0))
+        await asyncio.sleep(0.05)
+        await writer.enqueue(exchange(1))
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert stored == ["q1", "a1"]
+    assert writer.dropped_rows == 2 and writer.flushed_rows == 2
@@ -0,0 +1,42 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.context_service import select_chunks
+
+def doc(name: str, tokens: int) -> Document:
+    return Document(page_content=name.ljust(int(tokens * settings.CHUNK_CHARS_PER_TOKEN), "."))
+
+def select(docs, vectors, token_budget=1000, max_chunks=5, mmr_lambda=0.7, dedup_similarity=0.95):
+    return select_chunks(docs, np.array(vectors, dtype=np.float32), [1.0, 0.0, 0.0],
+                         max_chunks, token_budget, mmr_lambda, dedup_similarity)
+
+def names(result):
+    return [d.page_content.rstrip(".") for d in result["documents"]]
+
+def test_selection_stays_within_token_budget():
+    docs = [doc("a", 300), doc("b", 300), doc("c", 300), doc("d", 50)]
+    vectors = [[1.0, 0.0, 0.0], [0.9, 0.4, 0.0], [0.8, 0.0, 0.6], [0.5, 0.5, 0.5]]
+    result = select(docs, vectors, token_budget=650)
+
+    # "c" no longer fits after "a" and "b"; the smaller "d" still does
+    assert names(result) == ["a", "b", "d"]
+    assert result["tokens"] == 650
+    assert result["dropped_budget"] == 1
+
+def test_mmr_prefers_a_diverse_chunk_over_a_near_copy():
+    docs = [doc("a", 10), doc("a2", 10), doc("b", 10)]
+    # "a2" is more relevant than "b" but almost the same as "a"
+    vectors = [[1.0, 0.0, 0.0], [0.95, 0.3, 0.0], [0.7, 0.0, 0.7]]
+    result = select(docs, vectors, max_chunks=2, mmr_lambda=0.5)
+    assert names(result) == ["a", "b"]
+
+    by_relevance = select(docs, vectors, max_chunks=2, mmr_lambda=1.0, dedup_similarity=1.01)
+    assert names(by_relevance) == ["a", "a2"]
+
+def test_near_duplicates_are_dropped():
+    docs = [doc("a", 10), doc("a copy", 10), doc("b", 10)]
+    vectors = [[1.0, 0.0, 0.0], [0.99, 0.01, 0.0], [0.0, 1.0, 0.0]]
+    result = select(docs, vectors)
+    assert names(result) == ["a", "b"]
+    assert result["dropped_duplicates"] == 1
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from app.services import embedding_cache as module
+from app.services.embedding_cache import EmbeddingCache
+
+MODEL = "text-embedding-3-small"
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(module.time, "time", clock)
+    return clock
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = EmbeddingCache(max_entries=10, ttl_seconds=60)
+
+    async def scenario():
+        await cache.set("What is the theme?", MODEL, [1.0, 2.0])
+        clock.now += 59
+        # Normalized spelling shares the entry
+        fresh = await cache.get("  what is THE theme? ", MODEL)
+        clock.now += 2
+        expired = await cache.get("What is the theme?", MODEL)
+        return fresh, expired
+
+    fresh, expired = asyncio.run(scenario())
+    assert fresh == [1.0, 2.0]
+    assert expired is None
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = EmbeddingCache(max_entries=2, ttl_seconds=60)
+
+    async def scenario():
+        await cache.set("a", MODEL, [1.0])
+        await cache.set("b", MODEL, [2.0])
+        await cache.get("a", MODEL)
+        await cache.set("c", MODEL, [3.0])
+        return [await cache.get(text, MODEL) for text in ("a", "b", "c")]
+
+    assert asyncio.run(scenario()) == [[1.0], None, [3.0]]
+    assert cache.stats()["entries"] == 2
+
+def test_disk_tier_survives_a_new_process(clock, tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    first = EmbeddingCache(max_entries=10, ttl_seconds=60, db_path=path)
+    second = EmbeddingCache(max_entries=10, ttl_seconds=60, db_path=path)
+
+    async def scenario():
+        await first.set("a", MODEL, [0.5, -1.25])
+        from_disk = await second.get("a", MODEL)
+        from_memory = await second.get("a", MODEL)
+        other_model = await second.get("a", "another-model")
+        clock.now += 61
+        expired = await EmbeddingCache(max_entries=10, ttl_seconds=60, db_path=path).get("a", MODEL)
+        return from_disk, from_memory, other_model, expired
+
+    from_disk, from_memory, other_model, expired = asyncio.run(scenario())
+    # Stored as float32: these values round-trip exactly
+    assert from_disk == [0.5, -1.25]
+    assert from_memory == [0.5, -1.25]
+    assert other_model is None
+    assert expired is None
+    assert second.stats()["disk_hits"] == 1 and second.stats()["memory_hits"] == 1
+
+def test_hit_and_miss_counters(clock):
+    cache = EmbeddingCache(max_entries=10, ttl_seconds=60)
+    calls = []
+
+    async def embed(text):
+        calls.append(text)
+        return [float(len(text))]
+
+    async def scenario():
+        for text in ("a", "a", "bb", "a"):
+            await cache.get_or_embed(text, MODEL, embed)
+
+    asyncio.run(scenario())
+    assert calls == ["a", "bb"]
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (2, 0, 2)
+    assert stats["hit_rate"] == 0.5
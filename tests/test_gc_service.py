@@ -0,0 +1,84 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.core.config import settings
+from app.db import repository
+from app.services.gc_service import GarbageCollector
+from app.services.rag_service import delete_vectors_by_file_hash
+
+class Tables:
+    """
+    Just enough of books / documents for the GC queries.
+    """
+    def __init__(self):
+        self.book_hashes = []
+        self.documents = {}
+        self.delete_calls = []
+
+    async def count_book_references(self, file_hash):
+        return self.book_hashes.count(file_hash)
+
+    async def delete_documents_batch(self, file_hash, batch_size):
+        self.delete_calls.append(file_hash)
+        if file_hash in self.book_hashes:
+            return 0
+        count = min(batch_size, self.documents.get(file_hash, 0))
+        self.documents[file_hash] = self.documents.get(file_hash, 0) - count
+        return count
+
+    async def find_orphaned_file_hashes(self, limit):
+        return sorted(h for h, n in self.documents.items() if n and h not in self.book_hashes)[:limit]
+
+    async def delete_orphaned_personas(self, batch_size):
+        return 0
+
+    @asynccontextmanager
+    async def gc_lock(self):
+        yield True
+
+@pytest.fixture
+def tables(monkeypatch):
+    tables = Tables()
+    for name in ("count_book_references", "delete_documents_batch", "find_orphaned_file_hashes",
+                 "delete_orphaned_personas", "gc_lock"):
+        monkeypatch.setattr(repository, name, getattr(tables, name))
+    monkeypatch.setattr(settings, "GC_BATCH_SIZE", 10)
+    monkeypatch.setattr(settings, "GC_BATCH_PAUSE", 0)
+    return tables
+
+def test_only_hashes_orphaned_on_two_passes_are_deleted(tables):
+    gc = GarbageCollector(interval=60, max_batches=100)
+    tables.documents = {"old": 5, "reused": 5}
+
+    asyncio.run(gc.run_pass())
+    # First sighting only makes them suspects
+    assert tables.documents == {"old": 5, "reused": 5}
+
+    # A re-upload references "reused" again before the next pass; "new" is orphaned for the first time
+    tables.book_hashes.append("reused")
+    tables.documents["new"] = 5
+    asyncio.run(gc.run_pass())
+    assert tables.documents == {"old": 0, "reused": 5, "new": 5}
+    assert gc.deleted_documents == 5
+
+def test_referenced_hash_is_kept(tables):
+    tables.documents = {"shared": 5}
+    tables.book_hashes.append("shared")
+
+    assert asyncio.run(delete_vectors_by_file_hash("shared")) == 0
+    assert tables.documents == {"shared": 5}
+    assert tables.delete_calls == []
+
+def test_deletes_in_batches_until_a_short_batch(tables):
+    tables.documents = {"big": 25}
+    assert asyncio.run(delete_vectors_by_file_hash("big")) == 25
+    # 10 + 10 + 5: the short batch ends it
+    assert tables.delete_calls == ["big"] * 3
+
+    tables.documents = {"huge": 100}
+    tables.delete_calls.clear()
+    assert asyncio.run(delete_vectors_by_file_hash("huge", max_batches=4)) == 40
+    assert tables.delete_calls == ["huge"] * 4
+    assert tables.documents == {"huge": 60}
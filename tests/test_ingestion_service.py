@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.config import settings
+from app.services import ingestion_service
+from app.services.ingestion_service import run_ingestion
+
+@pytest.fixture
+def fakes(installed):
+    installed.parser.pages = 6
+    installed.parser.page_latency = 0.01
+    installed.downloader.latency = 0
+    return installed
+
+def content_hash(file_path: str) -> str:
+    # FakeDownloader writes the storage path as the file, so that is the content
+    return hashlib.sha256(file_path.encode("utf-8")).hexdigest()
+
+def new_book(store, **values) -> str:
+    book_id = str(uuid.uuid4())
+    store.add_book(book_id, **values)
+    return book_id
+
+def test_duplicate_of_a_ready_book_is_cloned(fakes):
+    store = fakes.store
+    source = new_book(store, status="ready", stage="done", file_hash=content_hash("shared.pdf"))
+    store.personas[source] = {"book_id": source, "role_name": "Narrator", "system_prompt": "Tell the story."}
+    book_id = new_book(store)
+
+    asyncio.run(run_ingestion(book_id, "books", "shared.pdf"))
+
+    assert store.books[book_id]["status"] == "ready"
+    assert store.books[book_id]["file_hash"] == content_hash("shared.pdf")
+    assert store.personas[book_id]["role_name"] == "Narrator"
+    assert fakes.parser.parsed_pages == 0
+
+def test_duplicate_attaches_to_the_in_flight_job(fakes):
+    store = fakes.store
+    first, second = new_book(store), new_book(store)
+    file_hash = content_hash("same.pdf")
+
+    async def scenario():
+        leader = asyncio.create_task(run_ingestion(first, "books", "same.pdf"))
+        while file_hash not in ingestion_service._inflight_jobs:
+            await asyncio.sleep(0.001)
+        await run_ingestion(second, "books", "same.pdf")
+        await leader
+
+    asyncio.run(scenario())
+    assert store.books[first]["status"] == "ready" and store.books[second]["status"] == "ready"
+    assert store.personas[second]["role_name"] == store.personas[first]["role_name"]
+    assert fakes.parser.parsed_pages == fakes.parser.pages
+    assert file_hash not in ingestion_service._inflight_jobs
+
+def test_waiting_on_an_older_book_that_fails_falls_through_to_ingest(fakes):
+    store = fakes.store
+    file_hash = content_hash("retry.pdf")
+    # An older upload of the same file, being processed by another worker
+    older = new_book(store, status="processing", file_hash=file_hash,
+                     created_at=datetime.now(timezone.utc) - timedelta(minutes=1))
+    book_id = new_book(store)
+
+    async def scenario():
+        ingest = asyncio.create_task(run_ingestion(book_id, "books", "retry.pdf"))
+        await asyncio.sleep(0.2)
+        assert not ingest.done() and fakes.parser.parsed_pages == 0
+        store.books[older]["status"] = "failed"
+        await ingest
+
+    asyncio.run(scenario())
+    assert store.books[book_id]["status"] == "ready"
+    assert fakes.parser.parsed_pages == fakes.parser.pages
+
+def stored_chunk(file_hash: str, index: int, chunker: str) -> dict:
+    return {"content": f"{chunker} chunk {index}", "embedding": [0.0] * 8,
+            "metadata": {"file_hash": file_hash, "chunk_index": index, "chunker": chunker}}
+
+@pytest.mark.parametrize("pipelined, stale_chunker", [
+    (False, ingestion_service.STREAMING_CHUNKER),
+    (True, ingestion_service.SEQUENTIAL_CHUNKER),
+    (True, None),
+])
+def test_checkpoint_from_another_chunker_restarts_the_book(fakes, monkeypatch, pipelined, stale_chunker):
+    monkeypatch.setattr(settings, "INGESTION_PIPELINED", pipelined)
+    store = fakes.store
+    file_hash = content_hash("switched.pdf")
+    # A failed attempt under the other mode left its first chunks behind
+    asyncio.run(store.insert_documents([stored_chunk(file_hash, i, stale_chunker) for i in range(3)]))
+    book_id = new_book(store)
+
+    asyncio.run(run_ingestion(book_id, "books", "switched.pdf"))
+
+    chunker = ingestion_service.STREAMING_CHUNKER if pipelined else ingestion_service.SEQUENTIAL_CHUNKER
+    rows = store.documents[file_hash]
+    assert store.books[book_id]["status"] == "ready"
+    assert {row["metadata"]["chunker"] for row in rows} == {chunker}
+    assert sorted(row["metadata"]["chunk_index"] for row in rows) == list(range(len(rows)))
+
+def test_checkpoint_from_the_same_chunker_is_kept(fakes):
+    store = fakes.store
+    file_hash = content_hash("resumed.pdf")
+    chunker = ingestion_service.STREAMING_CHUNKER
+    asyncio.run(store.insert_documents(
+        [stored_chunk(file_hash, i, chunker) for i in range(3)] + [stored_chunk(file_hash, 3, None)]
+    ))
+
+    committed = asyncio.run(ingestion_service.load_checkpoint(file_hash, chunker))
+    assert committed == {0, 1, 2}
+    assert len(store.documents[file_hash]) == 3
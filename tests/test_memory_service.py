@@ -0,0 +1,80 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from app.core import clients
+from app.core.config import settings
+from app.services import memory_service
+
+class SummaryModel:
+    """
+    Records summary prompts and answers with a numbered summary.
+    """
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        self.prompts.append(messages[0].content)
+        return AIMessage(content=f"summary {len(self.prompts)}")
+
+@pytest.fixture
+def store(installed, monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_RECENT_TURNS", 2)
+    monkeypatch.setattr(settings, "MEMORY_SUMMARY_BATCH_TURNS", 2)
+    return installed.store
+
+async def add_turns(store, book_id: str, user_id: str, turns: int):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    messages = []
+    for turn in range(turns):
+        at = start + timedelta(minutes=turn)
+        messages.append({"book_id": book_id, "user_id": user_id, "role": "user",
+                         "content": f"question {turn}", "created_at": at})
+        messages.append({"book_id": book_id, "user_id": user_id, "role": "assistant",
+                         "content": f"answer {turn}", "created_at": at + timedelta(microseconds=1)})
+    await store.insert_chat_messages(messages)
+
+async def load_and_settle(book_id: str, user_id: str):
+    memory = await memory_service.load_memory(book_id, user_id)
+    await asyncio.gather(*memory_service._folds.values())
+    return memory
+
+def test_turns_within_the_window_are_not_summarized(store):
+    model = SummaryModel()
+    clients.override(chat_model=model)
+
+    async def scenario():
+        book_id, user_id = str(uuid.uuid4()), str(uuid.uuid4())
+        await add_turns(store, book_id, user_id, 2)
+        return await load_and_settle(book_id, user_id)
+
+    memory = asyncio.run(scenario())
+    assert [m["content"] for m in memory["messages"]] == ["question 0", "answer 0", "question 1", "answer 1"]
+    assert memory["summary"] == ""
+    assert model.prompts == []
+
+def test_turns_leaving_the_window_are_rolled_into_the_summary(store):
+    model = SummaryModel()
+    clients.override(chat_model=model)
+
+    async def scenario():
+        book_id, user_id = str(uuid.uuid4()), str(uuid.uuid4())
+        await add_turns(store, book_id, user_id, 3)
+        # The oldest turn has left the window: the prompt drops it, a fold is scheduled
+        before = await load_and_settle(book_id, user_id)
+        after = await load_and_settle(book_id, user_id)
+        return before, after
+
+    before, after = asyncio.run(scenario())
+    assert [m["content"] for m in before["messages"]] == ["question 1", "answer 1", "question 2", "answer 2"]
+    assert before["summary"] == ""
+
+    # One model call folded exactly the turn outside the window
+    assert len(model.prompts) == 1
+    assert "question 0" in model.prompts[0] and "question 1" not in model.prompts[0]
+    assert after["summary"] == "summary 1"
+    assert [m["content"] for m in after["messages"]] == ["question 1", "answer 1", "question 2", "answer 2"]
+    assert after["digest"] != before["digest"]
@@ -0,0 +1,54 @@
+from app.services import pdf_local
+
+class FakePage:
+    """
+    Replays (text, font size, baseline) runs to the visitor like pypdf's `extract_text`.
+    """
+    def __init__(self, runs):
+        self.runs = runs
+
+    def extract_text(self, visitor_text):
+        for text, size, y in self.runs:
+            visitor_text(text, [1, 0, 0, 1, 0, 0], [1, 0, 0, 1, 72, y], {}, size)
+
+def body(y: float):
+    return ("Body text set in the regular size of the book, long enough to be a line.", 10.0, y)
+
+def test_heading_levels_follow_the_size_ratio():
+    def level(size, text="Chapter One"):
+        return pdf_local._heading_level({"text": text, "size": size}, 10.0)
+
+    assert level(10.0) == 0
+    assert level(11.0) == 0
+    assert level(12.0) == 3
+    assert level(15.0) == 2
+    assert level(20.0) == 1
+    # Long lines are emphasised body text, not headings
+    assert level(20.0, "x" * (pdf_local.HEADING_MAX_CHARS + 1)) == 0
+    assert pdf_local._heading_level({"text": "Chapter One", "size": 20.0}, None) == 0
+
+def test_page_markdown_marks_headings_and_joins_paragraphs():
+    page = FakePage([
+        ("Part One", 24.0, 760),
+        ("The Beginning", 15.0, 720),
+        body(690), body(678),
+        body(640),
+    ])
+    markdown = pdf_local.page_markdown(page)
+    blocks = markdown.split("\n\n")
+
+    assert blocks[0] == "# Part One"
+    assert blocks[1] == "## The Beginning"
+    # Two wrapped lines become one paragraph; the wider gap starts another
+    assert blocks[2] == " ".join([body(0)[0]] * 2)
+    assert blocks[3] == body(0)[0]
+
+def test_wrapped_heading_stays_one_heading():
+    page = FakePage([("A Very Long", 20.0, 760), ("Chapter Title", 20.0, 740), body(700)])
+    assert pdf_local.page_markdown(page).startswith("# A Very Long Chapter Title\n\n")
+
+def test_sparse_page_uses_the_documents_body_size():
+    # Alone, the 12pt line would be this page's body text
+    page = FakePage([("Epilogue", 12.0, 700)])
+    assert pdf_local.page_markdown(page) == "Epilogue"
+    assert pdf_local.page_markdown(page, body_size=10.0) == "### Epilogue"
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.services import pdf_local, pdf_service
+from app.services.pdf_service import MarkdownStreamSplitter, estimate_tokens
+
+def paragraphs(count: int):
+    return [f"Paragraph {i}: " + " ".join(["word"] * 60) + "." for i in range(count)]
+
+def test_headerless_book_streams_bounded_chunks():
+    splitter = MarkdownStreamSplitter()
+    limit = settings.CHUNK_MAX_TOKENS * settings.CHUNK_CHARS_PER_TOKEN
+    fed = []
+    for page in range(200):
+        fed.extend(splitter.feed("\n\n".join(paragraphs(8))))
+        # Chunks come out while pages arrive; the buffer never grows past about one chunk
+        assert len(splitter._buffer) <= limit + 2
+        if page == 10:
+            assert fed
+    chunks = fed + splitter.flush()
+    assert all(estimate_tokens(c.page_content) <= settings.CHUNK_MAX_TOKENS for c in chunks)
+    assert sum(c.page_content.count("Paragraph ") for c in chunks) == 200 * 8
+
+def test_long_section_keeps_its_header_metadata():
+    splitter = MarkdownStreamSplitter()
+    chunks = splitter.feed("# Part One\n\n## Chapter 1\n\n" + "\n\n".join(paragraphs(4)))
+    for _ in range(10):
+        chunks += splitter.feed("\n\n".join(paragraphs(4)))
+    chunks += splitter.feed("## Chapter 2\n\n" + "\n\n".join(paragraphs(2)))
+    chunks += splitter.flush()
+
+    assert len(chunks) > 2
+    assert all(c.metadata.get("Header 1") == "Part One" for c in chunks)
+    assert {c.metadata.get("Header 2") for c in chunks[:-1]} == {"Chapter 1"}
+    assert chunks[-1].metadata.get("Header 2") == "Chapter 2"
+
+class CountingPool:
+    """
+    Runs tasks on threads and records the most batches submitted but not yet finished.
+    """
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=8)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def submit(self, fn, *args):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+        def run():
+            try:
+                return fn(*args)
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+        return self.executor.submit(run)
+
+def fake_extract_pages(file_path, start, stop, body_size=None):
+    time.sleep(0.01)
+    return [f"page {i}" for i in range(start, stop)]
+
+def test_local_parse_bounds_batches_in_flight(monkeypatch):
+    pool = CountingPool()
+    monkeypatch.setattr(pdf_service, "get_process_pool", lambda: pool)
+    monkeypatch.setattr(pdf_local, "extract_pages", fake_extract_pages)
+    monkeypatch.setattr(settings, "PDF_PARSE_WORKERS", 2)
+    monkeypatch.setattr(settings, "PDF_PARSE_BATCH_PAGES", 3)
+
+    async def scenario():
+        timing = {}
+        probe = {"pages": 40, "body_size": 10.0}
+        return [page async for page in pdf_service._parse_local("book.pdf", probe, timing)], timing
+
+    pages, timing = asyncio.run(scenario())
+    pool.executor.shutdown()
+    assert pages == [f"page {i}" for i in range(40)]
+    assert pool.peak == 3
+    assert "done" in timing
+
+def probe(**overrides):
+    return {"pages": 100, "chars_per_page": 2000.0, "empty_pages": 0.0, "unmapped_ratio": 0.0, **overrides}
+
+def test_choose_parser_keeps_text_pdfs_local(monkeypatch):
+    monkeypatch.setattr(settings, "PDF_PARSER", "auto")
+    assert pdf_service.choose_parser(probe()) == "local"
+
+def test_choose_parser_sends_unusable_text_layers_to_llamaparse(monkeypatch):
+    monkeypatch.setattr(settings, "PDF_PARSER", "auto")
+    assert pdf_service.choose_parser(None) == "llamaparse"
+    assert pdf_service.choose_parser(probe(pages=0)) == "llamaparse"
+    assert pdf_service.choose_parser(probe(chars_per_page=50.0)) == "llamaparse"
+    assert pdf_service.choose_parser(probe(empty_pages=0.5)) == "llamaparse"
+    assert pdf_service.choose_parser(probe(unmapped_ratio=0.2)) == "llamaparse"
+
+def test_choose_parser_honours_a_forced_backend(monkeypatch):
+    monkeypatch.setattr(settings, "PDF_PARSER", "llamaparse")
+    assert pdf_service.choose_parser(probe()) == "llamaparse"
+    monkeypatch.setattr(settings, "PDF_PARSER", "local")
+    assert pdf_service.choose_parser(None) == "local"
@@ -0,0 +1,83 @@
+import asyncio
+import uuid
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.db import repository
+from app.services import rag_service
+from app.services.rag_service import embed_for_retrieval, reciprocal_rank_fusion, retrieve_candidates, search_lexical
+
+def docs(*names):
+    return [Document(page_content=name) for name in names]
+
+def test_rrf_orders_by_summed_reciprocal_rank():
+    fused = reciprocal_rank_fusion([docs("a", "b", "c"), docs("a", "c", "d")], k=60)
+
+    # Found by both lists beats a better rank in one list only
+    assert [d.page_content for d in fused] == ["a", "c", "b", "d"]
+    assert fused[0].metadata["rrf_score"] == pytest.approx(2 / 61)
+    assert fused[1].metadata["rrf_score"] == pytest.approx(1 / 63 + 1 / 62)
+    assert fused[2].metadata["rrf_score"] == pytest.approx(1 / 62)
+
+@pytest.fixture
+def book(installed):
+    file_hash = uuid.uuid4().hex
+    texts = [
+        "the lighthouse keeper kept a logbook of every storm",
+        "storm clouds gathered over the harbour at dusk",
+        "the keeper's daughter read novels by lamplight",
+        "a ship ran aground on the northern reef",
+    ]
+    rows = [
+        {"content": text, "metadata": {"file_hash": file_hash, "chunk_index": i}, "embedding": installed.embeddings.embed(text)}
+        for i, text in enumerate(texts)
+    ]
+    asyncio.run(installed.store.insert_documents(rows))
+    return installed, file_hash
+
+def test_hybrid_carries_embeddings_to_the_fused_order(book):
+    installed, file_hash = book
+    query = "storm logbook keeper"
+
+    async def scenario():
+        embedding = await rag_service.embed_query(query)
+        return await retrieve_candidates(query, file_hash, k=3, query_embedding=embedding, mode="hybrid", indexed=False)
+
+    fused, vectors = asyncio.run(scenario())
+    assert fused and vectors.shape[0] == len(fused)
+    for doc, vector in zip(fused, vectors):
+        expected = np.asarray(installed.embeddings.embed(doc.page_content), dtype=np.float32)
+        assert np.allclose(vector / np.linalg.norm(vector), expected / np.linalg.norm(expected), atol=1e-5)
+    assert all("rrf_score" in doc.metadata for doc in fused)
+
+def test_hybrid_without_query_embedding_is_lexical(book, monkeypatch):
+    _, file_hash = book
+
+    async def no_vector_search(*args, **kwargs):
+        raise AssertionError("vector search must not run without a query embedding")
+
+    monkeypatch.setattr(repository, "match_documents", no_vector_search)
+    found, _ = asyncio.run(retrieve_candidates("reef ship", file_hash, k=2, mode="hybrid", indexed=False))
+    assert found[0].page_content == "a ship ran aground on the northern reef"
+    assert "rank" in found[0].metadata
+
+def test_lexical_search_failure_returns_nothing(installed, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise RuntimeError("text search configuration missing")
+
+    monkeypatch.setattr(repository, "match_documents_lexical", broken)
+    assert asyncio.run(search_lexical("reef", uuid.uuid4().hex, 5)) == ([], None)
+
+def test_hybrid_query_embedding_times_out_to_lexical(installed, monkeypatch):
+    async def slow_embed_query(query):
+        await asyncio.sleep(1)
+        return [1.0]
+
+    monkeypatch.setattr(rag_service, "embed_query", slow_embed_query)
+    monkeypatch.setattr(settings, "EMBED_QUERY_TIMEOUT", 0.01)
+
+    assert asyncio.run(embed_for_retrieval("reef", "hybrid")) is None
+    assert asyncio.run(embed_for_retrieval("reef", "lexical")) is None
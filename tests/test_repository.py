@@ -0,0 +1,63 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.db import repository
+
+def connection_lost():
+    return OperationalError("INSERT ...", {}, ConnectionResetError("connection reset by peer"))
+
+class FakeEngine:
+    def __init__(self, commit_error=None):
+        self.commit_error = commit_error
+
+    @asynccontextmanager
+    async def begin(self):
+        yield object()
+        if self.commit_error is not None:
+            raise self.commit_error
+
+@pytest.fixture
+def rest_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(repository, "engine", FakeEngine())
+    return calls
+
+def run(db_call, rest_calls):
+    return asyncio.run(repository._run(db_call, lambda: rest_calls.append(True) or "rest"))
+
+def test_connection_failure_falls_back_to_rest(rest_calls):
+    async def db_call():
+        raise connection_lost()
+
+    assert run(db_call, rest_calls) == "rest"
+    assert rest_calls == [True]
+
+def test_sql_errors_propagate(rest_calls):
+    async def db_call():
+        raise IntegrityError("INSERT ...", {}, Exception("duplicate key value"))
+
+    with pytest.raises(IntegrityError):
+        run(db_call, rest_calls)
+    assert rest_calls == []
+
+def test_write_failing_before_commit_falls_back(rest_calls):
+    async def db_call():
+        async with repository._begin():
+            raise connection_lost()
+
+    assert run(db_call, rest_calls) == "rest"
+
+def test_write_failing_during_commit_is_not_repeated(rest_calls, monkeypatch):
+    # The COMMIT may have reached the server: writing again over REST could duplicate rows
+    monkeypatch.setattr(repository, "engine", FakeEngine(commit_error=connection_lost()))
+
+    async def db_call():
+        async with repository._begin():
+            pass
+
+    with pytest.raises(OperationalError):
+        run(db_call, rest_calls)
+    assert rest_calls == []
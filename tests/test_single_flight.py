@@ -0,0 +1,76 @@
+import asyncio
+
+from app.services.single_flight import SingleFlight
+
+def test_followers_share_the_leaders_call():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+        release = asyncio.Event()
+
+        async def produce(flight):
+            calls.append(1)
+            flight.publish("a", "a")
+            await release.wait()
+            flight.publish("b", "b")
+            flight.finish("ab")
+
+        leader = flights.join("key", produce)
+        await leader.wait_started()
+        follower = flights.join("key", produce)
+        assert follower is leader
+
+        async def collect(flight):
+            frames = [frame async for frame in flight.subscribe()]
+            flight.leave()
+            return frames
+
+        readers = [asyncio.create_task(collect(leader)), asyncio.create_task(collect(follower))]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*readers)
+        await asyncio.sleep(0)
+        return flights, calls, results, leader
+
+    flights, calls, results, flight = asyncio.run(scenario())
+    assert calls == [1]
+    # The follower joined after the first frame and still gets every frame
+    assert results == [["a", "b"], ["a", "b"]]
+    assert flight.result == "ab"
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "followers": 1, "cancelled": 0}
+
+def test_producer_cancelled_when_last_subscriber_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def produce(flight):
+            flight.publish("a", "a")
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        first = flights.join("key", produce)
+        await first.wait_started()
+        second = flights.join("key", produce)
+        first.leave()
+        await asyncio.sleep(0)
+        still_running = not cancelled.is_set()
+        second.leave()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+
+        # The key is free again: the next caller starts a new flight
+        restarted = flights.join("key", produce)
+        restarted.leave()
+        await asyncio.sleep(0)
+        return flights, first, restarted, still_running
+
+    flights, first, restarted, still_running = asyncio.run(scenario())
+    assert still_running
+    assert first.cancelled and first.done and first.result is None
+    assert restarted is not first
+    assert flights.stats()["leaders"] == 2
+    assert flights.stats()["cancelled"] == 2
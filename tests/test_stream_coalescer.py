@@ -0,0 +1,69 @@
+import asyncio
+
+from app.services.stream_coalescer import coalesce
+
+async def source(pieces, delay: float = 0.0, pause_after: int = -1, pause: float = 0.0):
+    for i, piece in enumerate(pieces):
+        if delay:
+            await asyncio.sleep(delay)
+        yield piece
+        if i == pause_after:
+            await asyncio.sleep(pause)
+
+async def collect(pieces, **options):
+    loop = asyncio.get_running_loop()
+    frames = []
+    async for frame in coalesce(pieces, **options):
+        frames.append((loop.time(), frame))
+    return frames
+
+def test_first_piece_is_sent_at_once_and_the_rest_merged():
+    pieces = [f"t{i} " for i in range(50)]
+    frames = asyncio.run(collect(source(pieces), interval=0.05, max_bytes=10_000))
+    texts = [text for _, text in frames]
+
+    # Time to first token is not delayed; the burst after it becomes one frame
+    assert texts[0] == "t0 "
+    assert len(texts) == 2
+    assert "".join(texts) == "".join(pieces)
+
+def test_frames_are_cut_at_max_bytes():
+    pieces = ["é" * 10] * 20  # 20 UTF-8 bytes each
+    frames = asyncio.run(collect(source(pieces), interval=10.0, max_bytes=60))
+    texts = [text for _, text in frames]
+
+    assert "".join(texts) == "".join(pieces)
+    assert all(len(text.encode("utf-8")) <= 60 for text in texts)
+    assert len(texts) > 5
+
+def test_pending_text_is_flushed_while_upstream_is_silent():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        # "a" goes out at once; "b" arrives inside the interval, then upstream stalls
+        frames = await collect(source(["a", "b", "c"], pause_after=1, pause=0.5), interval=0.05, max_bytes=10_000)
+        return [(at - start, text) for at, text in frames]
+
+    frames = asyncio.run(scenario())
+    assert [text for _, text in frames] == ["a", "b", "c"]
+    # "b" is not held back until "c" arrives
+    assert frames[1][0] < 0.3
+
+def test_closing_the_consumer_closes_upstream():
+    closed = []
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield "x"
+        finally:
+            closed.append(True)
+
+    async def scenario():
+        frames = coalesce(endless(), interval=0.01, max_bytes=10_000)
+        await frames.__anext__()
+        await frames.aclose()
+
+    asyncio.run(scenario())
+    assert closed == [True]
@@ -0,0 +1,38 @@
+import asyncio
+import uuid
+
+from app.services.vector_index import VectorIndexCache
+
+def add_book(store) -> str:
+    file_hash = uuid.uuid4().hex
+    store.documents[file_hash] = [
+        {"id": 1, "content": "chapter one", "metadata": {"file_hash": file_hash}, "embedding": [1.0] * 8},
+    ]
+    return file_hash
+
+def test_load_locks_are_released_after_loading(installed):
+    installed.store.latency = 0.01
+    cache = VectorIndexCache(max_bytes=1 << 20)
+    hashes = [add_book(installed.store) for _ in range(20)]
+
+    async def scenario():
+        await asyncio.gather(*(cache.get(h) for h in hashes for _ in range(3)))
+
+    asyncio.run(scenario())
+    assert cache.stats()["books"] == 20
+    assert not cache._locks and not cache._waiting and not cache._stale
+
+def test_index_invalidated_while_loading_is_not_cached(installed):
+    installed.store.latency = 0.05
+    cache = VectorIndexCache(max_bytes=1 << 20)
+    file_hash = add_book(installed.store)
+
+    async def scenario():
+        load = asyncio.create_task(cache.get(file_hash))
+        await asyncio.sleep(0.01)
+        cache.invalidate(file_hash)
+        assert await load is not None
+
+    asyncio.run(scenario())
+    assert file_hash not in cache._indexes
+    assert not cache._locks and not cache._stale
@@ -0,0 +1,29 @@
+import asyncio
+import uuid
+
+from app.db import repository
+from app.worker import IngestionWorker
+
+def test_job_that_died_on_its_last_attempt_fails_its_book(installed, monkeypatch):
+    book_id = str(uuid.uuid4())
+    installed.store.add_book(book_id, status="processing", stage="embedding")
+    reaped = [[{"id": 7, "book_id": book_id}], []]
+    claims = []
+
+    async def reap_ingestion_jobs(limit: int = 100):
+        return reaped.pop(0) if reaped else []
+
+    async def claim_ingestion_job(worker_id: str, lease_seconds: float):
+        claims.append(worker_id)
+        worker.stop()
+        return None
+
+    monkeypatch.setattr(repository, "reap_ingestion_jobs", reap_ingestion_jobs)
+    monkeypatch.setattr(repository, "claim_ingestion_job", claim_ingestion_job)
+    worker = IngestionWorker(concurrency=1, lease_seconds=30, poll_interval=0.01)
+
+    asyncio.run(worker.run())
+    book = installed.store.books[book_id]
+    assert book["status"] == "failed"
+    assert "lease expired" in book["error_message"]
+    assert claims